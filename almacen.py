@@ -0,0 +1,183 @@
+# Almacén de catálogos de varios grados y facultades en SQLite
+# materias.json solo guarda un grado y se sobrescribe al cambiar. Aquí cada grado se guarda con la url de su
+# facultad y se puede cambiar de uno a otro sin volver a descargar nada. Al leer un grado solo se cargan los
+# datos generales de las materias, el horario y los exámenes de cada una se leen la primera vez que se usan
+# (api.MateriaDiferida)
+#
+#   python almacen.py                                   lista los grados guardados
+#   python almacen.py importar materias.json url grado  añade un catálogo y lo selecciona
+#   python almacen.py seleccionar url grado
+#
+# api.leer_materias y api.escribir_archivo usan el grado seleccionado cuando el archivo termina en .db
+
+import datetime as dt
+import json
+import sqlite3
+import sys
+import threading
+from functools import partial
+
+import api
+import medidas
+
+ARCHIVO = 'catalogo.db'
+
+ESQUEMA = '''
+create table if not exists grados (
+    id integer primary key,
+    centro text not null,
+    grado text not null,
+    actualizado text not null,
+    seleccionado integer not null default 0,
+    unique (centro, grado)
+);
+create table if not exists materias (
+    grado integer not null references grados (id) on delete cascade,
+    orden integer not null,
+    enlace text not null,
+    nombre text not null,
+    abreviatura text not null,
+    curso integer not null,
+    cuatrimestre integer not null,
+    tipo text not null,
+    semana text not null,
+    grupo_seleccionado text not null,
+    num_grupos text not null,
+    semanas text not null,
+    huella text not null,
+    horario text not null,
+    examenes text not null,
+    primary key (grado, enlace)
+);
+'''
+
+# Horario y exámenes como listas JSON sin nombres de campos
+def _horario(m: api.Materia):
+    return json.dumps([[h.grupo, h.dia_semana.value, h.hora_inicio.isoformat(), h.hora_fin.isoformat(), h.aula, h.tipo.value] for h in m.horario], ensure_ascii = False)
+
+def _examenes(m: api.Materia):
+    return json.dumps([[e.fecha.isoformat(), sorted(e.aula)] for e in m.examenes], ensure_ascii = False)
+
+class Almacen:
+    def __init__(self, archivo: str = ARCHIVO):
+        self.archivo = archivo
+        self.lock = threading.Lock()
+        # la conexión se comparte entre hilos (descargas en segundo plano), el lock serializa su uso
+        self.conexion = sqlite3.connect(archivo, check_same_thread = False)
+        self.conexion.execute('pragma foreign_keys = on')
+        self.conexion.executescript(ESQUEMA)
+
+    # (centro, grado, materias, actualizado, seleccionado) de cada grado guardado
+    def grados(self):
+        with self.lock:
+            return self.conexion.execute('''
+                select g.centro, g.grado, count(m.enlace), g.actualizado, g.seleccionado
+                from grados g left join materias m on m.grado = g.id
+                group by g.id order by g.centro, g.grado
+            ''').fetchall()
+
+    # (centro, grado) del grado seleccionado, o None
+    def seleccionado(self):
+        with self.lock:
+            return self.conexion.execute('select centro, grado from grados where seleccionado = 1').fetchone()
+
+    # Selecciona un grado guardado, None deja el almacén sin grado seleccionado
+    def seleccionar(self, centro: str | None, grado: str | None = None):
+        with self.lock, self.conexion:
+            self.conexion.execute('update grados set seleccionado = 0 where seleccionado = 1')
+            if centro is None:
+                return True
+            return self.conexion.execute('update grados set seleccionado = 1 where centro = ? and grado = ?', (centro, grado)).rowcount == 1
+
+    # Guarda las materias de un grado (sustituye las que hubiera) y lo selecciona
+    def guardar(self, lista: list[api.Materia], centro: str, grado: str):
+        filas = [(
+            i, m.enlace, m.nombre, m.abreviatura, m.curso, m.cuatrimestre, m.tipo.value, m.semana,
+            json.dumps(m.grupo_seleccionado), json.dumps(m.num_grupos), json.dumps(m.semanas, ensure_ascii = False),
+            m.huella, _horario(m), _examenes(m)
+        ) for i, m in enumerate(lista)]
+
+        with self.lock, self.conexion:
+            c = self.conexion
+            c.execute('''
+                insert into grados (centro, grado, actualizado) values (?, ?, ?)
+                on conflict (centro, grado) do update set actualizado = excluded.actualizado
+            ''', (centro, grado, dt.datetime.now().isoformat(timespec = 'seconds')))
+            (id,) = c.execute('select id from grados where centro = ? and grado = ?', (centro, grado)).fetchone()
+            c.execute('delete from materias where grado = ?', (id,))
+            c.executemany('insert into materias values (?' + ', ?' * 14 + ')', [(id, *f) for f in filas])
+            c.execute('update grados set seleccionado = (id = ?)', (id,))
+
+    # Materias de un grado, por defecto el seleccionado, sin leer todavía su horario ni sus exámenes
+    @medidas.medido('almacen.materias')
+    def materias(self, centro: str | None = None, grado: str | None = None):
+        with self.lock:
+            if centro is None:
+                fila = self.conexion.execute('select id from grados where seleccionado = 1').fetchone()
+            else:
+                fila = self.conexion.execute('select id from grados where centro = ? and grado = ?', (centro, grado)).fetchone()
+            if fila is None:
+                return []
+            (id,) = fila
+            filas = self.conexion.execute('''
+                select enlace, nombre, abreviatura, curso, cuatrimestre, tipo, semana, grupo_seleccionado, num_grupos, semanas, huella
+                from materias where grado = ? order by orden
+            ''', (id,)).fetchall()
+
+        l = []
+        for enlace, nombre, abreviatura, curso, cuatrimestre, tipo, semana, seleccionado, num_grupos, semanas, huella in filas:
+            m = api.MateriaDiferida(
+                nombre = sys.intern(nombre),
+                abreviatura = sys.intern(abreviatura),
+                enlace = enlace,
+                curso = curso,
+                cuatrimestre = cuatrimestre,
+                tipo = api.TipoMateria(tipo),
+                semana = semana,
+                grupo_seleccionado = json.loads(seleccionado),
+                num_grupos = json.loads(num_grupos),
+                semanas = json.loads(semanas),
+                huella = huella,
+            )
+            m.cargar = partial(self.datos, id, enlace)
+            l.append(m)
+        return l
+
+    # (horario, examenes) de una materia
+    @medidas.medido('almacen.datos')
+    def datos(self, id: int, enlace: str):
+        with self.lock:
+            fila = self.conexion.execute('select horario, examenes from materias where grado = ? and enlace = ?', (id, enlace)).fetchone()
+        if fila is None:
+            return ([], [])
+        horario = [
+            api.HoraClase(grupo, api.DiaSemana(dia), api.compartir_hora(inicio), api.compartir_hora(fin), api.compartir_aula(aula), api.TipoClase(tipo))
+            for grupo, dia, inicio, fin, aula, tipo in json.loads(fila[0])
+        ]
+        examenes = [api.Examen(dt.datetime.fromisoformat(fecha), { api.compartir_aula(a) for a in aulas }) for fecha, aulas in json.loads(fila[1])]
+        return (horario, examenes)
+
+# Un almacén abierto por archivo, compartido por el catálogo y las materias diferidas
+_abiertos: dict[str, Almacen] = {}
+_lock = threading.Lock()
+
+def abrir(archivo: str = ARCHIVO):
+    with _lock:
+        if not archivo in _abiertos:
+            _abiertos[archivo] = Almacen(archivo)
+        return _abiertos[archivo]
+
+if __name__ == '__main__':
+    a = abrir()
+    if len(sys.argv) == 5 and sys.argv[1] == 'importar':
+        a.guardar(api.leer_materias(sys.argv[2]), sys.argv[3], sys.argv[4])
+    elif len(sys.argv) == 4 and sys.argv[1] == 'seleccionar':
+        if not a.seleccionar(sys.argv[2], sys.argv[3]):
+            print('Ese grado no está guardado')
+            sys.exit(1)
+    elif len(sys.argv) != 1:
+        print('Uso: python almacen.py [importar archivo url grado | seleccionar url grado]')
+        sys.exit(1)
+
+    for centro, grado, n, actualizado, seleccionado in a.grados():
+        print(f"{'*' if seleccionado else ' '} {grado} ({centro}): {n} materias, {actualizado}")
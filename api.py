@@ -1,18 +1,32 @@
 # API para buscar horarios de materias en la USC
 
-from dataclasses import dataclass, field, asdict
+from dataclasses import dataclass, field, fields, replace
 from enum import Enum
+from functools import lru_cache
 
 import datetime as dt
+import hashlib
 import re
-from rapidfuzz import fuzz
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from html import escape
+from urllib.parse import urljoin, urlparse
 from colorsys import hsv_to_rgb
 
 import pandas as pd
+from rejilla import Rejilla, MINUTOS_FRANJA, etiqueta_franja
+from buscador import IndiceMaterias, clave_materias
+from examenes import IndiceExamenes
+from aulas import IndiceAulas
 
-import requests
-from bs4 import BeautifulSoup
+import red
+import medidas
+from bs4 import BeautifulSoup, SoupStrainer
 
+import os
 import json
 from dacite import from_dict, Config as dcConfig
 
@@ -37,7 +51,25 @@ class DiaSemana(str, Enum):
     JUEVES = 'Jueves'
     VIERNES = 'Viernes'
 
-@dataclass
+DIAS = list(DiaSemana)
+indice_dia = { d: i for i, d in enumerate(DIAS) }
+
+# Las horas y aulas se repiten mucho entre clases, así que se comparte un único objeto de cada una
+# compartir_hora lee las horas guardadas (isoformat) y hora_pagina las de la web, que se leen como siempre
+# con strptime (acepta 9:00) y dan el mismo objeto que la hora guardada
+@lru_cache(maxsize = None)
+def compartir_hora(texto: str):
+    return dt.time.fromisoformat(texto)
+
+@lru_cache(maxsize = None)
+def hora_pagina(texto: str):
+    return compartir_hora(dt.datetime.strptime(texto, '%H:%M').time().isoformat())
+
+def compartir_aula(texto: str):
+    return sys.intern(texto)
+
+# Con slots cada clase ocupa bastante menos memoria (no tiene __dict__), importa en catálogos de varios grados
+@dataclass(slots = True)
 class HoraClase:
     grupo: int
     dia_semana: DiaSemana
@@ -46,12 +78,25 @@ class HoraClase:
     aula: str
     tipo: TipoClase
 
-@dataclass
+    # Índices enteros para la rejilla del horario: día (0 = lunes) y franjas de media hora desde las 00:00
+    @property
+    def dia(self):
+        return indice_dia[self.dia_semana]
+
+    @property
+    def franja_inicio(self):
+        return (self.hora_inicio.hour * 60 + self.hora_inicio.minute) // MINUTOS_FRANJA
+
+    @property
+    def franja_fin(self):
+        return (self.hora_fin.hour * 60 + self.hora_fin.minute) // MINUTOS_FRANJA
+
+@dataclass(slots = True)
 class Examen:
     fecha: dt.datetime
     aula: set[str]
 
-@dataclass
+@dataclass(slots = True)
 class Materia:
     nombre: str
     abreviatura: str
@@ -64,13 +109,103 @@ class Materia:
     num_grupos: dict[str, int] = field(default_factory=dict)
     horario: list[HoraClase] = field(default_factory=list)
     examenes: list[Examen] = field(default_factory=list)
-    
+    semanas: dict[str, str] = field(default_factory=dict) # nombre de la semana -> url, en el orden de la web
+    huella: str = '' # versión de la página con la que se obtuvieron los datos, ver huella_pagina
+
+# Materia de un catálogo con varios grados (almacen.py): el horario y los exámenes se leen la primera vez
+# que se usan llamando a cargar, que devuelve (horario, examenes)
+DIFERIDOS = ('horario', 'examenes')
+_lock_diferidos = threading.RLock() # reentrante porque la carga de una copia lee el original
+
+class MateriaDiferida(Materia):
+    __slots__ = ('cargar',)
+
+    def pendiente(self):
+        return getattr(self, 'cargar', None) is not None
+
+    # cargar se quita solo cuando los dos campos ya están puestos, así otro hilo nunca ve los vacíos, y si
+    # falla la carga se vuelve a intentar la próxima vez
+    def _leer_diferidos(self):
+        if not self.pendiente():
+            return
+        with _lock_diferidos:
+            if self.pendiente():
+                horario, examenes = self.cargar()
+                Materia.horario.__set__(self, horario)
+                Materia.examenes.__set__(self, examenes)
+                self.cargar = None
+
+    # Copia que tampoco lee nada hasta que se usa, y entonces lo lee una sola vez en el original
+    def copia(self):
+        c = MateriaDiferida(**{ f.name: getattr(self, f.name) for f in fields(Materia) if not f.name in DIFERIDOS })
+        c.grupo_seleccionado, c.num_grupos = dict(self.grupo_seleccionado), dict(self.num_grupos)
+        c.cargar = lambda: (list(self.horario), list(self.examenes))
+        return c
+
+def _diferido(slot):
+    def leer(self):
+        self._leer_diferidos()
+        return slot.__get__(self)
+    def escribir(self, valor):
+        self._leer_diferidos()
+        slot.__set__(self, valor)
+    return property(leer, escribir)
+
+for _campo in DIFERIDOS:
+    setattr(MateriaDiferida, _campo, _diferido(getattr(Materia, _campo)))
+
 @dataclass
 class Horario:
-    df: pd.DataFrame
     materias: dict[str, Materia] = field(default_factory=dict)
+    rejilla: Rejilla = field(default_factory=lambda: Rejilla([d.value for d in DiaSemana]))
+
+    # DataFrame para mostrar o exportar, se genera a partir de la rejilla solo cuando cambia (cada vez es una copia)
+    @property
+    def df(self):
+        return self.rejilla.df()
+
+# Descargas concurrentes
+# ---
 
-log = ''
+CONCURRENCIA = 8 # número máximo de descargas simultáneas
+ESPERA = 0.1 # segundos mínimos entre dos peticiones al mismo servidor
+
+# Espaciado de las peticiones a un mismo servidor para no saturarlo
+class Cortesia:
+    def __init__(self, espera: float = ESPERA):
+        self.espera = espera
+        self.lock = threading.Lock()
+        self.siguiente: dict[str, float] = {}
+
+    def esperar(self, url: str):
+        if self.espera <= 0:
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            ahora = time.monotonic()
+            turno = max(ahora, self.siguiente.get(host, ahora))
+            self.siguiente[host] = turno + self.espera
+        if turno > ahora:
+            time.sleep(turno - ahora)
+
+# Análisis de las páginas
+# ---
+
+# lxml es bastante más rápido que el parser de python, siempre se usa el mismo para que el resultado no
+# dependa de lo que haya instalado
+PARSER = 'lxml'
+
+ID_SEMANAS = 'subject-detail-controller-week-filter'
+
+# Solo se construyen las partes de cada página que se usan
+SOLO_GRADOS = SoupStrainer('div', class_ = 'at-text')
+SOLO_LISTA = SoupStrainer('div', class_ = 'generic-summary-content-wrapper')
+SOLO_SEMANAS = SoupStrainer(id = ID_SEMANAS)
+SOLO_MATERIA = SoupStrainer(lambda nombre, attrs: nombre == 'table' or attrs.get('id') == ID_SEMANAS) # horario, exámenes y semanas
+
+@medidas.medido('analizar')
+def analizar(html: str, solo: SoupStrainer | None = None):
+    return BeautifulSoup(html, PARSER, parse_only = solo)
 
 # Obtener y procesar la lista de materias desde la web de la USC
 # ---
@@ -80,11 +215,11 @@ def obtener_grados(url_base):
     gr = set()
 
     try:
-        r = requests.get(url_base + '/horarios/materias')
+        r = red.get(url_base + '/horarios/materias')
     except:
         return None
 
-    soup = BeautifulSoup(r.text, 'html.parser')
+    soup = analizar(r.text, SOLO_GRADOS)
 
     descripciones = soup.findAll('div', class_='at-text')
     for g in descripciones:
@@ -94,30 +229,119 @@ def obtener_grados(url_base):
     return list(gr)
 
 # Crea una lista offline con todos los datos de las materias
-def escribir_archivo(lista: list[Materia]):
-    def writer(o):
-        if isinstance(o, dt.datetime) or isinstance(o, dt.time):
-            return o.isoformat()
-        if isinstance(o, set):
-            return list(o)
-        return o.__dict__
-
-    f = open('materias.json', 'w')
-    f.write(json.dumps(lista, default = writer, sort_keys = True, indent = 4, ensure_ascii = False))
-    f.close()
+# En un almacén .db se guarda como el grado (centro, grado), por defecto el seleccionado
+@medidas.medido('catalogo.escribir')
+def escribir_archivo(lista: list[Materia], archivo: str | None = None, centro: str | None = None, grado: str | None = None):
+    archivo = archivo or catalogo.archivo
+    if archivo.endswith('.bin'):
+        import binario
+        binario.escribir(lista, archivo)
+        catalogo.resetear()
+        return
+    if archivo.endswith('.db'):
+        import almacen
+        a = almacen.abrir(archivo)
+        if centro is None or grado is None:
+            centro, grado = a.seleccionado() or (None, None)
+        if centro is None:
+            raise ValueError(f"No hay ningún grado seleccionado en '{archivo}'")
+        a.guardar(lista, centro, grado)
+        catalogo.resetear()
+        return
+
+    # se escribe materia a materia en un temporal que solo sustituye al archivo cuando está completo, así una
+    # interrupción nunca deja un materias.json a medias. El resultado es igual que json.dumps de toda la lista
+    with open(archivo + '.tmp', 'w', encoding = 'utf-8') as f:
+        f.write('[')
+        for i, m in enumerate(lista):
+            f.write(',\n    ' if i else '\n    ')
+            f.write(json.dumps(m, default = serializar, sort_keys = True, indent = 4, ensure_ascii = False).replace('\n', '\n    '))
+        f.write('\n]' if lista else ']')
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(archivo + '.tmp', archivo)
+    catalogo.resetear()
+
+def serializar(o):
+    if isinstance(o, dt.datetime) or isinstance(o, dt.time):
+        return o.isoformat()
+    if isinstance(o, set):
+        return list(o)
+    return { f.name: getattr(o, f.name) for f in fields(o) }
+
+# Progreso de una descarga: cada materia terminada se añade como una línea JSON a <catálogo>.<grado>.parcial
+# (el grado como hash de su facultad y nombre, así dos descargas de grados distintos no se pisan), la
+# primera línea dice de qué grado es. Si la descarga se interrumpe, la siguiente del mismo grado sigue
+# donde se quedó, y al escribir el catálogo completo se borra
+class Progreso:
+    def __init__(self, catalogo: str, centro: str, grado: str):
+        clave = hashlib.sha1(f'{centro}|{grado}'.encode('utf-8')).hexdigest()[:16]
+        self.archivo = f'{catalogo}.{clave}.parcial'
+        self.cabecera = { 'centro': centro, 'grado': grado }
+        self.f = None
+
+    # Materias ya descargadas por enlace, vacío si no hay progreso de este grado
+    def leer(self):
+        hechas: dict[str, Materia] = {}
+        try:
+            with open(self.archivo, 'r', encoding = 'utf-8') as f:
+                if json.loads(f.readline()) != self.cabecera:
+                    return hechas
+                for linea in f:
+                    try:
+                        m = materia_de_dict(json.loads(linea))
+                    except ValueError:
+                        break # última línea a medio escribir
+                    hechas[m.enlace] = m
+        except (OSError, ValueError):
+            pass
+        return hechas
+
+    # La primera vez se reescribe el progreso anterior (sin la línea cortada si la hay) en un temporal que lo
+    # sustituye ya completo, así una interrupción en ese momento no pierde lo descargado. Después se añade
+    def anadir(self, materia: Materia):
+        if self.f is None:
+            hechas = self.leer()
+            with open(self.archivo + '.tmp', 'w', encoding = 'utf-8') as f:
+                f.write(json.dumps(self.cabecera, ensure_ascii = False) + '\n')
+                for m in hechas.values():
+                    f.write(json.dumps(m, default = serializar, ensure_ascii = False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.archivo + '.tmp', self.archivo)
+            self.f = open(self.archivo, 'a', encoding = 'utf-8')
+        self.f.write(json.dumps(materia, default = serializar, ensure_ascii = False) + '\n')
+        self.f.flush()
+
+    def cerrar(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def borrar(self):
+        self.cerrar()
+        if os.path.exists(self.archivo):
+            os.remove(self.archivo)
+
+# Materias de un grado en la lista de la facultad, todavía sin horarios
+# Si no se indica el grado se usa el de las materias cuyo enlace está en conocidos
+def lista_grado(url_base, grado: str | None = None, conocidos: set[str] | None = None):
+    conocidos = set() if conocidos is None else conocidos
+    r = red.get(url_base + '/horarios/materias')
+    soup = analizar(r.text, SOLO_LISTA)
+
+    tidy = lambda x: x.replace(' ', '').replace('(', '').replace(')', '')
+    entradas = []
+    for m in soup.findAll('div', class_='generic-summary-content-wrapper'):
+        entradas.append((m.findChildren('p')[0].text, m))
+    if grado is None:
+        grados = { tidy(gr) for gr, m in entradas if urljoin(url_base, m.find('a')['href']) in conocidos }
+    else:
+        grados = { tidy(grado) }
 
-def generar_lista_materias(url_base, grado):
-    print('Obteniendo lista de materias...')
     l = []
-
-    r = requests.get(url_base + '/horarios/materias')
-    soup = BeautifulSoup(r.text, 'html.parser')
-
-    tb_mat = soup.findAll('div', class_='generic-summary-content-wrapper')
-    for m in tb_mat:
-        gr = m.findChildren('p')[0].text
-        tidy = lambda x: x.replace(' ', '').replace('(', '').replace(')', '')
-        if tidy(grado) != tidy(gr):
+    for gr, m in entradas:
+        if not tidy(gr) in grados:
             continue
 
         titulo = m.find('a')
@@ -126,119 +350,472 @@ def generar_lista_materias(url_base, grado):
         l.append(Materia(
             nombre = titulo.text,
             abreviatura = ''.join(filter(lambda x: x.isupper(), titulo.text)),
-            enlace = 'https://www.usc.gal' + titulo['href'],
+            enlace = urljoin(url_base, titulo['href']),
             curso = int(curso[0]),
             cuatrimestre = int(cuatrimestre[0]) if cuatrimestre[0].isnumeric() else 0,
             tipo = TipoMateria(tipo),
             grupo_seleccionado = { t.value: -1 for t in TipoClase },
             num_grupos = { t.value: -1 for t in TipoClase }
         ))
+    return l
+
+# Si concurrencia > 1 las materias se descargan en paralelo y los nombres se devuelven según terminan
+# Con progreso cada materia descargada sin errores se guarda en cuanto termina
+def descargar_materias(l: list[Materia], concurrencia: int = CONCURRENCIA, espera: float = ESPERA, progreso: Progreso | None = None):
+    def terminada(m: Materia, n: str):
+        if progreso and not n.startswith('ERROR'):
+            progreso.anadir(m)
+        return n
+
+    if concurrencia <= 1:
+        for m in l:
+            yield terminada(m, datos_materia(m))
+    else:
+        cortesia = Cortesia(espera)
+        with ThreadPoolExecutor(max_workers = concurrencia) as ex:
+            futuros = { ex.submit(datos_materia, m, cortesia): m for m in l }
+            for f in as_completed(futuros):
+                yield terminada(futuros[f], f.result())
+
+# Url de la facultad a partir del enlace de una de sus materias
+def centro_materia(enlace: str):
+    return enlace.split('/horarios/materias/')[0]
+
+def generar_lista_materias(url_base, grado, concurrencia: int = CONCURRENCIA, espera: float = ESPERA):
+    print('Obteniendo lista de materias...')
+    resetear_indice_semanas(clave_grado(catalogo.archivo, url_base, grado))
 
+    l = lista_grado(url_base, grado)
+    progreso = Progreso(catalogo.archivo, url_base, grado)
+    try:
+        hechas = progreso.leer()
+        if hechas:
+            print(f'Continuando la descarga anterior, {sum(1 for m in l if m.enlace in hechas)} materias ya descargadas')
+        l = [hechas.get(m.enlace, m) for m in l]
+        yield from descargar_materias([m for m in l if not m.enlace in hechas], concurrencia, espera, progreso)
+
+        escribir_archivo(l, centro = url_base, grado = grado)
+        progreso.borrar()
+    finally:
+        # también si la descarga falla o se abandona, el progreso queda en disco para continuarla
+        progreso.cerrar()
+    print(red.estadisticas)
+
+# Actualiza el catálogo guardado descargando solo las materias cuya página ha cambiado
+# Vuelve a leer la lista de materias del grado (añade las nuevas y quita las que ya no están), y de cada
+# materia conocida pide la página con su huella, si no ha cambiado se mantienen sus datos. Se conservan los
+# grupos seleccionados que sigan existiendo
+# de es el catálogo que se actualiza, por defecto el global
+def actualizar_lista_materias(url_base: str | None = None, grado: str | None = None, concurrencia: int = CONCURRENCIA, espera: float = ESPERA, de: 'Catalogo | None' = None):
+    print('Actualizando lista de materias...')
+    de = catalogo if de is None else de
+    anteriores = { m.enlace: m for m in de.copia() }
+    centro, guardado = de.origen()
+    url_base, grado = url_base or centro, grado or guardado
+    if url_base is None:
+        if not anteriores:
+            raise ValueError('No hay materias guardadas de las que sacar la url de la facultad')
+        url_base = centro_materia(next(iter(anteriores)))
+
+    l = lista_grado(url_base, grado, set(anteriores))
+    if not l:
+        print(f"No se han encontrado las materias del grado en '{url_base}', el catálogo no se modifica")
+        return
     for m in l:
-        yield datos_materia(m)
-        m = asdict(m)
-    
-    escribir_archivo(l)
+        a = anteriores.get(m.enlace)
+        if a:
+            m.grupo_seleccionado, m.num_grupos = a.grupo_seleccionado, a.num_grupos
+            m.horario, m.examenes, m.semanas, m.huella = a.horario, a.examenes, a.semanas, a.huella
+
+    yield from descargar_materias(l, concurrencia, espera)
+
+    cambiadas = 0
+    for m in l:
+        a = anteriores.get(m.enlace)
+        if not a or m.huella == a.huella:
+            continue
+        cambiadas += 1
+        olvidar_semanas(m)
+        for t, g in a.grupo_seleccionado.items():
+            if m.grupo_seleccionado.get(t, -1) != -1 and 0 <= g <= m.num_grupos.get(t, -1):
+                m.grupo_seleccionado[t] = g
+
+    escribir_archivo(l, de.archivo, centro = url_base, grado = grado)
+    nuevas = sum(1 for m in l if not m.enlace in anteriores)
+    print(f"{cambiadas} materias cambiadas, {nuevas} nuevas, {len(anteriores) - (len(l) - nuevas)} eliminadas")
+    print(red.estadisticas)
+
+# Catálogo de materias en memoria
+# Se lee materias.json una sola vez y se vuelve a leer si cambia en disco o si se resetea
+# Con un almacén .db (almacen.py) se lee el grado indicado o si no el seleccionado
+ARCHIVO_MATERIAS = 'materias.json'
+
+class Catalogo:
+    def __init__(self, archivo: str = ARCHIVO_MATERIAS, centro: str | None = None, grado: str | None = None):
+        self.archivo = archivo
+        self.centro, self.grado = centro, grado
+        self.lock = threading.Lock()
+        self.resetear()
+
+    def resetear(self):
+        self.materias: list[Materia] | None = None
+        self.version = None
+        self._indice: IndiceMaterias | None = None
+        self._examenes: IndiceExamenes | None = None
+        self._aulas: dict[str | None, tuple[list[Materia], IndiceAulas]] = {} # semana -> (materias de las que sale, índice)
+
+    def leer(self):
+        st = os.stat(self.archivo)
+        version = (st.st_mtime_ns, st.st_size)
+        with self.lock:
+            if self.materias is None or self.version != version:
+                self.materias = leer_materias(self.archivo, self.centro, self.grado)
+                self.version = version
+                self._indice = None
+                self._examenes = None
+                self._aulas = {}
+            return self.materias
+
+    # Índice de búsqueda por nombre, se rehace solo cuando cambia el catálogo
+    def indice(self):
+        materias = self.leer()
+        with self.lock:
+            if self._indice is None or self._indice.materias is not materias:
+                with medidas.tramo('indice.busqueda'):
+                    self._indice = IndiceMaterias(materias)
+            return self._indice
+
+    # Calendario de exámenes (examenes.py), igual que el índice de búsqueda
+    def examenes(self):
+        materias = self.leer()
+        with self.lock:
+            if self._examenes is None or self._examenes.materias is not materias:
+                with medidas.tramo('indice.examenes'):
+                    self._examenes = IndiceExamenes(materias)
+            return self._examenes
+
+    # Ocupación de las aulas (aulas.py) con las clases de este grado y del resto de grados guardados del mismo centro
+    # Sin semana es la guardada en el catálogo. Con semana se usan las clases de cada materia en esa semana
+    # (materias_semana, puede descargarlas) y se guarda un índice por semana. KeyError si ninguna materia la tiene
+    def aulas(self, semana: str | None = None):
+        materias = self.leer()
+        with self.lock:
+            guardado = self._aulas.get(semana)
+            if guardado is not None and guardado[0] is materias:
+                return guardado[1]
+
+        # fuera del lock para no parar al resto mientras se descargan semanas
+        with medidas.tramo('indice.aulas'):
+            grados = { self.clave(): materias, **self.otros_grados_centro() }
+            if semana is not None:
+                grados = { k: materias_semana(l, semana, k) for k, l in grados.items() }
+                if not any(m.semana == semana for l in grados.values() for m in l):
+                    raise KeyError(semana)
+            propias, *otras = grados.values()
+            indice = IndiceAulas(propias)
+            indice.anadir([m for l in otras for m in l if not m.enlace in indice.por_materia])
+        with self.lock:
+            self._aulas[semana] = (materias, indice)
+        return indice
+
+    # Materias de los demás grados del centro del grado del catálogo por grado (clave_grado), solo en un almacén .db
+    def otros_grados_centro(self):
+        centro, grado = self.origen()
+        if centro is None:
+            return {}
+        import almacen
+        a = almacen.abrir(self.archivo)
+        return { clave_grado(self.archivo, c, g): a.materias(c, g) for c, g, *_ in a.grados() if c == centro and g != grado }
+
+    # Copias independientes para que los cambios de grupo o semana no afecten al catálogo
+    def copia(self):
+        return [copiar_materia(m) for m in self.leer()]
+
+    # (url de la facultad, grado) del grado del catálogo o del seleccionado, solo se sabe en un almacén .db
+    def origen(self):
+        if self.centro is not None:
+            return (self.centro, self.grado)
+        if not self.archivo.endswith('.db') or not os.path.exists(self.archivo):
+            return (None, None)
+        import almacen
+        return almacen.abrir(self.archivo).seleccionado() or (None, None)
+
+    # Grado del catálogo en el índice de semanas
+    def clave(self):
+        return clave_grado(self.archivo, *self.origen())
+
+catalogo = Catalogo()
+
+_catalogos: dict[tuple[str, str, str], Catalogo] = {}
+_lock_catalogos = threading.Lock()
+
+# Catálogo de un grado concreto del almacén del catálogo global, sin depender del grado seleccionado
+# Se comparte entre quienes usan el mismo grado para no leerlo ni indexarlo más de una vez
+def catalogo_grado(centro: str, grado: str):
+    clave = (catalogo.archivo, centro, grado)
+    with _lock_catalogos:
+        if not clave in _catalogos:
+            _catalogos[clave] = Catalogo(catalogo.archivo, centro, grado)
+        return _catalogos[clave]
+
+# Identifica un grado: su facultad y nombre en un almacén .db, el archivo en el resto (un grado por archivo)
+def clave_grado(archivo: str, centro: str | None, grado: str | None):
+    if archivo.endswith('.db') and centro:
+        return f'{centro} | {grado}'
+    return os.path.abspath(archivo)
+
+# materias.json por defecto, el formato binario de binario.py si el archivo termina en .bin o el grado
+# indicado (por defecto el seleccionado) de un almacén si termina en .db
+@medidas.medido('catalogo.leer')
+def leer_materias(archivo: str, centro: str | None = None, grado: str | None = None):
+    if archivo.endswith('.bin'):
+        import binario
+        return binario.leer(archivo)
+    if archivo.endswith('.db'):
+        import almacen
+        return almacen.abrir(archivo).materias(centro, grado)
 
-# Lee la lista generada de materias
-def lista_materias():
     materias: list(Materia) = []
 
-    f = open('materias.json', 'r')
-    conf = dcConfig(cast = [Enum, set], type_hooks = {dt.datetime: dt.datetime.fromisoformat, dt.time: dt.time.fromisoformat})
+    f = open(archivo, 'r', encoding = 'utf-8')
     for m in json.load(f):
-        materias.append(from_dict(data_class=Materia, data=m, config=conf))
+        materias.append(materia_de_dict(m))
     f.close()
 
     return materias
 
+CONF_JSON = dcConfig(cast = [Enum, set], type_hooks = {dt.datetime: dt.datetime.fromisoformat, dt.time: compartir_hora, str: sys.intern})
+
+def materia_de_dict(d: dict):
+    return from_dict(data_class=Materia, data=d, config=CONF_JSON)
+
+# Las clases y exámenes no se modifican, basta con copiar los contenedores
+def copiar_materia(m: Materia):
+    if isinstance(m, MateriaDiferida) and m.pendiente():
+        return m.copia()
+    return replace(m,
+        grupo_seleccionado = dict(m.grupo_seleccionado),
+        num_grupos = dict(m.num_grupos),
+        horario = list(m.horario),
+        examenes = list(m.examenes),
+    )
+
+# Lee la lista generada de materias
+def lista_materias():
+    return catalogo.copia()
+
 # Obtiene la lista de semanas del horario
 def lista_semanas(materia: Materia):
-    r = requests.get(materia.enlace)
-    soup = BeautifulSoup(r.text, 'html.parser')
+    r = red.get(materia.enlace)
+    soup = analizar(r.text, SOLO_SEMANAS)
+    return semanas_pagina(soup, materia.enlace)
 
-    selector_semana = soup.find(id = 'subject-detail-controller-week-filter')
+# Lee el selector de semanas de una página ya analizada
+def semanas_pagina(soup, enlace: str):
+    selector_semana = soup.find(id = ID_SEMANAS)
     semanas = selector_semana.findAll('li')
 
     primera = ''
     l = {}
     for s in semanas:
         s = s.find('a')
-        l[s.decode_contents()] = 'https://www.usc.gal' + s['href']
+        l[s.decode_contents()] = urljoin(enlace, s['href'])
         if primera == '':
             primera = s.decode_contents()
 
     return (l, primera)
 
+# Índice de semanas de cada grado, se guarda junto al catálogo
+# Los selectores de semana son iguales para todas las materias de un cuatrimestre, así que solo se guarda
+# la parte de la url que cambia con la semana y se reconstruye para cada materia
+# Va por grado (clave_grado) y dentro por cuatrimestre, sin grado se usa el del catálogo
+ARCHIVO_SEMANAS = 'semanas.json'
+_indices_semanas: dict[str, dict] = {} # ruta del archivo -> índice, por si se cambia de catálogo
+_lock_indice = threading.RLock()
+
+# semanas.json en el directorio del catálogo, no en el de trabajo
+def ruta_semanas():
+    return os.path.join(os.path.dirname(os.path.abspath(catalogo.archivo)), ARCHIVO_SEMANAS)
+
+def indices_semanas():
+    ruta = ruta_semanas()
+    with _lock_indice:
+        if not ruta in _indices_semanas:
+            try:
+                with open(ruta, 'r', encoding = 'utf-8') as f:
+                    indices = json.load(f)
+            except (OSError, ValueError):
+                indices = {}
+            # el formato antiguo no dice de qué grado es
+            _indices_semanas[ruta] = {} if 'cuatrimestres' in indices else indices
+        return _indices_semanas[ruta]
+
+def indice_semanas(grado: str | None = None):
+    grado = catalogo.clave() if grado is None else grado
+    with _lock_indice:
+        return indices_semanas().setdefault(grado, { 'cuatrimestres': {}, 'materias': {} })
+
+# Descarta el índice de un grado (al volver a descargarlo)
+def resetear_indice_semanas(grado: str | None = None):
+    grado = catalogo.clave() if grado is None else grado
+    with _lock_indice:
+        indices_semanas().pop(grado, None)
+        guardar_indice_semanas()
+
+def guardar_indice_semanas():
+    ruta = ruta_semanas()
+    with _lock_indice:
+        with open(ruta + '.tmp', 'w', encoding = 'utf-8') as f:
+            json.dump(indices_semanas(), f, ensure_ascii = False, indent = 4)
+        os.replace(ruta + '.tmp', ruta)
+
+# Añade al índice las semanas obtenidas de la página de una materia
+# La semana que la web muestra primero cambia con el tiempo, se guarda la última vista
+def indexar_semanas(materia: Materia, l: dict[str, str], primera: str, grado: str | None = None):
+    with _lock_indice:
+        indice = indice_semanas(grado)
+        c = indice['cuatrimestres'].setdefault(str(materia.cuatrimestre), { 'primera': primera, 'semanas': [], 'sufijos': {} })
+        c['primera'] = primera
+        for semana, url in l.items():
+            if not semana in c['semanas']:
+                c['semanas'].append(semana)
+            if url.startswith(materia.enlace):
+                c['sufijos'][semana] = url[len(materia.enlace):]
+            else:
+                indice['materias'].setdefault(materia.enlace, {})[semana] = url
+        guardar_indice_semanas()
+
+# Lista de semanas de una materia (igual que lista_semanas)
+# Se usa la guardada en la materia y si no la hay (catálogos antiguos) el índice, solo se descarga si falta en los dos
+def semanas_materia(materia: Materia, grado: str | None = None):
+    if materia.semanas:
+        return (materia.semanas, next(iter(materia.semanas)))
+
+    with _lock_indice:
+        indice = indice_semanas(grado)
+        c = indice['cuatrimestres'].get(str(materia.cuatrimestre))
+        if c:
+            propias = indice['materias'].get(materia.enlace, {})
+            l = {}
+            for semana in c['semanas']:
+                if semana in propias:
+                    l[semana] = propias[semana]
+                elif semana in c['sufijos']:
+                    l[semana] = materia.enlace + c['sufijos'][semana]
+                else:
+                    break
+            else:
+                return (l, c['primera'])
+
+    l, primera = lista_semanas(materia)
+    indexar_semanas(materia, l, primera, grado)
+    return (l, primera)
+
+tipos_clase = set(i.value for i in TipoClase)
+patron_dia = re.compile(f"[{'|'.join([e.value for e in DiaSemana])}]")
+patron_examenes = re.compile('Exámenes')
+
 # Obtiene los horarios y fechas de exámen de una materia
+# datos_materia saca horario, exámenes y semanas de una sola descarga de la página
 def horario_materia(soup):
-    tb_cl = soup.find('th', text=re.compile(f"[{'|'.join([e.value for e in DiaSemana])}]"))
+    tb_cl = soup.find('th', text=patron_dia)
     if tb_cl:
         grupo_max = { t.value: -1 for t in TipoClase }
         l = []
 
-        for c in tb_cl.parent.parent.parent.findAll('tr'):
-            if c.find('th'):
-                dia = DiaSemana(c.find('th').text)
+        # cada fila se recorre una sola vez: o es el día o es una clase con hora, grupo y aula
+        for c in tb_cl.find_parent('table').findAll('tr'):
+            th = c.find('th')
+            if th:
+                dia = DiaSemana(th.text)
                 continue
 
-            tipo, grupo = c.find_all('td')[1].text.split(' ')[-1][1:].split('_')
-            if not tipo in set(i.value for i in TipoClase):
+            td_hora, td_grupo, td_aula = c.find_all('td')[:3]
+            tipo, grupo = td_grupo.text.split(' ')[-1][1:].split('_')
+            if not tipo in tipos_clase:
                 for t in TipoClase:
                     if tipo in t.value:
                         tipo = t
                         break
             tipo = TipoClase(tipo)
-            hora_inicio, hora_fin = list(map(lambda x: dt.datetime.strptime(x, '%H:%M').time(), c.find_all('td')[0].text.split('-')))
-            
+            hora_inicio, hora_fin = list(map(hora_pagina, td_hora.text.split('-')))
+            grupo = int(grupo)
+
             l.append(HoraClase(
-                grupo = int(grupo),
+                grupo = grupo,
                 dia_semana = dia,
                 hora_inicio = hora_inicio,
                 hora_fin = hora_fin,
-                aula = c.find_all('td')[2].text.split(' ')[-1],
+                aula = compartir_aula(td_aula.text.split(' ')[-1]),
                 tipo = tipo
             ))
 
-            grupo_max[tipo.value] = max(grupo_max[tipo.value], int(grupo))
+            grupo_max[tipo.value] = max(grupo_max[tipo.value], grupo)
 
         return (l, grupo_max)
 
 def examenes_materia(soup):
-    tb_ex = soup.find('caption', text=re.compile('Exámenes'))
+    tb_ex = soup.find('caption', text=patron_examenes)
     if tb_ex:
-        l = []
+        examenes: dict[dt.datetime, Examen] = {}
         for e in tb_ex.parent.findAll('tr', class_='target-items-selector'):
-            str_fecha, _ = e.find_all('td')[0].text.split('-')
+            td = e.find_all('td')
+            str_fecha, _ = td[0].text.split('-')
             fecha = dt.datetime.strptime(str_fecha, '%d.%m.%Y %H:%M')
-            aula = e.find_all('td')[2].text.split(' ')[-1]
+            aula_ex = compartir_aula(td[2].text.split(' ')[-1])
 
-            examen = next(filter(lambda e: e.fecha == fecha, l), None)
-            if examen is None:
-                l.append(Examen(
+            if not fecha in examenes:
+                examenes[fecha] = Examen(
                     fecha = fecha,
-                    aula = {aula}
-                ))
+                    aula = {aula_ex}
+                )
                 continue
-            examen.aula.add(aula)
-        return l
-
-def datos_materia(materia: Materia):
-    dia = DiaSemana.LUNES
-
+            examenes[fecha].aula.add(aula_ex)
+        return list(examenes.values())
+
+# Versión de la página de una materia: su ETag o Last-Modified si el servidor los da, si no un hash de
+# la parte que se analiza (el resto de la página cambia en cada visita)
+def huella_pagina(r, soup = None):
+    if r.headers.get('ETag'):
+        return 'etag ' + r.headers['ETag']
+    if r.headers.get('Last-Modified'):
+        return 'fecha ' + r.headers['Last-Modified']
+    if soup is None:
+        return ''
+    return 'sha256 ' + hashlib.sha256(str(soup).encode('utf-8')).hexdigest()
+
+# Cabeceras para pedir la página solo si ha cambiado desde la huella
+def cabeceras_huella(huella: str):
+    tipo, _, valor = huella.partition(' ')
+    if tipo == 'etag':
+        return { 'If-None-Match': valor }
+    if tipo == 'fecha':
+        return { 'If-Modified-Since': valor }
+    return {}
+
+# Si la materia ya tiene datos y su página no ha cambiado desde su huella se dejan como están
+@medidas.medido('materia.datos')
+def datos_materia(materia: Materia, cortesia: Cortesia | None = None):
     print(f"Obteniendo datos de '{materia.nombre}'...")
 
     try:
-        r = requests.get(materia.enlace)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        if cortesia:
+            cortesia.esperar(materia.enlace)
+        r = red.get(materia.enlace, headers = cabeceras_huella(materia.huella))
+        if r.status_code == 304 or (materia.huella and huella_pagina(r) == materia.huella):
+            return materia.nombre
+        soup = analizar(r.text, SOLO_MATERIA)
+        huella = huella_pagina(r, soup)
+        if huella == materia.huella:
+            return materia.nombre
 
         horario = horario_materia(soup)
-        if horario:
-            materia.horario, materia.num_grupos = horario
-        examenes = examenes_materia(soup)
-        if examenes:
-            materia.examenes = examenes
+        materia.horario, materia.num_grupos = horario or ([], { t.value: -1 for t in TipoClase })
+        materia.examenes = examenes_materia(soup) or []
+        materia.semanas = semanas_pagina(soup, materia.enlace)[0] if soup.find(id = ID_SEMANAS) else {}
+        materia.huella = huella
 
+        materia.grupo_seleccionado = { t.value: -1 for t in TipoClase }
         for h in materia.horario:
             materia.grupo_seleccionado[h.tipo.value] = 0 if materia.tipo == TipoMateria.OPTATIVO else 1
 
@@ -247,11 +824,30 @@ def datos_materia(materia: Materia):
         print(f"Error al obtener datos de '{materia.nombre}'")
         return f"ERROR {materia.nombre}"""
     
-# Cambia la semana del horario de una materia
-def cambiar_semana(materia: Materia):
-    print(f"cambiando semana de {materia.nombre} a '{materia.semana}'")
-    l, _ = lista_semanas(materia)
-    url = l[materia.semana]
+# Horarios de cada semana ya descargados, (enlace, semana) -> (horario, num_grupos)
+cache_semanas: dict[tuple[str, str], tuple[list[HoraClase], dict[str, int]]] = {}
+_lock_semanas = threading.Lock()
+
+def semana_en_cache(materia: Materia, semana: str):
+    with _lock_semanas:
+        return (materia.enlace, semana) in cache_semanas
+
+# Descarta las semanas guardadas de una materia cuya página ha cambiado
+def olvidar_semanas(materia: Materia):
+    with _lock_semanas:
+        for k in [k for k in cache_semanas if k[0] == materia.enlace]:
+            del cache_semanas[k]
+
+# Descarga el horario de una semana concreta mediante la petición AJAX de la web
+@medidas.medido('semana.descargar')
+def horario_semana(materia: Materia, semana: str, url: str | None = None, grado: str | None = None):
+    if url is None:
+        l, _ = semanas_materia(materia, grado)
+        if not semana in l:
+            l, primera = lista_semanas(materia)
+            indexar_semanas(materia, l, primera, grado)
+            materia.semanas = l
+        url = l[semana]
 
     data = "js=true&_drupal_ajax=1&ajax_page_state%5Btheme%5D=usc_theme&ajax_page_state%5Btheme_token%5D=&ajax_page_state%5Blibraries%5D=eu_cookie_compliance%2Feu_cookie_compliance_bare%2Cgoogle_analytics%2Fgoogle_analytics%2Csystem%2Fbase%2Cusc_services%2Fupdate-academic-course%2Cusc_theme%2Fbase-theme%2Cusc_theme%2Fcustom-theme%2Cusc_theme%2Forganization"
     headers = {
@@ -261,7 +857,7 @@ def cambiar_semana(materia: Materia):
         "X-Requested-With": "XMLHttpRequest"
     }
 
-    r = requests.post(url, data=data, headers=headers)
+    r = red.post(url, data=data, headers=headers)
 
     d = None
     for e in r.json():
@@ -269,93 +865,206 @@ def cambiar_semana(materia: Materia):
             continue
         d = e['data']
 
-    soup = BeautifulSoup(d, 'html.parser')
-
-    materia.horario, materia.num_grupos = horario_materia(soup)
+    soup = analizar(d, SOLO_MATERIA)
 
-# Utiliza fuzzy matching para encontrar el nombre de una materia
-def encontrar_materia(materias: list[Materia], busqueda: str):
-    nombres = map(lambda m: (m, fuzz.ratio(busqueda, m.nombre) + 100 * (busqueda in m.nombre)), materias)
+    horario = horario_materia(soup) or ([], { t.value: -1 for t in TipoClase })
+    with _lock_semanas:
+        cache_semanas[(materia.enlace, semana)] = horario
+    return horario
 
-    return list(sorted(nombres, key=lambda x: x[1], reverse = True))[:5]
+# Cambia la semana del horario de una materia, solo descarga si no estaba precargada
+def cambiar_semana(materia: Materia, grado: str | None = None):
+    with _lock_semanas:
+        horario = cache_semanas.get((materia.enlace, materia.semana))
+    if horario is None:
+        print(f"cambiando semana de {materia.nombre} a '{materia.semana}'")
+        medidas.contar('semana.sin_precargar')
+        horario = horario_semana(materia, materia.semana, grado = grado)
+
+    materia.horario, materia.num_grupos = list(horario[0]), dict(horario[1])
+
+# Copias de materias de un mismo grado con sus clases en la semana indicada, las que no tienen esa semana se
+# quedan con las guardadas. Las semanas que no están en cache_semanas se descargan en paralelo
+def materias_semana(materias: list[Materia], semana: str, grado: str | None = None, concurrencia: int = CONCURRENCIA):
+    def en_semana(m: Materia):
+        c = copiar_materia(m)
+        l, _ = semanas_materia(m, grado)
+        if semana in l:
+            c.semana = semana
+            cambiar_semana(c, grado)
+        return c
+
+    with ThreadPoolExecutor(max_workers = concurrencia) as ex:
+        return list(ex.map(en_semana, materias))
+
+# Descarga en segundo plano todas las semanas de las materias indicadas
+def precargar_semanas(materias: list[Materia], concurrencia: int = CONCURRENCIA, espera: float = ESPERA, grado: str | None = None):
+    grado = catalogo.clave() if grado is None else grado
+    def precargar(m: Materia, cortesia: Cortesia):
+        if not str(m.cuatrimestre) in indice_semanas(grado)['cuatrimestres']:
+            cortesia.esperar(m.enlace)
+        l, _ = semanas_materia(m, grado)
+        for semana, url in l.items():
+            if semana_en_cache(m, semana):
+                continue
+            cortesia.esperar(url)
+            try:
+                horario_semana(m, semana, url, grado)
+            except Exception:
+                print(f"Error precargando la semana '{semana}' de '{m.nombre}'")
+
+    def tarea():
+        cortesia = Cortesia(espera)
+        with ThreadPoolExecutor(max_workers = concurrencia) as ex:
+            for f in as_completed([ex.submit(precargar, m, cortesia) for m in materias]):
+                if f.exception():
+                    print(f"Error precargando semanas: {f.exception()}")
+        print(f"Semanas precargadas: {len(cache_semanas)}")
+
+    hilo = threading.Thread(target = tarea, daemon = True)
+    hilo.start()
+    return hilo
+
+# Índice de búsqueda de una lista de materias: el del catálogo si la lista es el catálogo o una copia suya
+# (lista_materias), si no el de la última lista que se ha usado, que solo se rehace cuando cambia
+_indice_lista: IndiceMaterias | None = None
+
+def indice_materias(materias: list[Materia]):
+    global _indice_lista
+    clave = clave_materias(materias)
+    if catalogo.materias is not None:
+        indice = catalogo.indice()
+        if indice.clave == clave:
+            return indice
+    indice = _indice_lista
+    if indice is None or indice.clave != clave:
+        indice = _indice_lista = IndiceMaterias(materias)
+    return indice
+
+# Utiliza fuzzy matching para encontrar el nombre de una materia, devuelve materias de la lista que se pasa
+def encontrar_materia(materias: list[Materia], busqueda: str, n: int = 5):
+    return [(materias[i], p) for i, p in indice_materias(materias).buscar_posiciones(busqueda, n)]
+
+# Igual que encontrar_materia pero sobre el catálogo, con el índice ya construido
+# Las materias son las del catálogo, hay que copiarlas antes de modificarlas
+def buscar_materia(busqueda: str, n: int = 5):
+    return catalogo.indice().buscar(busqueda, n)
+
+# Sugerencias mientras se escribe el nombre de una materia
+def sugerir_materias(texto: str, n: int = 10):
+    return catalogo.indice().prefijo(texto, n)
 
 # Horarios
 # ---
 
-# Crea un nuevo horario (pandas dataframe) para guardar las clases
+# Crea un nuevo horario vacío para guardar las clases
 def iniciar_horario():
-    horas = pd.date_range(start = '09:00', end = '10:00', freq = '30min').strftime('%H:%M')
-    dias = [d.value for d in DiaSemana]
+    return Horario()
 
-    return Horario(pd.DataFrame(index=horas, columns=dias), {})
-
-# Crea un horario del curso indicado
-def horario_curso(curso: int, cuatrimestre: int):
+# Crea un horario del curso indicado, con las materias del catálogo o de la lista que se pase
+# Solo se copian las materias del curso
+@medidas.medido('horario.curso')
+def horario_curso(curso: int, cuatrimestre: int, materias: list[Materia] | None = None):
     horario = iniciar_horario()
 
-    for m in lista_materias():
+    for m in catalogo.leer() if materias is None else materias:
         if m.curso != curso or (m.cuatrimestre > 0 and m.cuatrimestre != cuatrimestre):
             continue
-        incluir_en_horario(horario, m)
+        incluir_en_horario(horario, copiar_materia(m))
 
-    actualizar_horario(horario)
     return horario
 
 # Añade una materia al horario especificado en el grupo indicado
+@medidas.medido('horario.incluir')
 def incluir_en_horario(horario: Horario, materia: Materia):
     if not materia.nombre in horario.materias:
         horario.materias[materia.nombre] = materia
 
-    actualizar_horario(horario)
+    recolocar_materia(horario, horario.materias[materia.nombre])
 
 # Elimina una materia del horario
+@medidas.medido('horario.eliminar')
 def eliminar_de_horario(horario: Horario, materia: Materia | str):
-    horario.materias.pop(materia if isinstance(materia, str) else materia.nombre)
-    actualizar_horario(horario)
+    nombre = materia if isinstance(materia, str) else materia.nombre
+    horario.materias.pop(nombre)
+    retirar_materia(horario, nombre)
+
+# Cambia el grupo de un tipo de clase de una materia, solo se mueven las clases de ese tipo
+@medidas.medido('horario.cambiar_grupo')
+def cambiar_grupo(horario: Horario, nombre: str, tipo: str, grupo: int):
+    materia = horario.materias[nombre]
+    materia.grupo_seleccionado[tipo] = grupo
+    retirar_materia(horario, nombre, [tipo])
+    colocar_materia(horario, materia, [tipo])
+
+# Coloca en la rejilla las clases de los grupos seleccionados de una materia
+# Los conflictos se escriben por la salida estándar salvo que se desactive (por ejemplo en el servidor)
+AVISAR_CONFLICTOS = True
+
+def colocar_materia(horario: Horario, materia: Materia, tipos: list[str] | None = None):
+    for h in materia.horario:
+        if h.grupo != materia.grupo_seleccionado[h.tipo.value] or (tipos and not h.tipo.value in tipos):
+            continue
+
+        mm = f"{materia.abreviatura} {tipo_clase_ch[h.tipo]}{h.grupo}"
+        conflicto = horario.rejilla.anadir(h.dia, h.franja_inicio, h.franja_fin, mm, (materia.nombre, h.tipo.value))
+        if conflicto and AVISAR_CONFLICTOS:
+            franja, m = conflicto
+            print(f"[Conflicto] {mm} / {m} - {h.dia_semana.value} {etiqueta_franja[franja]}")
+
+def retirar_materia(horario: Horario, nombre: str, tipos: list[str] | None = None):
+    for t in tipos or [t.value for t in TipoClase]:
+        horario.rejilla.quitar((nombre, t))
 
-# Actualiza el dataframe del horario
+# Vuelve a colocar una materia después de cambiar sus clases (por ejemplo al cambiar de semana)
+def recolocar_materia(horario: Horario, materia: Materia):
+    retirar_materia(horario, materia.nombre)
+    colocar_materia(horario, materia)
+
+# Celdas (día, hora) con clases de más de un grupo
+def conflictos_horario(horario: Horario):
+    return sorted((DIAS[d], etiqueta_franja[f]) for d, f in horario.rejilla.conflictos)
+
+# Vuelve a colocar en la rejilla las clases de todas las materias
+@medidas.medido('horario.actualizar')
 def actualizar_horario(horario: Horario):
-    horario.df = pd.DataFrame(index=horario.df.index, columns=horario.df.columns)
+    horario.rejilla.limpiar()
     for materia in horario.materias.values():
-        for h in materia.horario:
-            if h.grupo != materia.grupo_seleccionado[h.tipo.value]:
-                continue
+        colocar_materia(horario, materia)
 
-            r = pd.date_range(start=h.hora_inicio.strftime('%H:%M'), end=h.hora_fin.strftime('%H:%M'), freq='30min')[:-1]
-
-            # Comprobar conflictos
-            conflicto = False
-            for hora in r:
-                # Comprobar si el horario tiene esa hora, y si no ampliarlo
-                if not hora.strftime('%H:%M') in horario.df.index:
-                    hmin = min(horario.df.index[0], hora.strftime('%H:%M'))
-                    hmax = max(horario.df.index[-1], hora.strftime('%H:%M'))
-                    horario.df = horario.df.reindex(pd.date_range(start=hmin, end=hmax, freq='30min').strftime('%H:%M'))
-
-                m = horario.df.loc[hora.strftime('%H:%M'), h.dia_semana.value]
-                if not pd.isna(m):
-                    mm = f"{materia.abreviatura} {tipo_clase_ch[h.tipo]}{h.grupo}"
-                    if m == mm:
-                        continue
-                    if not conflicto:
-                        print(f"[Conflicto] {mm} / {m} - {h.dia_semana.value} {hora.strftime('%H:%M')}")
-                    conflicto = True
-
-            for hora in r:
-                m = set(str(horario.df.loc[hora.strftime('%H:%M'), h.dia_semana.value]).split(' / '))
-                m.add(f"{materia.abreviatura} {tipo_clase_ch[h.tipo]}{h.grupo}")
-                m = list(filter(lambda x: x != 'nan', m))
-                horario.df.loc[hora.strftime('%H:%M'), h.dia_semana.value] = ' / '.join(sorted(m))
+# Colores
+# ---
+
+a_hex = lambda rgb: '#%02x%02x%02x' % tuple(map(lambda x: int(x*255), rgb))
+COLOR_VACIO = '#fff6eb'
+COLOR_CONFLICTO = a_hex(hsv_to_rgb(0.0, 0.4, 1.0))
+
+# Un color por abreviatura repartidos por el círculo cromático. Depende solo del conjunto de materias que se
+# ven en el horario, así que se calcula una vez por conjunto (en orden alfabético para que sea estable)
+@lru_cache(maxsize = 256)
+def colores_materias(abreviaturas: frozenset[str]):
+    u = sorted(abreviaturas)
+    return { x: a_hex(hsv_to_rgb((i + 1) / (len(u) + 1), 0.4, 1.0)) for i, x in enumerate(u) }
+
+def estilo_celda(texto: str, colores: dict[str, str]):
+    if texto == '':
+        return f'background: {COLOR_VACIO}'
+    if '/' in texto:
+        return f'background: {COLOR_CONFLICTO}'
+    style = f'background: {colores[texto.split(" ")[0]]}'
+    if 'E' in texto.split(' ')[-1]:
+        style += '; font-style: italic'
+    if 'I' in texto.split(' ')[-1]:
+        style += '; font-weight: bold'
+    return style
 
 # Formatear horario con colores y estilo
+@medidas.medido('render.styler')
 def formato_horario(horario: Horario):
     u = horario.df.stack()
     u = filter(lambda x: x != '' and not '/' in x, u)
     u = map(lambda x: x.split(' ')[0], u)
-    u = set(u)
-    color = lambda i, t: hsv_to_rgb((i + 1) / (t + 1), 0.4, 1.0)
-    to_hex = lambda rgb: '#%02x%02x%02x' % tuple(map(lambda x: int(x*255), rgb))
-    u_colors = {x: to_hex(color(i, len(u))) for i, x in enumerate(u)}
+    u_colors = colores_materias(frozenset(u))
     
     """filtered = horario.df.dropna(how='all')
     empty = horario.df.index.difference(filtered.index)
@@ -365,16 +1074,7 @@ def formato_horario(horario: Horario):
     horario.df = filtered"""
     
     def color(texto):
-        if texto == '':
-            return 'background: #fff6eb'
-        if '/' in texto:
-            return f'background: {to_hex(hsv_to_rgb(0.0, 0.4, 1.0))}'
-        style = f'background: {u_colors[texto.split(" ")[0]]}'
-        if 'E' in texto.split(' ')[-1]:
-            style += '; font-style: italic'
-        if 'I' in texto.split(' ')[-1]:
-            style += '; font-weight: bold'
-        return style
+        return estilo_celda(texto, u_colors)
 
     def make_pretty(styler):
         styler.set_table_styles([
@@ -388,3 +1088,50 @@ def formato_horario(horario: Horario):
         return styler
 
     return horario.df.fillna('').style.pipe(make_pretty)
+
+# Tabla html del horario construida directamente desde la rejilla, con el mismo aspecto que formato_horario
+# pero sin pasar por el DataFrame ni el Styler de pandas. Se guarda en una caché por el contenido de la
+# rejilla (las clases colocadas y el rango de horas), así volver a una combinación de grupos o semana
+# que ya se ha visto no vuelve a generar nada
+TAM_CACHE_HTML = 256
+_cache_html: OrderedDict[tuple, str] = OrderedDict()
+_lock_html = threading.Lock()
+
+@medidas.medido('render.html')
+def html_horario(horario: Horario):
+    r = horario.rejilla
+    clave = (r.desde, r.hasta, frozenset(p for piezas in r.piezas.values() for p in piezas))
+    with _lock_html:
+        html = _cache_html.get(clave)
+        if html is not None:
+            _cache_html.move_to_end(clave)
+            medidas.contar('render.cache_aciertos')
+            return html
+
+    html = generar_html(r)
+    with _lock_html:
+        _cache_html[clave] = html
+        if len(_cache_html) > TAM_CACHE_HTML:
+            _cache_html.popitem(last = False)
+    return html
+
+@medidas.medido('render.generar')
+def generar_html(r: Rejilla):
+    franjas = range(r.desde, r.hasta + 1)
+    textos = [[r.texto(d, f) for d in range(len(r.columnas))] for f in franjas]
+    colores = colores_materias(frozenset(t.split(' ')[0] for fila in textos for t in fila if t != '' and not '/' in t))
+    estilos: dict[str, str] = {}
+
+    l = ['<style>.horario th { background: #fac27d; } .horario * { color: black; text-align: center; }</style>',
+         '<table class="horario">', '<thead><tr><th></th>']
+    l += [f'<th>{escape(c)}</th>' for c in r.columnas]
+    l.append('</tr></thead><tbody>')
+    for f, fila in zip(franjas, textos):
+        l.append(f'<tr><th>{etiqueta_franja[f]}</th>')
+        for t in fila:
+            if not t in estilos:
+                estilos[t] = estilo_celda(t, colores)
+            l.append(f'<td style="{estilos[t]}">{escape(t)}</td>')
+        l.append('</tr>')
+    l.append('</tbody></table>')
+    return ''.join(l)
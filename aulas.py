@@ -0,0 +1,95 @@
+# Ocupación de las aulas del centro a partir de las clases del catálogo
+# Cada aula tiene por día una máscara de bits con las medias horas ocupadas (como en rejilla.py), así saber
+# si está libre en un intervalo es un AND. Se cuentan las clases de todos los grupos
+#
+# Las clases se guardan por materia para poder añadir las materias de otro grado del mismo centro. Una materia
+# que ya está se sustituye, así las que comparten varios grados (mismo enlace) no se cuentan dos veces. Cada
+# índice es de una semana: el catálogo (api.Catalogo.aulas) tiene uno con la semana guardada y otro por cada
+# semana que se le pide, las semanas que carga cada sesión en sus copias no les afectan
+
+import datetime as dt
+import threading
+from dataclasses import dataclass
+
+from rejilla import MINUTOS_FRANJA, mascara
+
+DIAS = 5
+
+@dataclass(frozen = True, slots = True)
+class ClaseAula:
+    dia: int # 0 = lunes
+    inicio: int # franjas de media hora desde las 00:00
+    fin: int
+    materia: str
+    tipo: str
+    grupo: int
+    enlace: str
+
+def franja(hora: dt.time):
+    return (hora.hour * 60 + hora.minute) // MINUTOS_FRANJA
+
+# Franja en la que termina un intervalo, redondeando hacia arriba para contar la última media hora empezada
+def franja_fin(hora: dt.time):
+    return -(-(hora.hour * 60 + hora.minute) // MINUTOS_FRANJA)
+
+class IndiceAulas:
+    def __init__(self, materias: list | None = None):
+        self.materias = materias if materias is not None else []
+        self.lock = threading.Lock()
+        self.clases: dict[str, list[ClaseAula]] = {} # aula -> clases
+        self.ocupado: dict[str, list[int]] = {} # aula -> máscara por día
+        self.por_materia: dict[str, set[str]] = {} # enlace -> aulas en las que tiene clase
+        self.anadir(self.materias)
+
+    # Añade materias (por ejemplo de otro grado del centro), las que ya estaban se sustituyen
+    def anadir(self, materias: list):
+        with self.lock:
+            for m in materias:
+                self._quitar(m.enlace)
+                self._poner(m)
+
+    def _poner(self, m):
+        aulas = set()
+        for h in m.horario:
+            self.clases.setdefault(h.aula, []).append(ClaseAula(h.dia, h.franja_inicio, h.franja_fin, m.nombre, h.tipo.value, h.grupo, m.enlace))
+            aulas.add(h.aula)
+        self.por_materia[m.enlace] = aulas
+        for aula in aulas:
+            self._recalcular(aula)
+
+    def _quitar(self, enlace: str):
+        for aula in self.por_materia.pop(enlace, set()):
+            self.clases[aula] = [c for c in self.clases[aula] if c.enlace != enlace]
+            self._recalcular(aula)
+
+    def _recalcular(self, aula: str):
+        if not self.clases[aula]:
+            del self.clases[aula]
+            del self.ocupado[aula]
+            return
+        dias = [0] * DIAS
+        for c in self.clases[aula]:
+            dias[c.dia] |= mascara(c.inicio, c.fin)
+        self.ocupado[aula] = dias
+
+    # Consultas
+    # ---
+
+    def aulas(self):
+        with self.lock:
+            return sorted(self.ocupado)
+
+    # Aulas sin ninguna clase el día indicado entre desde y hasta (desde tiene que ser anterior)
+    def libres(self, dia: int, desde: dt.time, hasta: dt.time):
+        m = mascara(franja(desde), franja_fin(hasta))
+        with self.lock:
+            return sorted(a for a, dias in self.ocupado.items() if not dias[dia] & m)
+
+    def libre(self, aula: str, dia: int, desde: dt.time, hasta: dt.time):
+        with self.lock:
+            return aula in self.ocupado and not self.ocupado[aula][dia] & mascara(franja(desde), franja_fin(hasta))
+
+    # Clases de un aula en la semana cargada, por día y hora
+    def ocupacion(self, aula: str):
+        with self.lock:
+            return sorted(self.clases.get(aula, []), key = lambda c: (c.dia, c.inicio, c.materia))
@@ -0,0 +1 @@
+# Benchmarks que no necesitan acceso a usc.gal
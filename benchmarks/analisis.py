@@ -0,0 +1,104 @@
+# Tiempo de análisis de las páginas de materias: página completa con html.parser (como antes) frente a
+# solo las partes que se usan (SoupStrainer) con html.parser y con lxml
+# Comprueba que horario, exámenes y semanas salen iguales en todas las variantes
+#
+#   python -m benchmarks.analisis [--paginas directorio_con_html] [--repeticiones 3]
+
+import argparse
+import glob
+import os
+import re
+import time
+import datetime as dt
+
+from bs4 import BeautifulSoup
+
+import api
+from benchmarks.stub import cargar_materias, pagina_materia
+
+# Implementaciones anteriores, se mantienen como referencia
+def horario_anterior(soup):
+    tb_cl = soup.find('th', text=re.compile(f"[{'|'.join([e.value for e in api.DiaSemana])}]"))
+    if tb_cl:
+        grupo_max = { t.value: -1 for t in api.TipoClase }
+        l = []
+        for c in tb_cl.parent.parent.parent.findAll('tr'):
+            if c.find('th'):
+                dia = api.DiaSemana(c.find('th').text)
+                continue
+            tipo, grupo = c.find_all('td')[1].text.split(' ')[-1][1:].split('_')
+            if not tipo in set(i.value for i in api.TipoClase):
+                for t in api.TipoClase:
+                    if tipo in t.value:
+                        tipo = t
+                        break
+            tipo = api.TipoClase(tipo)
+            hora_inicio, hora_fin = list(map(lambda x: dt.datetime.strptime(x, '%H:%M').time(), c.find_all('td')[0].text.split('-')))
+            l.append(api.HoraClase(int(grupo), dia, hora_inicio, hora_fin, c.find_all('td')[2].text.split(' ')[-1], tipo))
+            grupo_max[tipo.value] = max(grupo_max[tipo.value], int(grupo))
+        return (l, grupo_max)
+
+def examenes_anterior(soup):
+    tb_ex = soup.find('caption', text=re.compile('Exámenes'))
+    if tb_ex:
+        l = []
+        for e in tb_ex.parent.findAll('tr', class_='target-items-selector'):
+            str_fecha, _ = e.find_all('td')[0].text.split('-')
+            fecha = dt.datetime.strptime(str_fecha, '%d.%m.%Y %H:%M')
+            aula = e.find_all('td')[2].text.split(' ')[-1]
+            examen = next(filter(lambda e: e.fecha == fecha, l), None)
+            if examen is None:
+                l.append(api.Examen(fecha, {aula}))
+                continue
+            examen.aula.add(aula)
+        return l
+
+def semanas(soup):
+    return [a['href'] for a in soup.find(id = api.ID_SEMANAS).findAll('a')]
+
+def anterior(html: str):
+    soup = BeautifulSoup(html, 'html.parser')
+    return horario_anterior(soup), examenes_anterior(soup), semanas(soup)
+
+def variante(parser: str):
+    def analizar(html: str):
+        soup = BeautifulSoup(html, parser, parse_only = api.SOLO_MATERIA)
+        return api.horario_materia(soup), api.examenes_materia(soup), semanas(soup)
+    return analizar
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark de análisis de páginas de materias')
+    parser.add_argument('--materias', default = 'materias.json')
+    parser.add_argument('--paginas', help = 'directorio con páginas de materias guardadas (.html)')
+    parser.add_argument('--repeticiones', type = int, default = 3)
+    args = parser.parse_args()
+
+    if args.paginas:
+        paginas = []
+        for ruta in sorted(glob.glob(os.path.join(args.paginas, '**', '*.html'), recursive = True)):
+            with open(ruta, encoding = 'utf-8') as f:
+                paginas.append(f.read())
+    else:
+        paginas = [pagina_materia(m) for m in cargar_materias(args.materias)]
+
+    variantes = { 'completa html.parser': anterior, 'parcial html.parser': variante('html.parser'), 'parcial lxml': variante('lxml') }
+
+    referencia = [anterior(p) for p in paginas]
+    base = None
+    print(f"{len(paginas)} páginas, {sum(map(len, paginas)) / 1e6:.1f}MB")
+    print(f"{'variante':>22} {'total':>9} {'por página':>11} {'mejora':>7}")
+    for nombre, f in variantes.items():
+        resultado = [f(p) for p in paginas]
+        assert resultado == referencia, f'{nombre}: el resultado no coincide con el análisis completo'
+
+        mejor = float('inf')
+        for _ in range(args.repeticiones):
+            t = time.perf_counter()
+            for p in paginas:
+                f(p)
+            mejor = min(mejor, time.perf_counter() - t)
+        base = base or mejor
+        print(f'{nombre:>22} {mejor * 1000:>7.0f}ms {mejor / len(paginas) * 1000:>9.2f}ms {base / mejor:>6.1f}x')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Índice de ocupación de aulas (aulas.py) sobre un catálogo sintético de varios grados del mismo centro
+# Mide la construcción, las consultas de aulas libres y de la ocupación de un aula frente a recorrer todas
+# las clases del catálogo, y lo que cuesta el índice de otra semana (api.materias_semana) con sus semanas ya
+# descargadas
+#
+#   python -m benchmarks.aulas [--grados 20] [--consultas 2000]
+
+import argparse
+import datetime as dt
+import json
+import random
+import time
+
+import api
+from aulas import IndiceAulas
+from benchmarks.horario import percentil
+from benchmarks.sintetico import catalogo_sintetico
+from rejilla import etiqueta_franja
+
+# Referencias recorriendo todas las clases
+def libres_recorrido(materias: list[api.Materia], dia: int, desde: int, hasta: int):
+    aulas = { h.aula for m in materias for h in m.horario }
+    ocupadas = { h.aula for m in materias for h in m.horario if h.dia == dia and h.franja_inicio < hasta and h.franja_fin > desde }
+    return sorted(aulas - ocupadas)
+
+def ocupacion_recorrido(materias: list[api.Materia], aula: str):
+    return sorted(((h.dia, h.franja_inicio, m.nombre) for m in materias for h in m.horario if h.aula == aula))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark del índice de aulas')
+    parser.add_argument('--grados', type = int, default = 20)
+    parser.add_argument('--consultas', type = int, default = 2000)
+    args = parser.parse_args()
+
+    with open(api.ARCHIVO_MATERIAS, 'r', encoding = 'utf-8') as f:
+        base = json.load(f)
+    materias = [api.materia_de_dict(m) for m in catalogo_sintetico(base, args.grados)]
+    n_clases = sum(len(m.horario) for m in materias)
+
+    t = time.perf_counter()
+    indice = IndiceAulas(materias)
+    t_indice = time.perf_counter() - t
+    aulas = indice.aulas()
+
+    rnd = random.Random(0)
+    tiempos = { 'libres': [], 'ocupacion': [] }
+    referencia = { 'libres': [], 'ocupacion': [] }
+    for i in range(args.consultas):
+        dia = rnd.randrange(5)
+        desde = rnd.randrange(16, 40)
+        hasta = desde + rnd.randint(1, 4)
+        h_desde, h_hasta = (dt.time.fromisoformat(etiqueta_franja[f]) for f in (desde, hasta))
+        t = time.perf_counter()
+        r = indice.libres(dia, h_desde, h_hasta)
+        tiempos['libres'].append(time.perf_counter() - t)
+
+        aula = rnd.choice(aulas)
+        t = time.perf_counter()
+        o = indice.ocupacion(aula)
+        tiempos['ocupacion'].append(time.perf_counter() - t)
+
+        # la comparación con el recorrido completo es lenta, se hace en una de cada 20 consultas
+        if i % 20 == 0:
+            t = time.perf_counter()
+            ref = libres_recorrido(materias, dia, desde, hasta)
+            referencia['libres'].append(time.perf_counter() - t)
+            assert ref == r, 'las aulas libres no coinciden'
+
+            t = time.perf_counter()
+            ref = ocupacion_recorrido(materias, aula)
+            referencia['ocupacion'].append(time.perf_counter() - t)
+            assert ref == sorted((c.dia, c.inicio, c.materia) for c in o), 'la ocupación no coincide'
+
+    # otra semana: las mismas clases al día siguiente, ya en la caché de semanas como tras la precarga
+    for m in materias:
+        m.semanas = { 'siguiente': m.enlace + '?semana=1' }
+        api.cache_semanas[(m.enlace, 'siguiente')] = ([api.HoraClase(h.grupo, api.DIAS[(h.dia + 1) % 5], h.hora_inicio, h.hora_fin, h.aula, h.tipo) for h in m.horario], m.num_grupos)
+    t = time.perf_counter()
+    siguiente = api.materias_semana(materias, 'siguiente')
+    indice_siguiente = IndiceAulas(siguiente)
+    t_semana = time.perf_counter() - t
+    assert indice_siguiente.libres(1, dt.time(10), dt.time(12)) == libres_recorrido(siguiente, 1, 20, 24), 'las aulas libres de la semana no coinciden'
+
+    print(f'{len(materias)} materias de {args.grados} grados, {n_clases} clases en {len(aulas)} aulas, índice {t_indice * 1000:.1f}ms, '
+          f'índice de otra semana {t_semana * 1000:.1f}ms')
+    print(f"{'consulta':<12} {'p50':>9} {'p95':>9} {'p99':>9} {'recorrido p50':>14}")
+    us = lambda s: f'{s * 1e6:.0f}us'
+    for k, l in tiempos.items():
+        ref = us(percentil(referencia[k], 50)) if k in referencia else '-'
+        print(f'{k:<12} {us(percentil(l, 50)):>9} {us(percentil(l, 95)):>9} {us(percentil(l, 99)):>9} {ref:>14}')
+
+if __name__ == '__main__':
+    main()
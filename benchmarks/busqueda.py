@@ -0,0 +1,82 @@
+# Búsqueda de materias con el índice de buscador.py frente a recorrer el catálogo con fuzz.ratio
+# sobre un catálogo sintético de varios grados
+#
+#   python -m benchmarks.busqueda [--grados 40]
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from rapidfuzz import fuzz
+
+import api
+from buscador import IndiceMaterias
+from benchmarks.stub import cargar_materias
+from benchmarks.sintetico import catalogo_sintetico, guardar
+
+# Implementación anterior de encontrar_materia, se mantiene como referencia
+def encontrar_lineal(materias: list[api.Materia], busqueda: str):
+    nombres = map(lambda m: (m, fuzz.ratio(busqueda, m.nombre) + 100 * (busqueda in m.nombre)), materias)
+    return list(sorted(nombres, key=lambda x: x[1], reverse = True))[:5]
+
+def consultas(materias: list[api.Materia], n: int, semilla: int = 0):
+    rnd = random.Random(semilla)
+    l = []
+    for _ in range(n):
+        m = rnd.choice(materias).nombre
+        tipo = rnd.randrange(3)
+        if tipo == 0:
+            l.append(m) # nombre completo, como al elegirlo de la lista
+        elif tipo == 1:
+            i = rnd.randrange(len(m) // 2)
+            l.append(m[i:i + max(4, len(m) // 3)]) # trozo del nombre
+        else:
+            i = rnd.randrange(len(m))
+            l.append(m[:i] + m[i + 1:]) # con una errata
+    return l
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark de búsqueda de materias')
+    parser.add_argument('--materias', default = 'materias.json')
+    parser.add_argument('--grados', type = int, default = 40)
+    parser.add_argument('--consultas', type = int, default = 200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, 'materias.json')
+        guardar(catalogo_sintetico(cargar_materias(args.materias), args.grados), ruta)
+        materias = api.leer_materias(ruta)
+
+    t = time.perf_counter()
+    indice = IndiceMaterias(materias)
+    construccion = time.perf_counter() - t
+
+    qs = consultas(materias, args.consultas)
+    tiempos = { 'lineal': [], 'indice': [], 'prefijo': [] }
+    iguales = 0
+    for q in qs:
+        t = time.perf_counter()
+        a = encontrar_lineal(materias, q)
+        tiempos['lineal'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        b = indice.buscar(q)
+        tiempos['indice'].append(time.perf_counter() - t)
+        iguales += a[0][0].nombre == b[0][0].nombre
+
+        t = time.perf_counter()
+        indice.prefijo(q[:max(3, len(q) // 2)])
+        tiempos['prefijo'].append(time.perf_counter() - t)
+
+    print(f'{len(materias)} materias, índice construido en {construccion * 1000:.1f}ms')
+    print(f"{'búsqueda':>10} {'p50':>9} {'p95':>9}")
+    for k, l in tiempos.items():
+        q = statistics.quantiles(l, n = 100)
+        print(f'{k:>10} {q[49] * 1000:>7.3f}ms {q[94] * 1000:>7.3f}ms')
+    print(f'Mismo primer resultado que la búsqueda lineal en {iguales}/{len(qs)} consultas')
+
+if __name__ == '__main__':
+    main()
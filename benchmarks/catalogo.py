@@ -0,0 +1,56 @@
+# Compara la carga del catálogo en JSON (json + dacite) con el formato binario de binario.py y el almacén
+# SQLite de almacen.py, que solo lee los datos generales de cada materia hasta que se usan
+#
+#   python -m benchmarks.catalogo [--grados 1 5 20] [--repeticiones 5]
+
+import argparse
+import os
+import tempfile
+import time
+from dataclasses import fields
+
+import api
+from benchmarks.stub import cargar_materias
+from benchmarks.sintetico import catalogo_sintetico, guardar
+
+def mejor_tiempo(f, repeticiones: int):
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        t = time.perf_counter()
+        r = f()
+        mejor = min(mejor, time.perf_counter() - t)
+    return mejor, r
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark de carga del catálogo')
+    parser.add_argument('--materias', default = 'materias.json')
+    parser.add_argument('--grados', type = int, nargs = '+', default = [1, 5, 20])
+    parser.add_argument('--repeticiones', type = int, default = 5)
+    args = parser.parse_args()
+
+    base = cargar_materias(args.materias)
+    print(f"{'grados':>6} {'materias':>8} {'json':>9} {'bin':>9} {'db':>9} {'carga json':>11} {'carga bin':>10} {'carga db':>9} {'db + 1 curso':>13}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.grados:
+            json_ = os.path.join(tmp, f'materias_{n}.json')
+            bin_ = os.path.join(tmp, f'materias_{n}.bin')
+            db = os.path.join(tmp, f'catalogo_{n}.db')
+            guardar(catalogo_sintetico(base, n), json_)
+            api.escribir_archivo(api.leer_materias(json_), bin_)
+            api.escribir_archivo(api.leer_materias(json_), db, 'https://stub', 'Grao en Stub')
+
+            t_json, l_json = mejor_tiempo(lambda: api.leer_materias(json_), args.repeticiones)
+            t_bin, l_bin = mejor_tiempo(lambda: api.leer_materias(bin_), args.repeticiones)
+            assert l_json == l_bin, 'el formato binario no reproduce el catálogo'
+            t_db, l_db = mejor_tiempo(lambda: api.leer_materias(db), args.repeticiones)
+            # lo que se lee al abrir la aplicación: el catálogo y el horario de las materias del primer curso
+            t_curso, _ = mejor_tiempo(lambda: [m.horario for m in api.leer_materias(db) if m.curso == 1 and m.cuatrimestre == 1], args.repeticiones)
+            campos = lambda l: [tuple(getattr(m, f.name) for f in fields(api.Materia)) for m in l]
+            assert campos(l_json) == campos(l_db), 'el almacén no reproduce el catálogo'
+
+            kb = lambda r: f'{os.path.getsize(r) / 1024:.0f}KB'
+            ms = lambda t: f'{t * 1000:.1f}ms'
+            print(f'{n:>6} {len(l_json):>8} {kb(json_):>9} {kb(bin_):>9} {kb(db):>9} {ms(t_json):>11} {ms(t_bin):>10} {ms(t_db):>9} {ms(t_curso):>13}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+# Escalado del buscador de combinaciones de grupos
+# Empieza por cada curso y después junta cursos del mismo cuatrimestre para aumentar el número de variables
+#
+#   python -m benchmarks.combinaciones [-n 5] [--cursos 2] [--procesos 4]
+
+import argparse
+import contextlib
+import io
+import time
+
+import api
+import combinaciones
+
+def horario(cursos: list[int], cuatrimestre: int):
+    h = api.iniciar_horario()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for m in api.lista_materias():
+            if m.curso in cursos and m.cuatrimestre in (0, cuatrimestre):
+                api.incluir_en_horario(h, m)
+    return h
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark del buscador de combinaciones')
+    parser.add_argument('-n', type = int, default = 5, help = 'número de soluciones')
+    parser.add_argument('--cursos', type = int, default = 2, help = 'máximo de cursos juntos')
+    parser.add_argument('--procesos', type = int, default = 0, help = 'si se indica, mide también la búsqueda en paralelo')
+    args = parser.parse_args()
+
+    print(f"{'cursos':>8} {'cuatri':>6} {'materias':>8} {'variables':>9} {'combinaciones':>14} {'nodos':>8} {'tiempo':>9} {'mejor':>12}" + (f" {'paralelo':>9}" if args.procesos else ''))
+    escenarios = [([c], q) for c in range(1, 5) for q in (1, 2)]
+    escenarios += [(list(range(1, k + 1)), q) for k in range(2, args.cursos + 1) for q in (1, 2)]
+    for cursos, q in escenarios:
+        h = horario(cursos, q)
+        vs = combinaciones.variables(h)
+        est = {}
+        t = time.perf_counter()
+        r = combinaciones.buscar(vs, args.n, list(combinaciones.COSTES.values()), estadisticas = est)
+        t = time.perf_counter() - t
+        mejor = f'{r[0].conflictos}c {r[0].coste:g}' if r else '-'
+        nombre = '+'.join(map(str, cursos))
+        linea = f"{nombre:>8} {q:>6} {len(h.materias):>8} {len(vs):>9} {combinaciones.combinaciones(vs):>14} {est['nodos']:>8} {t * 1000:>7.1f}ms {mejor:>12}"
+        if args.procesos:
+            t = time.perf_counter()
+            p = combinaciones.buscar_paralelo(vs, args.n, list(combinaciones.COSTES.values()), args.procesos)
+            t = time.perf_counter() - t
+            assert [(s.conflictos, s.coste) for s in p] == [(s.conflictos, s.coste) for s in r]
+            linea += f' {t * 1000:>7.1f}ms'
+        print(linea)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# Compara la descarga secuencial y concurrente de generar_lista_materias contra el servidor local
+#
+#   python -m benchmarks.descarga [--latencia 0.2] [--concurrencia 1 4 8 16]
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import api
+import red
+from benchmarks.stub import Stub, GRADO, cargar_materias
+
+def medir(stub: Stub, concurrencia: int, espera: float):
+    t = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        nombres = list(api.generar_lista_materias(stub.url_centro, GRADO, concurrencia, espera))
+    errores = sum('ERROR' in n for n in nombres)
+    return time.perf_counter() - t, len(nombres), errores
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark de descarga de materias')
+    parser.add_argument('--materias', default = 'materias.json')
+    parser.add_argument('--latencia', type = float, default = 0.2, help = 'latencia simulada por petición (s)')
+    parser.add_argument('--espera', type = float, default = 0.0, help = 'espera de cortesía entre peticiones (s)')
+    parser.add_argument('--concurrencia', type = int, nargs = '+', default = [1, 4, 8, 16])
+    args = parser.parse_args()
+
+    stub = Stub(cargar_materias(args.materias), latencia = args.latencia).iniciar()
+
+    # generar_lista_materias escribe materias.json en el directorio actual
+    anterior = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            base = None
+            print(f"{'concurrencia':>12} {'materias':>8} {'errores':>7} {'tiempo':>8} {'mejora':>7}")
+            for c in args.concurrencia:
+                red.configurar(os.path.join(tmp, f'cache_{c}')) # cada medida empieza con la caché vacía
+                t, n, e = medir(stub, c, args.espera)
+                base = base or t
+                print(f'{c:>12} {n:>8} {e:>7} {t:>7.2f}s {base / t:>6.1f}x')
+
+            # Segunda carga con la caché de la última medida: solo se revalida
+            red.configurar(os.path.join(tmp, f'cache_{c}'))
+            t, n, e = medir(stub, c, args.espera)
+            print(f'{"revalidando":>12} {n:>8} {e:>7} {t:>7.2f}s {base / t:>6.1f}x')
+            print(red.estadisticas)
+        finally:
+            os.chdir(anterior)
+    stub.shutdown()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Calendario de exámenes (examenes.py) sobre un catálogo sintético de varios grados
+# Mide la construcción del índice, los picos de ocupación de aulas y las consultas que se hacen en la
+# interfaz con cada cambio (choques y exámenes seguidos de un horario), y compara los choques con una
+# comprobación de todas las parejas
+#
+#   python -m benchmarks.examenes [--grados 20] [--horarios 500]
+
+import argparse
+import datetime as dt
+import json
+import random
+import time
+
+import api
+import examenes
+from benchmarks.horario import percentil
+from benchmarks.sintetico import catalogo_sintetico
+
+# Mueve los exámenes de cada grado (catalogo_sintetico los pone seguidos, por_grado en cada uno) unos días y
+# horas para que no coincidan todos
+def mover_examenes(materias: list[dict], por_grado: int):
+    for i, m in enumerate(materias):
+        g = i // por_grado
+        for e in m['examenes']:
+            fecha = dt.datetime.fromisoformat(e['fecha']) + dt.timedelta(days = g % 5, hours = g % 3)
+            e['fecha'] = fecha.isoformat()
+    return materias
+
+# Todas las parejas de exámenes de materias distintas, como referencia
+def choques_parejas(materias: list[api.Materia]):
+    l = [(e.fecha, m.enlace) for m in materias for e in m.examenes]
+    return sorted(tuple(sorted([a, b])) for i, a in enumerate(l) for b in l[i + 1:]
+                  if a[1] != b[1] and abs(a[0] - b[0]) < examenes.DURACION_EXAMEN)
+
+# Materias del catálogo que chocan con un horario recorriendo todos los exámenes, como referencia de choques_con
+def choques_recorrido(catalogo: list[api.Materia], materias: list[api.Materia]):
+    enlaces = { m.enlace for m in materias }
+    fechas = [e.fecha for m in materias for e in m.examenes]
+    return { m.nombre for m in catalogo if not m.enlace in enlaces for e in m.examenes
+             if any(abs(e.fecha - f) < examenes.DURACION_EXAMEN for f in fechas) }
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark del calendario de exámenes')
+    parser.add_argument('--grados', type = int, default = 20)
+    parser.add_argument('--horarios', type = int, default = 500, help = 'conjuntos de materias al azar a consultar')
+    args = parser.parse_args()
+
+    with open(api.ARCHIVO_MATERIAS, 'r', encoding = 'utf-8') as f:
+        base = json.load(f)
+    materias = [api.materia_de_dict(m) for m in mover_examenes(catalogo_sintetico(base, args.grados), len(base))]
+    n_examenes = sum(len(m.examenes) for m in materias)
+
+    t = time.perf_counter()
+    indice = examenes.IndiceExamenes(materias)
+    t_indice = time.perf_counter() - t
+
+    t = time.perf_counter()
+    picos = indice.picos_aulas()
+    t_picos = time.perf_counter() - t
+
+    # horarios como los de la interfaz: un curso de un grado y alguna materia de otro
+    rnd = random.Random(0)
+    por_curso: dict[tuple, list[api.Materia]] = {}
+    for i, m in enumerate(materias):
+        por_curso.setdefault((i // len(base), m.curso, m.cuatrimestre), []).append(m)
+    cursos = list(por_curso.values())
+    horarios = [rnd.choice(cursos) + rnd.sample(materias, rnd.randint(0, 3)) for _ in range(args.horarios)]
+
+    tiempos = { 'choques': [], 'seguidos': [], 'choques_con': [], 'parejas': [], 'recorrido': [] }
+    for h in horarios:
+        t = time.perf_counter()
+        choques = indice.choques(h)
+        tiempos['choques'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        indice.seguidos(h)
+        tiempos['seguidos'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        con = indice.choques_con(h)
+        tiempos['choques_con'].append(time.perf_counter() - t)
+
+        t = time.perf_counter()
+        ref = choques_parejas(h)
+        tiempos['parejas'].append(time.perf_counter() - t)
+        t = time.perf_counter()
+        ref_con = choques_recorrido(materias, h)
+        tiempos['recorrido'].append(time.perf_counter() - t)
+        assert ref_con == con, 'choques_con no coincide'
+        assert ref == sorted(tuple(sorted([(a.inicio, a.enlace), (b.inicio, b.enlace)])) for a, b in choques), 'los choques no coinciden'
+
+    print(f'{len(materias)} materias de {args.grados} grados, {n_examenes} exámenes ({len(indice.examenes)} distintos)')
+    print(f'índice {t_indice * 1000:.1f}ms, picos de aulas de {len(picos)} días {t_picos * 1000:.1f}ms, el mayor con {max(p.examenes for p in picos)} exámenes a la vez')
+    print(f"{'consulta':<12} {'p50':>9} {'p95':>9} {'p99':>9}")
+    us = lambda s: f'{s * 1e6:.0f}us'
+    for k, l in tiempos.items():
+        print(f'{k:<12} {us(percentil(l, 50)):>9} {us(percentil(l, 95)):>9} {us(percentil(l, 99)):>9}')
+
+if __name__ == '__main__':
+    main()
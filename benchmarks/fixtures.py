@@ -0,0 +1,160 @@
+# Respuestas grabadas de usc.gal para medir sin depender de la web
+# Al grabar se descarga un grado completo con el código de siempre (generar_lista_materias y la precarga de
+# todas las semanas) y se guarda cada respuesta: la página del centro, la de cada materia y el AJAX de cada
+# semana. Después el reproductor sirve esas respuestas desde un servidor local igual que stub.py, cambiando
+# en los cuerpos la dirección de la web por la suya
+#
+#   python -m benchmarks.fixtures grabar --url https://www.usc.gal/es/centro/NOMBRE --grado 'Grao en ...' [--nombre etse]
+#   python -m benchmarks.fixtures servir [--nombre etse] [--puerto 8000] [--latencia 0.2]
+#   python -m benchmarks.fixtures sintetico [--nombre stub]     graba las páginas generadas por stub.py
+#
+# Cada grabación es una carpeta benchmarks/fixtures/<nombre> con indice.json y los cuerpos comprimidos en
+# cuerpos/<sha256>.gz (las respuestas iguales se guardan una vez)
+
+import argparse
+import contextlib
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from urllib.parse import urlparse
+
+import api
+import red
+from benchmarks.stub import Stub, GRADO, cargar_materias
+
+DIRECTORIO = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+def ruta(url: str):
+    u = urlparse(url)
+    return u.path + ('?' + u.query if u.query else '')
+
+# Grabación
+# ---
+
+# Descarga un grado guardando todas las respuestas en destino, devuelve el número de respuestas
+def grabar(url_centro: str, grado: str, destino: str, concurrencia: int = api.CONCURRENCIA, espera: float = api.ESPERA):
+    os.makedirs(os.path.join(destino, 'cuerpos'), exist_ok = True)
+    u = urlparse(url_centro)
+    origen = f'{u.scheme}://{u.netloc}'
+    respuestas = {}
+    lock = threading.Lock()
+
+    def guardar(r, *args, **kwargs):
+        if r.status_code != 200:
+            return
+        h = hashlib.sha256(r.content).hexdigest()
+        archivo = os.path.join(destino, 'cuerpos', h + '.gz')
+        if not os.path.exists(archivo):
+            with gzip.open(archivo, 'wb') as f:
+                f.write(r.content)
+        with lock:
+            respuestas[f'{r.request.method} {ruta(r.request.url)}'] = {
+                'tipo': r.headers.get('Content-Type', 'text/html').split(';')[0],
+                'cuerpo': h,
+            }
+
+    # todas las peticiones pasan por la red (sin caché) con una sesión que guarda cada respuesta
+    sesion, cache = red.sesion, red.cache.directorio
+    red.sesion = red.nueva_sesion()
+    red.sesion.hooks['response'].append(guardar)
+    red.configurar(None)
+    catalogo, anterior = api.catalogo, os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            api.catalogo = api.Catalogo(os.path.join(tmp, api.ARCHIVO_MATERIAS))
+            errores = [n for n in api.generar_lista_materias(url_centro, grado, concurrencia, espera) if 'ERROR' in n]
+            if errores:
+                raise SystemExit(f'No se ha podido grabar el grado: {errores[:3]}')
+            # la semana actual de cada materia ya viene en su página, se olvida para grabar también su AJAX
+            api.cache_semanas.clear()
+            api.precargar_semanas(api.lista_materias(), concurrencia, espera).join()
+        finally:
+            os.chdir(anterior)
+            api.catalogo = catalogo
+            red.sesion = sesion
+            red.configurar(cache)
+
+    with open(os.path.join(destino, 'indice.json'), 'w', encoding = 'utf-8') as f:
+        json.dump({ 'origen': origen, 'centro': u.path, 'grado': grado, 'respuestas': respuestas }, f, ensure_ascii = False, indent = 4, sort_keys = True)
+    return len(respuestas)
+
+# Graba las páginas de stub.py generadas a partir de un materias.json, para tener una grabación sin acceso a la web
+def grabar_sintetico(destino: str, materias: str = api.ARCHIVO_MATERIAS):
+    stub = Stub(cargar_materias(materias)).iniciar()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return grabar(stub.url_centro, GRADO, destino, espera = 0)
+    finally:
+        stub.shutdown()
+
+# Reproducción
+# ---
+
+class Reproductor(Stub):
+    def __init__(self, directorio: str, puerto: int = 0, latencia: float = 0.0):
+        super().__init__([], puerto, latencia)
+        with open(os.path.join(directorio, 'indice.json'), encoding = 'utf-8') as f:
+            indice = json.load(f)
+        self.centro, self.grado = indice['centro'], indice['grado']
+
+        # los enlaces absolutos a la web apuntan al reproductor, también dentro del JSON de las semanas
+        cambios = [(indice['origen'], self.url), (indice['origen'].replace('/', '\\/'), self.url.replace('/', '\\/'))]
+        cuerpos = {}
+        self.paginas, self.ajax = {}, {}
+        for clave, r in indice['respuestas'].items():
+            metodo, ruta = clave.split(' ', 1)
+            if not r['cuerpo'] in cuerpos:
+                with gzip.open(os.path.join(directorio, 'cuerpos', r['cuerpo'] + '.gz'), 'rb') as f:
+                    texto = f.read().decode('utf-8')
+                for a, b in cambios:
+                    texto = texto.replace(a, b)
+                cuerpos[r['cuerpo']] = texto
+            (self.paginas if metodo == 'GET' else self.ajax)[ruta] = (r['tipo'], cuerpos[r['cuerpo']])
+
+    @property
+    def url_centro(self):
+        return self.url + self.centro
+
+def grabaciones():
+    if not os.path.isdir(DIRECTORIO):
+        return []
+    return sorted(d for d in os.listdir(DIRECTORIO) if os.path.exists(os.path.join(DIRECTORIO, d, 'indice.json')))
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Grabación y reproducción de respuestas de usc.gal')
+    sub = parser.add_subparsers(dest = 'orden', required = True)
+    g = sub.add_parser('grabar', help = 'descarga un grado de la web y guarda las respuestas')
+    g.add_argument('--url', required = True, help = 'url del centro, por ejemplo https://www.usc.gal/es/centro/NOMBRE')
+    g.add_argument('--grado', required = True)
+    g.add_argument('--nombre', required = True)
+    g.add_argument('--espera', type = float, default = api.ESPERA, help = 'espera de cortesía entre peticiones (s)')
+    s = sub.add_parser('sintetico', help = 'graba las páginas generadas por stub.py')
+    s.add_argument('--nombre', default = 'stub')
+    s.add_argument('--materias', default = api.ARCHIVO_MATERIAS)
+    r = sub.add_parser('servir', help = 'sirve una grabación')
+    r.add_argument('--nombre', help = 'por defecto la primera')
+    r.add_argument('--puerto', type = int, default = 8000)
+    r.add_argument('--latencia', type = float, default = 0.0, help = 'segundos de espera por petición')
+    args = parser.parse_args()
+
+    if args.orden == 'grabar':
+        n = grabar(args.url, args.grado, os.path.join(DIRECTORIO, args.nombre), espera = args.espera)
+        print(f'{n} respuestas grabadas en {os.path.join(DIRECTORIO, args.nombre)}')
+    elif args.orden == 'sintetico':
+        n = grabar_sintetico(os.path.join(DIRECTORIO, args.nombre), args.materias)
+        print(f'{n} respuestas grabadas en {os.path.join(DIRECTORIO, args.nombre)}')
+    else:
+        nombre = args.nombre or next(iter(grabaciones()), None)
+        if nombre is None:
+            raise SystemExit(f'No hay grabaciones en {DIRECTORIO}')
+        reproductor = Reproductor(os.path.join(DIRECTORIO, nombre), args.puerto, args.latencia)
+        print(f"Sirviendo '{reproductor.grado}' en {reproductor.url_centro}")
+        reproductor.serve_forever()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+# Latencia de actualizar_horario con la rejilla frente al bucle de pandas anterior, y de un cambio de grupo
+# incremental (api.cambiar_grupo). Comprueba también que los dos generan exactamente el mismo DataFrame
+#
+#   python -m benchmarks.horario [--repeticiones 50]
+
+import argparse
+import contextlib
+import io
+import random
+import statistics
+import time
+
+import pandas as pd
+
+import api
+
+# Implementación anterior de actualizar_horario, se mantiene como referencia
+def actualizar_pandas(df: pd.DataFrame, materias: dict[str, api.Materia]):
+    df = pd.DataFrame(index=df.index, columns=df.columns)
+    for materia in materias.values():
+        for h in materia.horario:
+            if h.grupo != materia.grupo_seleccionado[h.tipo.value]:
+                continue
+
+            r = pd.date_range(start=h.hora_inicio.strftime('%H:%M'), end=h.hora_fin.strftime('%H:%M'), freq='30min')[:-1]
+
+            conflicto = False
+            for hora in r:
+                if not hora.strftime('%H:%M') in df.index:
+                    hmin = min(df.index[0], hora.strftime('%H:%M'))
+                    hmax = max(df.index[-1], hora.strftime('%H:%M'))
+                    df = df.reindex(pd.date_range(start=hmin, end=hmax, freq='30min').strftime('%H:%M'))
+
+                m = df.loc[hora.strftime('%H:%M'), h.dia_semana.value]
+                if not pd.isna(m):
+                    mm = f"{materia.abreviatura} {api.tipo_clase_ch[h.tipo]}{h.grupo}"
+                    if m == mm:
+                        continue
+                    if not conflicto:
+                        print(f"[Conflicto] {mm} / {m} - {h.dia_semana.value} {hora.strftime('%H:%M')}")
+                    conflicto = True
+
+            for hora in r:
+                m = set(str(df.loc[hora.strftime('%H:%M'), h.dia_semana.value]).split(' / '))
+                m.add(f"{materia.abreviatura} {api.tipo_clase_ch[h.tipo]}{h.grupo}")
+                m = list(filter(lambda x: x != 'nan', m))
+                df.loc[hora.strftime('%H:%M'), h.dia_semana.value] = ' / '.join(sorted(m))
+    return df
+
+def df_inicial():
+    horas = pd.date_range(start = '09:00', end = '10:00', freq = '30min').strftime('%H:%M')
+    return pd.DataFrame(index = horas, columns = [d.value for d in api.DiaSemana])
+
+# Horarios de prueba: cada curso y cuatrimestre, con todas sus optativas y grupos al azar
+def escenarios(materias: list[api.Materia], semilla: int = 0):
+    rnd = random.Random(semilla)
+    for curso in sorted({ m.curso for m in materias }):
+        for cuatrimestre in (1, 2):
+            sel = { m.nombre: m for m in materias if m.curso == curso and m.cuatrimestre in (0, cuatrimestre) }
+            for m in sel.values():
+                for t, n in m.num_grupos.items():
+                    if n > 0:
+                        m.grupo_seleccionado[t] = rnd.randint(1, n)
+            yield f'{curso}º {cuatrimestre}C', sel
+
+def percentil(l: list[float], p: float):
+    return statistics.quantiles(l, n = 100)[int(p) - 1] if len(l) > 1 else l[0]
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark de actualizar_horario')
+    parser.add_argument('--repeticiones', type = int, default = 50)
+    args = parser.parse_args()
+
+    materias = api.lista_materias()
+    print(f"{'horario':>8} {'materias':>8} {'pandas p50':>11} {'rejilla p50':>12} {'rejilla p95':>12} {'mejora':>7} {'grupo p50':>10}")
+    for nombre, sel in escenarios(materias):
+        horario = api.iniciar_horario()
+        horario.materias = sel
+
+        with contextlib.redirect_stdout(io.StringIO()) as salida_pandas:
+            ref = actualizar_pandas(df_inicial(), sel)
+        with contextlib.redirect_stdout(io.StringIO()) as salida_rejilla:
+            api.actualizar_horario(horario)
+        assert ref.equals(horario.df), f'{nombre}: los DataFrames no coinciden'
+        assert salida_pandas.getvalue() == salida_rejilla.getvalue(), f'{nombre}: los conflictos no coinciden'
+
+        tiempos = { 'pandas': [], 'rejilla': [], 'grupo': [] }
+        cambios = [(m.nombre, t, g) for m in sel.values() for t, n in m.num_grupos.items() for g in range(1, n + 1)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(args.repeticiones):
+                t = time.perf_counter()
+                actualizar_pandas(df_inicial(), sel)
+                tiempos['pandas'].append(time.perf_counter() - t)
+
+                t = time.perf_counter()
+                api.actualizar_horario(horario)
+                horario.df
+                tiempos['rejilla'].append(time.perf_counter() - t)
+
+                if cambios:
+                    t = time.perf_counter()
+                    api.cambiar_grupo(horario, *random.choice(cambios))
+                    horario.df
+                    tiempos['grupo'].append(time.perf_counter() - t)
+
+        p = lambda k, q: percentil(tiempos[k], q) * 1000
+        print(f"{nombre:>8} {len(sel):>8} {p('pandas', 50):>9.2f}ms {p('rejilla', 50):>10.3f}ms {p('rejilla', 95):>10.3f}ms {p('pandas', 50) / p('rejilla', 50):>6.0f}x {p('grupo', 50):>8.3f}ms")
+
+if __name__ == '__main__':
+    main()
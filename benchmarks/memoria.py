@@ -0,0 +1,61 @@
+# Memoria ocupada por el catálogo cargado en un catálogo sintético de varios grados
+# Se compara con una copia de los mismos datos en objetos con __dict__ y sin compartir horas ni aulas,
+# que es como se representaban antes de usar slots
+#
+#   python -m benchmarks.memoria [--grados 1 10 40]
+
+import argparse
+import copy
+import gc
+import os
+import tempfile
+import tracemalloc
+from types import SimpleNamespace
+
+import api
+from benchmarks.stub import cargar_materias
+from benchmarks.sintetico import catalogo_sintetico, guardar
+
+def sin_compartir(materias: list[api.Materia]):
+    nuevo = lambda s: (s + '.')[:-1]
+    return [SimpleNamespace(
+        nombre = nuevo(m.nombre), abreviatura = nuevo(m.abreviatura), enlace = nuevo(m.enlace),
+        curso = m.curso, cuatrimestre = m.cuatrimestre, tipo = m.tipo, semana = nuevo(m.semana),
+        grupo_seleccionado = dict(m.grupo_seleccionado), num_grupos = dict(m.num_grupos),
+        horario = [SimpleNamespace(
+            grupo = h.grupo, dia_semana = h.dia_semana, hora_inicio = copy.copy(h.hora_inicio).replace(),
+            hora_fin = copy.copy(h.hora_fin).replace(), aula = nuevo(h.aula), tipo = h.tipo
+        ) for h in m.horario],
+        examenes = [SimpleNamespace(fecha = e.fecha.replace(), aula = { nuevo(a) for a in e.aula }) for e in m.examenes],
+    ) for m in materias]
+
+def memoria(f):
+    gc.collect()
+    tracemalloc.start()
+    r = f()
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return actual, r
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark de memoria del catálogo')
+    parser.add_argument('--materias', default = 'materias.json')
+    parser.add_argument('--grados', type = int, nargs = '+', default = [1, 10, 40])
+    args = parser.parse_args()
+
+    base = cargar_materias(args.materias)
+    print(f"{'grados':>6} {'materias':>8} {'clases':>7} {'antes':>9} {'slots':>9} {'ahorro':>7}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.grados:
+            ruta = os.path.join(tmp, f'materias_{n}.json')
+            guardar(catalogo_sintetico(base, n), ruta)
+            materias = api.leer_materias(ruta)
+            clases = sum(len(m.horario) for m in materias)
+
+            slots, _ = memoria(lambda: api.leer_materias(ruta))
+            antes, _ = memoria(lambda: sin_compartir(materias))
+            mb = lambda b: f'{b / 1e6:.2f}MB'
+            print(f'{n:>6} {len(materias):>8} {clases:>7} {mb(antes):>9} {mb(slots):>9} {1 - slots / antes:>6.0%}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# Tiempo de generar el html del horario con el Styler de pandas (formato_horario) frente a api.html_horario,
+# sin caché y con ella. Simula una sesión cambiando grupos al azar y deshaciendo a veces el cambio, que es lo
+# que pasa en la interfaz con cada desplegable. Comprueba también que las celdas y sus estilos coinciden
+#
+#   python -m benchmarks.render [--cambios 200] [--repeticiones 20]
+
+import argparse
+import contextlib
+import io
+import random
+import re
+import time
+
+import api
+from benchmarks.horario import escenarios, percentil
+
+# Texto y estilo de cada celda (fila, columna) en los dos renderizados
+def celdas_styler(horario: api.Horario):
+    styler = api.formato_horario(horario)
+    styler._compute()
+    df = horario.df.fillna('')
+    return { (i, j): (df.iat[i, j], '; '.join(f'{k}: {v}' for k, v in props)) for (i, j), props in styler.ctx.items() }
+
+def celdas_html(html: str):
+    filas = re.findall(r'<tr><th>\d\d:\d\d</th>(.*?)</tr>', html)
+    return { (i, j): (texto, estilo) for i, fila in enumerate(filas)
+             for j, (estilo, texto) in enumerate(re.findall(r'<td style="([^"]*)">([^<]*)</td>', fila)) }
+
+def medir(f, repeticiones: int):
+    tiempos = []
+    for _ in range(repeticiones):
+        t = time.perf_counter()
+        f()
+        tiempos.append(time.perf_counter() - t)
+    return tiempos
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Benchmark del html del horario')
+    parser.add_argument('--repeticiones', type = int, default = 20)
+    parser.add_argument('--cambios', type = int, default = 200, help = 'cambios de grupo en la sesión simulada')
+    args = parser.parse_args()
+
+    api.AVISAR_CONFLICTOS = False
+    rnd = random.Random(0)
+    materias = api.lista_materias()
+    print(f"{'horario':>8} {'styler p50':>11} {'html p50':>9} {'caché p50':>10} {'mejora':>7} {'sesión styler':>14} {'sesión html':>12} {'aciertos':>9}")
+    for nombre, sel in escenarios(materias):
+        horario = api.iniciar_horario()
+        horario.materias = sel
+        with contextlib.redirect_stdout(io.StringIO()):
+            api.actualizar_horario(horario)
+        assert celdas_styler(horario) == celdas_html(api.generar_html(horario.rejilla)), f'{nombre}: el html no coincide'
+
+        styler = medir(lambda: api.formato_horario(horario).to_html(), args.repeticiones)
+        html = medir(lambda: api.generar_html(horario.rejilla), args.repeticiones)
+        api.html_horario(horario)
+        cache = medir(lambda: api.html_horario(horario), args.repeticiones)
+
+        # sesión: cada paso cambia un grupo y la mitad de las veces lo deshace después
+        opciones = [(m.nombre, t, n) for m in sel.values() for t, n in m.num_grupos.items() if n > 1]
+        pasos = []
+        for _ in range(args.cambios if opciones else 0):
+            n, t, g = rnd.choice(opciones)
+            anterior = sel[n].grupo_seleccionado[t]
+            pasos.append((n, t, rnd.randint(1, g)))
+            if rnd.random() < 0.5:
+                pasos.append((n, t, anterior))
+
+        def sesion(render):
+            def f():
+                for p in pasos:
+                    api.cambiar_grupo(horario, *p)
+                    render()
+            return f
+
+        grupos = { n: dict(m.grupo_seleccionado) for n, m in sel.items() }
+        t_styler = medir(sesion(lambda: api.formato_horario(horario).to_html()), 1)[0]
+        for n, g in grupos.items():
+            sel[n].grupo_seleccionado.update(g)
+        api.actualizar_horario(horario)
+        api._cache_html.clear()
+        antes = len(api._cache_html)
+        t_html = medir(sesion(lambda: api.html_horario(horario)), 1)[0]
+        generados = len(api._cache_html) - antes
+        aciertos = (len(pasos) - generados) / len(pasos) if pasos else 0
+
+        p = lambda l: percentil(l, 50) * 1000
+        print(f"{nombre:>8} {p(styler):>9.2f}ms {p(html):>7.3f}ms {p(cache):>8.4f}ms {p(styler) / p(html):>6.0f}x"
+              f" {t_styler * 1000:>12.1f}ms {t_html * 1000:>10.1f}ms {aciertos:>8.0%}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+# Prueba de carga del servidor HTTP/JSON (servidor.py)
+# Arranca una instancia local con el catálogo indicado (o usa --url) y lanza una mezcla de peticiones
+# desde varios clientes a la vez: horarios de cada curso en json, html y csv, conflictos con grupos al
+# azar, búsquedas y sugerencias. Muestra el rendimiento total y los percentiles por ruta
+#
+#   python -m benchmarks.servidor [--peticiones 2000] [--clientes 16] [--hilos 4]
+#   python -m benchmarks.servidor --url http://localhost:8080
+
+import argparse
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import requests
+
+import api
+from benchmarks.busqueda import consultas
+
+# Arranca servidor.py en otro proceso y espera a que acepte peticiones
+def arrancar(catalogo: str, puerto: int, hilos: int):
+    p = subprocess.Popen([sys.executable, 'servidor.py', '--catalogo', catalogo, '--puerto', str(puerto), '--hilos', str(hilos)],
+                         stdout = subprocess.PIPE, text = True)
+    linea = p.stdout.readline()
+    if not 'Sirviendo' in linea:
+        p.kill()
+        raise SystemExit(f'El servidor no ha arrancado: {linea}')
+    return p
+
+def peticiones(materias: list[api.Materia], n: int, semilla: int = 0):
+    rnd = random.Random(semilla)
+    cursos = sorted({ (m.curso, m.cuatrimestre) for m in materias if m.cuatrimestre > 0 })
+    busquedas = consultas(materias, 200, semilla)
+
+    l = []
+    for _ in range(n):
+        curso, cuatrimestre = rnd.choice(cursos)
+        tipo = rnd.random()
+        if tipo < 0.4:
+            l.append(('/horario', { 'curso': curso, 'cuatrimestre': cuatrimestre, 'formato': rnd.choice(['json', 'json', 'html', 'csv']) }))
+        elif tipo < 0.6:
+            # grupos al azar, así no todas las peticiones están en la caché del servidor
+            grupos = [f'{m.nombre}:{t}:{rnd.randint(1, g)}' for m in materias if m.curso == curso and m.cuatrimestre == cuatrimestre
+                      for t, g in m.num_grupos.items() if g > 1 and rnd.random() < 0.3]
+            l.append(('/conflictos', { 'curso': curso, 'cuatrimestre': cuatrimestre, 'grupo': grupos }))
+        elif tipo < 0.8:
+            l.append(('/buscar', { 'q': rnd.choice(busquedas) }))
+        elif tipo < 0.95:
+            q = rnd.choice(busquedas)
+            l.append(('/sugerir', { 'q': q[:rnd.randint(2, max(2, len(q)))] }))
+        else:
+            l.append(('/materias', { 'curso': curso }))
+    return l
+
+def cargar(url: str, lista: list[tuple[str, dict]], clientes: int):
+    local = threading.local()
+    tiempos: dict[str, list[float]] = {}
+    errores = []
+    lock = threading.Lock()
+
+    def pedir(p):
+        ruta, params = p
+        if not hasattr(local, 'sesion'):
+            local.sesion = requests.Session()
+        t = time.perf_counter()
+        r = local.sesion.get(url + ruta + '?' + urlencode(params, doseq = True))
+        t = time.perf_counter() - t
+        with lock:
+            tiempos.setdefault(ruta, []).append(t)
+            if r.status_code != 200:
+                errores.append((ruta, r.status_code, r.text[:100]))
+
+    t = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = clientes) as ex:
+        list(ex.map(pedir, lista))
+    return time.perf_counter() - t, tiempos, errores
+
+def percentil(l: list[float], p: float):
+    return statistics.quantiles(l, n = 100)[p - 1] if len(l) > 1 else l[0]
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Prueba de carga del servidor de horarios')
+    parser.add_argument('--catalogo', default = 'materias.json')
+    parser.add_argument('--url', help = 'servidor ya arrancado, si no se arranca uno local')
+    parser.add_argument('--puerto', type = int, default = 8765)
+    parser.add_argument('--hilos', type = int, default = 4, help = 'hilos del servidor local')
+    parser.add_argument('--peticiones', type = int, default = 2000)
+    parser.add_argument('--clientes', type = int, default = 16, help = 'peticiones simultáneas')
+    args = parser.parse_args()
+
+    materias = api.leer_materias(args.catalogo)
+    lista = peticiones(materias, args.peticiones)
+
+    servidor = None
+    url = args.url
+    if url is None:
+        servidor = arrancar(args.catalogo, args.puerto, args.hilos)
+        url = f'http://localhost:{args.puerto}'
+    try:
+        # una vuelta corta para calentar conexiones y cachés
+        cargar(url, lista[:50], args.clientes)
+        total, tiempos, errores = cargar(url, lista, args.clientes)
+        estado = requests.get(url + '/estado').json()
+    finally:
+        if servidor:
+            servidor.terminate()
+            servidor.wait()
+
+    print(f'{len(lista)} peticiones con {args.clientes} clientes en {total:.2f}s: {len(lista) / total:.0f} peticiones/s, {len(errores)} errores')
+    print(f"caché del servidor: {estado['aciertos_cache']} aciertos de {estado['peticiones']} peticiones")
+    print(f"{'ruta':<12} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for ruta, l in sorted(tiempos.items()):
+        ms = lambda t: f'{t * 1000:.1f}ms'
+        print(f'{ruta:<12} {len(l):>6} {ms(percentil(l, 50)):>9} {ms(percentil(l, 95)):>9} {ms(percentil(l, 99)):>9}')
+    for e in errores[:5]:
+        print('  error', *e)
+
+if __name__ == '__main__':
+    main()
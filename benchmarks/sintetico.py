@@ -0,0 +1,23 @@
+# Catálogos sintéticos de varios grados a partir de materias.json, para medir a escala
+
+import copy
+import json
+
+# Repite el catálogo n veces como si fueran grados distintos del mismo centro
+# Los nombres, enlaces y aulas cambian para que no se puedan compartir entre grados
+def catalogo_sintetico(materias: list[dict], n_grados: int):
+    l = []
+    for g in range(n_grados):
+        for m in materias:
+            m = copy.deepcopy(m)
+            if g > 0:
+                m['nombre'] = f"{m['nombre']} {g}"
+                m['enlace'] = f"{m['enlace']}-{g}"
+                for h in m['horario']:
+                    h['aula'] = f"{h['aula']}.{g % 7}"
+            l.append(m)
+    return l
+
+def guardar(materias: list[dict], ruta: str):
+    with open(ruta, 'w', encoding = 'utf-8') as f:
+        json.dump(materias, f, ensure_ascii = False, indent = 4, sort_keys = True)
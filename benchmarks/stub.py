@@ -0,0 +1,186 @@
+# Servidor local que imita las páginas de horarios de usc.gal
+# Las páginas se generan a partir de un materias.json guardado, así se pueden medir
+# las descargas sin depender de la web real
+#
+#   python -m benchmarks.stub [--puerto 8000] [--latencia 0.2]
+
+import argparse
+import hashlib
+import json
+import socket
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import urlparse
+
+CENTRO = '/es/centro/stub'
+GRADO = 'Grao en Stub'
+SEMANAS = {
+    1: ['Semana del 11/09 al 15/09', 'Semana del 18/09 al 22/09', 'Semana del 25/09 al 29/09'],
+    2: ['Semana del 29/01 al 02/02', 'Semana del 05/02 al 09/02', 'Semana del 12/02 al 16/02'],
+}
+
+# Generación de páginas
+# ---
+
+def ruta_materia(m: dict):
+    return urlparse(m['enlace']).path
+
+def pagina_centro(materias: list[dict], grado: str = GRADO):
+    html = [f'<html><body>{cabecera}<div class="at-text"><p>{escape(grado)}</p></div>']
+    for m in materias:
+        cuatri = f"{m['cuatrimestre']}º Cuatrimestre" if m['cuatrimestre'] > 0 else 'Anual'
+        html.append(
+            f'<div class="generic-summary-content-wrapper"><p>{escape(grado)}</p>'
+            f'<a href="{ruta_materia(m)}">{escape(m["nombre"])}</a>'
+            f'<p>{m["curso"]}º Curso | {cuatri} | {m["tipo"]} | 6 ECTS</p></div>'
+        )
+    html.append(f'{pie}</body></html>')
+    return ''.join(html)
+
+def detalle_materia(m: dict):
+    html = ['<div id="subject-detail-controller"><div id="subject-detail-controller-week-filter"><ul>']
+    for i, s in enumerate(SEMANAS[max(m['cuatrimestre'], 1)]):
+        html.append(f'<li><a href="{ruta_materia(m)}?semana={i}">{s}</a></li>')
+    html.append('</ul></div><table><tbody>')
+
+    dias = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes']
+    for dia in dias:
+        clases = sorted((h for h in m['horario'] if h['dia_semana'] == dia), key = lambda h: h['hora_inicio'])
+        if not clases:
+            continue
+        html.append(f'<tr><th>{dia}</th></tr>')
+        for h in clases:
+            html.append(
+                f'<tr><td>{h["hora_inicio"][:5]}-{h["hora_fin"][:5]}</td>'
+                f'<td>Grupo -{h["tipo"]}_{h["grupo"]:02d}</td>'
+                f'<td>Aula {escape(h["aula"])}</td></tr>'
+            )
+    html.append('</tbody></table>')
+
+    if m['examenes']:
+        html.append('<table><caption>Exámenes</caption><tbody>')
+        for e in m['examenes']:
+            fecha = e['fecha'][8:10] + '.' + e['fecha'][5:7] + '.' + e['fecha'][:4] + ' ' + e['fecha'][11:16]
+            for a in sorted(e['aula']):
+                html.append(f'<tr class="target-items-selector"><td>{fecha}-14:00</td><td>Examen</td><td>Aula {escape(a)}</td></tr>')
+        html.append('</tbody></table>')
+
+    html.append('</div>')
+    return ''.join(html)
+
+# Cabecera, menús y pie parecidos a los de la web real, que son la mayor parte de cada página
+def relleno(n: int = 40):
+    menu = ''.join(
+        f'<li class="menu-item"><a href="/es/seccion-{i}" class="menu-link"><span>Sección {i}</span></a>'
+        f'<ul class="submenu">{"".join(f"<li><a href=/es/seccion-{i}/{j}>Apartado {j} de la sección {i}</a></li>" for j in range(8))}</ul></li>'
+        for i in range(n)
+    )
+    scripts = ''.join(f'<script>window.dataLayer = window.dataLayer || []; dataLayer.push({{"evento": {i}}});</script>' for i in range(n))
+    pie = ''.join(f'<div class="footer-col"><p>Universidade de Santiago de Compostela</p><p>Teléfono {i}</p></div>' for i in range(n // 2))
+    return f'<header><nav><ul class="menu">{menu}</ul></nav></header>', f'<footer>{pie}</footer>{scripts}'
+
+cabecera, pie = relleno()
+
+def pagina_materia(m: dict):
+    return f'<html><head><title>{escape(m["nombre"])}</title></head><body>{cabecera}<main><h1>{escape(m["nombre"])}</h1>{detalle_materia(m)}</main>{pie}</body></html>'
+
+def ajax_semana(m: dict):
+    return json.dumps([
+        {'command': 'settings', 'selector': None, 'data': {}},
+        {'command': 'insert', 'selector': '#subject-detail-controller', 'data': detalle_materia(m)},
+    ])
+
+# Páginas por ruta, todas precalculadas para que el servidor no sea el cuello de botella
+def generar_paginas(materias: list[dict], grado: str = GRADO):
+    paginas = { CENTRO + '/horarios/materias': ('text/html', pagina_centro(materias, grado)) }
+    ajax = {}
+    for m in materias:
+        paginas[ruta_materia(m)] = ('text/html', pagina_materia(m))
+        ajax[ruta_materia(m)] = ('application/json', ajax_semana(m))
+    return paginas, ajax
+
+# Servidor
+# ---
+
+class Stub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, materias: list[dict], puerto: int = 0, latencia: float = 0.0):
+        self.paginas, self.ajax = generar_paginas(materias)
+        self.latencia = latencia
+        self.peticiones = 0
+        self.no_modificadas = 0
+        super().__init__(('127.0.0.1', puerto), Manejador)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    @property
+    def url_centro(self):
+        return self.url + CENTRO
+
+    def iniciar(self):
+        Thread(target = self.serve_forever, daemon = True).start()
+        return self
+
+class Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def responder(self, tabla):
+        self.server.peticiones += 1
+        if self.server.latencia > 0:
+            time.sleep(self.server.latencia)
+        # las respuestas grabadas (fixtures.py) pueden depender de la consulta, las generadas solo de la ruta
+        pagina = tabla.get(self.path) or tabla.get(urlparse(self.path).path)
+        if pagina is None:
+            self.send_error(404)
+            return
+        tipo, cuerpo = pagina
+        cuerpo = cuerpo.encode('utf-8')
+        etag = '"' + hashlib.md5(cuerpo).hexdigest() + '"'
+        if self.command == 'GET' and self.headers.get('If-None-Match') == etag:
+            self.server.no_modificadas += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', f'{tipo}; charset=utf-8')
+        if self.command == 'GET':
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def do_GET(self):
+        self.responder(self.server.paginas)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.responder(self.server.ajax)
+
+    def log_message(self, *args):
+        pass
+
+def cargar_materias(ruta: str = 'materias.json'):
+    with open(ruta, encoding = 'utf-8') as f:
+        return json.load(f)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Servidor local con páginas de horarios de prueba')
+    parser.add_argument('--materias', default = 'materias.json')
+    parser.add_argument('--puerto', type = int, default = 8000)
+    parser.add_argument('--latencia', type = float, default = 0.0, help = 'segundos de espera por petición')
+    args = parser.parse_args()
+
+    stub = Stub(cargar_materias(args.materias), args.puerto, args.latencia)
+    print(f'Sirviendo {stub.url_centro}')
+    stub.serve_forever()
@@ -0,0 +1,205 @@
+# Suite de rendimiento reproducible sin conexión
+# Las descargas se miden contra un reproductor local de una grabación de usc.gal (fixtures.py), así siempre
+# se descargan las mismas páginas. Si no hay ninguna grabación en benchmarks/fixtures se graba una de las
+# páginas de stub.py. Las operaciones en memoria se miden con catálogos sintéticos de varios tamaños hechos a
+# partir del catálogo descargado
+#
+#   python -m benchmarks.suite [--fixtures etse] [--grados 1 4 16] [--json resultados.json]
+#   python -m benchmarks.suite --guardar-base                 guarda los resultados como referencia
+#   python -m benchmarks.suite [--base benchmarks/base.json] [--tolerancia 0.25]
+#
+# Si existe la referencia, termina con error cuando la mediana de alguna operación empeora más de la
+# tolerancia (y del margen absoluto, para que las operaciones muy rápidas no fallen por ruido)
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import api
+import red
+from benchmarks.busqueda import consultas
+from benchmarks.fixtures import DIRECTORIO, Reproductor, grabaciones, grabar_sintetico
+from benchmarks.horario import escenarios, percentil
+from benchmarks.sintetico import catalogo_sintetico, guardar
+
+BASE = os.path.join(os.path.dirname(__file__), 'base.json')
+
+# Resultado de una operación: percentiles de los tiempos (s) y operaciones por segundo
+def resumen(tiempos: list[float], unidades: int | None = None):
+    return {
+        'muestras': len(tiempos),
+        'p50': percentil(tiempos, 50),
+        'p95': percentil(tiempos, 95),
+        'p99': percentil(tiempos, 99),
+        'por_segundo': (unidades or len(tiempos)) / sum(tiempos),
+    }
+
+def medir(f, *args):
+    t = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - t
+
+# Descargas
+# ---
+
+# Descarga completa del grado en una carpeta vacía cada vez, sin caché
+def medir_descarga(reproductor: Reproductor, repeticiones: int, concurrencia: int):
+    tiempos, n = [], 0
+    anterior = os.getcwd()
+    for _ in range(repeticiones):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                api.catalogo = api.Catalogo(os.path.join(tmp, api.ARCHIVO_MATERIAS))
+                t = time.perf_counter()
+                l = list(api.generar_lista_materias(reproductor.url_centro, reproductor.grado, concurrencia, 0))
+                tiempos.append(time.perf_counter() - t)
+                n += len(l)
+                materias = api.lista_materias()
+                with open(api.catalogo.archivo, encoding = 'utf-8') as f:
+                    catalogo = json.load(f)
+            finally:
+                os.chdir(anterior)
+    return resumen(tiempos, n), materias, catalogo
+
+# Cambio a cada una de las semanas de cada materia sin ninguna precargada
+def medir_semanas(materias: list[api.Materia]):
+    api.cache_semanas.clear()
+    tiempos = []
+    for m in materias:
+        for semana in m.semanas:
+            if semana == m.semana:
+                continue
+            m.semana = semana
+            tiempos.append(medir(api.cambiar_semana, m))
+    return resumen(tiempos)
+
+# Operaciones en memoria
+# ---
+
+def medir_catalogo(ruta: str, muestras: int, n_consultas: int):
+    r = {}
+    api.catalogo = api.Catalogo(ruta)
+
+    frio = []
+    for _ in range(muestras):
+        api.catalogo.resetear()
+        frio.append(medir(api.lista_materias))
+    r['lista_materias (frío)'] = resumen(frio)
+    r['lista_materias'] = resumen([medir(api.lista_materias) for _ in range(muestras)])
+
+    materias = api.lista_materias()
+    r['encontrar_materia'] = resumen([medir(api.encontrar_materia, materias, q) for q in consultas(materias, n_consultas)])
+
+    horarios = []
+    for _, sel in escenarios(materias):
+        h = api.iniciar_horario()
+        h.materias = sel
+        horarios.append(h)
+    tiempos = { 'actualizar_horario': [], 'formato_horario': [], 'html_horario': [] }
+    for _ in range(max(1, muestras // len(horarios))):
+        for h in horarios:
+            tiempos['actualizar_horario'].append(medir(api.actualizar_horario, h))
+            tiempos['formato_horario'].append(medir(lambda: api.formato_horario(h).to_html()))
+            api._cache_html.clear()
+            tiempos['html_horario'].append(medir(api.html_horario, h))
+    r.update({ k: resumen(l) for k, l in tiempos.items() })
+    return r
+
+# Referencia
+# ---
+
+def comparar(resultados: dict, base: dict, tolerancia: float, margen: float):
+    regresiones = []
+    for k, r in resultados.items():
+        b = base.get(k)
+        if b is not None and r['p50'] > b['p50'] * (1 + tolerancia) + margen:
+            regresiones.append((k, b['p50'], r['p50']))
+    return regresiones
+
+def tiempo(s: float):
+    return f'{s:.2f}s' if s >= 1 else f'{s * 1000:.2f}ms' if s >= 1e-3 else f'{s * 1e6:.0f}us'
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Suite de rendimiento con respuestas grabadas')
+    parser.add_argument('--fixtures', help = f'grabación de {DIRECTORIO}, por defecto la primera')
+    parser.add_argument('--grados', type = int, nargs = '+', default = [1, 4, 16], help = 'tamaños del catálogo sintético')
+    parser.add_argument('--descargas', type = int, default = 3, help = 'repeticiones de la descarga completa')
+    parser.add_argument('--concurrencia', type = int, default = api.CONCURRENCIA)
+    parser.add_argument('--latencia', type = float, default = 0.0, help = 'segundos de espera por petición en el reproductor')
+    parser.add_argument('--muestras', type = int, default = 30)
+    parser.add_argument('--consultas', type = int, default = 200)
+    parser.add_argument('--semilla', type = int, default = 0)
+    parser.add_argument('--json', help = 'guarda los resultados en este archivo')
+    parser.add_argument('--base', default = BASE)
+    parser.add_argument('--guardar-base', action = 'store_true')
+    parser.add_argument('--tolerancia', type = float, default = 0.25, help = 'empeoramiento relativo permitido de la mediana')
+    parser.add_argument('--margen', type = float, default = 0.0005, help = 'empeoramiento absoluto permitido (s)')
+    args = parser.parse_args()
+    random.seed(args.semilla)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        nombre = args.fixtures or next(iter(grabaciones()), None)
+        if nombre is None:
+            print(f'No hay grabaciones en {DIRECTORIO}, se graban las páginas de stub.py')
+            directorio = os.path.join(tmp, 'fixtures')
+            grabar_sintetico(directorio)
+            nombre = 'stub'
+        else:
+            directorio = os.path.join(DIRECTORIO, nombre)
+
+        reproductor = Reproductor(directorio, latencia = args.latencia).iniciar()
+        red.configurar(None)
+        resultados = {}
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                resultados['generar_lista_materias'], materias, catalogo = medir_descarga(reproductor, args.descargas, args.concurrencia)
+                resultados['cambiar_semana'] = medir_semanas(materias)
+        finally:
+            reproductor.shutdown()
+
+        for n in args.grados:
+            ruta = os.path.join(tmp, f'materias-{n}.json')
+            guardar(catalogo_sintetico(catalogo, n), ruta)
+            with contextlib.redirect_stdout(io.StringIO()):
+                r = medir_catalogo(ruta, args.muestras, args.consultas)
+            resultados.update({ f'{k} [{len(materias) * n}]': v for k, v in r.items() })
+
+    print(f"Grabación '{nombre}', {len(materias)} materias, {platform.python_implementation()} {platform.python_version()}")
+    print(f"{'operación':<34} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'por seg.':>10}")
+    for k, r in resultados.items():
+        print(f"{k:<34} {r['muestras']:>6} {tiempo(r['p50']):>9} {tiempo(r['p95']):>9} {tiempo(r['p99']):>9} {r['por_segundo']:>10.1f}")
+
+    datos = { 'fixtures': nombre, 'materias': len(materias), 'python': platform.python_version(), 'resultados': resultados }
+    if args.json:
+        with open(args.json, 'w', encoding = 'utf-8') as f:
+            json.dump(datos, f, ensure_ascii = False, indent = 4)
+    if args.guardar_base:
+        with open(args.base, 'w', encoding = 'utf-8') as f:
+            json.dump(datos, f, ensure_ascii = False, indent = 4)
+        print(f'Referencia guardada en {args.base}')
+        return
+
+    if not os.path.exists(args.base):
+        return
+    with open(args.base, encoding = 'utf-8') as f:
+        base = json.load(f)
+    if base['fixtures'] != nombre:
+        print(f"La referencia es de la grabación '{base['fixtures']}', no se compara")
+        return
+    regresiones = comparar(resultados, base['resultados'], args.tolerancia, args.margen)
+    for k, antes, ahora in regresiones:
+        print(f'[Regresión] {k}: {tiempo(antes)} -> {tiempo(ahora)} ({ahora / antes - 1:+.0%})')
+    if regresiones:
+        sys.exit(1)
+    print(f'Sin regresiones respecto a {args.base}')
+
+if __name__ == '__main__':
+    main()
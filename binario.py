@@ -0,0 +1,166 @@
+# Formato binario compacto para el catálogo de materias
+# Alternativa a materias.json para catálogos grandes: las cadenas se guardan una sola vez en una tabla
+# y las clases y exámenes en bloques de registros de tamaño fijo, así que se decodifican con
+# struct.iter_unpack y se construyen las dataclasses directamente, sin dacite
+#
+#   python binario.py materias.json materias.bin
+#
+# api.leer_materias y api.escribir_archivo eligen este formato cuando el archivo termina en .bin
+
+import datetime as dt
+import os
+import struct
+import sys
+
+import api
+
+MAGIA = b'HUSC'
+VERSION = 3 # la 2 añade las semanas de cada materia y la 3 su huella, las anteriores se siguen pudiendo leer
+
+CABECERA = struct.Struct('<4sHIIIIII') # magia, versión, bytes de cadenas, materias, clases, exámenes, aulas de exámenes, semanas
+MATERIA = struct.Struct('<IIIIBBBBbbbBbbbHHHI')
+CLASE = struct.Struct('<BBHHIB')
+EXAMEN = struct.Struct('<IIB')
+AULA = struct.Struct('<I')
+SEMANA = struct.Struct('<II') # nombre, url
+
+CABECERA_V1 = struct.Struct('<4sHIIIII')
+MATERIA_V1 = struct.Struct('<IIIIBBBBbbbBbbbHH')
+MATERIA_V2 = struct.Struct('<IIIIBBBBbbbBbbbHHH')
+
+TIPOS_MATERIA = list(api.TipoMateria)
+TIPOS_CLASE = list(api.TipoClase)
+DIAS = list(api.DiaSemana)
+
+# Grupos por tipo de clase: máscara de las claves presentes y un valor por tipo
+def _grupos(d: dict[str, int]):
+    mascara, valores = 0, []
+    for i, t in enumerate(TIPOS_CLASE):
+        if t.value in d:
+            mascara |= 1 << i
+        valores.append(d.get(t.value, -1))
+    return (mascara, *valores)
+
+def _dict_grupos(mascara: int, valores: tuple):
+    return { t.value: valores[i] for i, t in enumerate(TIPOS_CLASE) if mascara & (1 << i) }
+
+def escribir(lista: list[api.Materia], archivo: str):
+    cadenas: dict[str, int] = {}
+    def cadena(s: str):
+        if not s in cadenas:
+            cadenas[s] = len(cadenas)
+        return cadenas[s]
+
+    materias, clases, examenes, aulas, semanas = bytearray(), bytearray(), bytearray(), bytearray(), bytearray()
+    n_clases, n_examenes, n_aulas, n_semanas = 0, 0, 0, 0
+    for m in lista:
+        materias += MATERIA.pack(
+            cadena(m.nombre), cadena(m.abreviatura), cadena(m.enlace), cadena(m.semana),
+            m.curso, m.cuatrimestre, TIPOS_MATERIA.index(m.tipo),
+            *_grupos(m.grupo_seleccionado), *_grupos(m.num_grupos),
+            len(m.horario), len(m.examenes), len(m.semanas), cadena(m.huella)
+        )
+        for h in m.horario:
+            clases += CLASE.pack(
+                h.grupo, DIAS.index(h.dia_semana),
+                h.hora_inicio.hour * 60 + h.hora_inicio.minute, h.hora_fin.hour * 60 + h.hora_fin.minute,
+                cadena(h.aula), TIPOS_CLASE.index(h.tipo)
+            )
+        n_clases += len(m.horario)
+        for e in m.examenes:
+            f = e.fecha
+            examenes += EXAMEN.pack(f.toordinal(), f.hour * 3600 + f.minute * 60 + f.second, len(e.aula))
+            for a in sorted(e.aula):
+                aulas += AULA.pack(cadena(a))
+            n_aulas += len(e.aula)
+        n_examenes += len(m.examenes)
+        for nombre, url in m.semanas.items():
+            semanas += SEMANA.pack(cadena(nombre), cadena(url))
+        n_semanas += len(m.semanas)
+
+    tabla = '\0'.join(cadenas).encode('utf-8')
+    with open(archivo + '.tmp', 'wb') as f:
+        f.write(CABECERA.pack(MAGIA, VERSION, len(tabla), len(lista), n_clases, n_examenes, n_aulas, n_semanas))
+        for bloque in (tabla, materias, clases, examenes, aulas, semanas):
+            f.write(bloque)
+    os.replace(archivo + '.tmp', archivo)
+
+def leer(archivo: str):
+    with open(archivo, 'rb') as f:
+        datos = f.read()
+
+    magia, version = struct.unpack_from('<4sH', datos, 0)
+    if magia != MAGIA:
+        raise ValueError(f"'{archivo}' no es un catálogo binario")
+    if version == 1:
+        cabecera, materia = CABECERA_V1, MATERIA_V1
+        _, _, n_tabla, n_materias, n_clases, n_examenes, n_aulas = cabecera.unpack_from(datos, 0)
+        n_semanas = 0
+    elif version in (2, VERSION):
+        cabecera, materia = CABECERA, MATERIA if version == VERSION else MATERIA_V2
+        _, _, n_tabla, n_materias, n_clases, n_examenes, n_aulas, n_semanas = cabecera.unpack_from(datos, 0)
+    else:
+        raise ValueError(f"'{archivo}' usa la versión {version} del formato, se esperaba la {VERSION}")
+
+    i = cabecera.size
+    cadenas = datos[i:i + n_tabla].decode('utf-8').split('\0')
+    i += n_tabla
+    materias = materia.iter_unpack(datos[i:i + n_materias * materia.size])
+    i += n_materias * materia.size
+    clases = CLASE.iter_unpack(datos[i:i + n_clases * CLASE.size])
+    i += n_clases * CLASE.size
+    examenes = EXAMEN.iter_unpack(datos[i:i + n_examenes * EXAMEN.size])
+    i += n_examenes * EXAMEN.size
+    aulas = [a for (a,) in AULA.iter_unpack(datos[i:i + n_aulas * AULA.size])]
+    i += n_aulas * AULA.size
+    semanas = SEMANA.iter_unpack(datos[i:i + n_semanas * SEMANA.size])
+
+    horas: dict[int, dt.time] = {}
+    def hora(minutos: int):
+        h = horas.get(minutos)
+        if h is None:
+            h = horas[minutos] = dt.time(minutos // 60, minutos % 60)
+        return h
+
+    HoraClase, Examen, Materia = api.HoraClase, api.Examen, api.Materia
+    lista = []
+    j = 0
+    for (nombre, abreviatura, enlace, semana, curso, cuatrimestre, tipo,
+         sel_mascara, sel0, sel1, sel2, num_mascara, num0, num1, num2, nc, ne, *resto) in materias:
+        horario = []
+        for _ in range(nc):
+            grupo, dia, inicio, fin, aula, tipo_clase = next(clases)
+            horario.append(HoraClase(grupo, DIAS[dia], hora(inicio), hora(fin), cadenas[aula], TIPOS_CLASE[tipo_clase]))
+        ex = []
+        for _ in range(ne):
+            ordinal, segundos, na = next(examenes)
+            fecha = dt.datetime.fromordinal(ordinal).replace(hour = segundos // 3600, minute = segundos // 60 % 60, second = segundos % 60)
+            ex.append(Examen(fecha, { cadenas[a] for a in aulas[j:j + na] }))
+            j += na
+        sm = {}
+        ns, huella = resto + [0, None][len(resto):] # las versiones anteriores no tienen todos los campos
+        for _ in range(ns):
+            s, url = next(semanas)
+            sm[cadenas[s]] = cadenas[url]
+        lista.append(Materia(
+            nombre = cadenas[nombre],
+            abreviatura = cadenas[abreviatura],
+            enlace = cadenas[enlace],
+            curso = curso,
+            cuatrimestre = cuatrimestre,
+            tipo = TIPOS_MATERIA[tipo],
+            semana = cadenas[semana],
+            grupo_seleccionado = _dict_grupos(sel_mascara, (sel0, sel1, sel2)),
+            num_grupos = _dict_grupos(num_mascara, (num0, num1, num2)),
+            horario = horario,
+            examenes = ex,
+            semanas = sm,
+            huella = cadenas[huella] if huella is not None else '',
+        ))
+    return lista
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Uso: python binario.py origen destino (.json o .bin)')
+        sys.exit(1)
+    api.escribir_archivo(api.leer_materias(sys.argv[1]), sys.argv[2])
@@ -0,0 +1,81 @@
+# Índice para buscar materias por nombre
+# Se construye una vez por catálogo: nombres normalizados (sin tildes y en minúsculas), abreviaturas y
+# palabras ordenadas para buscar por prefijo. Los candidatos se sacan con rapidfuzz y las palabras que
+# empiezan por la búsqueda, y solo a esos se les calcula la puntuación completa
+
+import heapq
+from bisect import bisect_left
+
+from rapidfuzz import fuzz, process
+from unidecode import unidecode
+
+CORTE = 50 # puntuación mínima de fuzz.ratio para ser candidato
+
+def normalizar(texto: str):
+    return unidecode(texto).lower().strip()
+
+# Lo que usa el índice de cada materia, dos listas con la misma clave tienen el mismo índice
+def clave_materias(materias: list):
+    return tuple((m.nombre, m.abreviatura) for m in materias)
+
+def palabras(texto: str):
+    return [p for p in normalizar(texto).replace(',', ' ').replace('(', ' ').replace(')', ' ').split() if p]
+
+class IndiceMaterias:
+    def __init__(self, materias: list):
+        self.materias = materias
+        self.clave = clave_materias(materias)
+        self.nombres = [normalizar(m.nombre) for m in materias]
+        self.abreviaturas_normalizadas = [normalizar(m.abreviatura) for m in materias]
+        self.abreviaturas: dict[str, list[int]] = {}
+        self.palabras: dict[str, set[int]] = {}
+        for i, m in enumerate(materias):
+            self.abreviaturas.setdefault(self.abreviaturas_normalizadas[i], []).append(i)
+            for p in palabras(m.nombre):
+                self.palabras.setdefault(p, set()).add(i)
+        self.ordenadas = sorted(self.palabras)
+
+    # Materias con alguna palabra que empieza por prefijo
+    def con_prefijo(self, prefijo: str):
+        ids = set()
+        i = bisect_left(self.ordenadas, prefijo)
+        while i < len(self.ordenadas) and self.ordenadas[i].startswith(prefijo):
+            ids |= self.palabras[self.ordenadas[i]]
+            i += 1
+        return ids
+
+    # Misma puntuación que la búsqueda original: parecido + 100 si la búsqueda está contenida en el nombre,
+    # y además 150 si coincide con la abreviatura
+    def puntuacion(self, q: str, i: int):
+        nombre = self.nombres[i]
+        return fuzz.ratio(q, nombre) + 100 * (q in nombre) + 150 * (q == self.abreviaturas_normalizadas[i])
+
+    def buscar(self, busqueda: str, n: int = 5, corte: float = CORTE):
+        return [(self.materias[i], p) for i, p in self.buscar_posiciones(busqueda, n, corte)]
+
+    # Igual que buscar pero devuelve la posición de cada materia en la lista, para usar el índice con otra
+    # lista con la misma clave (por ejemplo copias del catálogo)
+    def buscar_posiciones(self, busqueda: str, n: int = 5, corte: float = CORTE):
+        q = normalizar(busqueda)
+        if not q:
+            return []
+
+        candidatos = { i for _, _, i in process.extract(q, self.nombres, scorer = fuzz.ratio, limit = None, score_cutoff = corte) }
+        candidatos.update(self.abreviaturas.get(q, []))
+        ps = palabras(busqueda)
+        if ps:
+            candidatos.update(set.intersection(*(self.con_prefijo(p) for p in ps)))
+        # si no hay nada parecido se devuelve lo menos malo, como antes
+        if not candidatos:
+            candidatos = range(len(self.materias))
+
+        mejores = heapq.nlargest(n, ((self.puntuacion(q, i), -i) for i in candidatos))
+        return [(-i, p) for p, i in mejores]
+
+    # Búsqueda mientras se escribe: cada palabra tiene que ser el principio de alguna palabra del nombre
+    def prefijo(self, texto: str, n: int = 10):
+        ps = palabras(texto)
+        if not ps:
+            return []
+        ids = set.intersection(*(self.con_prefijo(p) for p in ps))
+        return [self.materias[i] for i in heapq.nsmallest(n, ids, key = lambda i: (len(self.nombres[i]), self.nombres[i]))]
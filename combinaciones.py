@@ -0,0 +1,240 @@
+# Búsqueda de las mejores combinaciones de grupos de un horario
+# Cada (materia, tipo de clase) es una variable cuyos valores son sus grupos. La semana se representa como
+# un entero con ANCHO bits por día, así el número de medias horas en conflicto al elegir un grupo es
+# popcount(ocupado & máscara). La búsqueda es con vuelta atrás y se poda en cuanto una rama ya no puede
+# mejorar la peor de las n mejores soluciones encontradas, contando también los conflictos que las materias
+# que faltan van a tener como mínimo con lo que ya está ocupado
+
+import heapq
+import itertools
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+import api
+from rejilla import mascara
+
+ANCHO = 64 # bits por día, más que las 48 franjas para que los días no se solapen
+LLENO = (1 << ANCHO) - 1
+DIAS = len(api.DIAS)
+TARDE = 30 # franja de las 15:00
+
+# Costes
+# ---
+
+@dataclass
+class Coste:
+    nombre: str
+    funcion: Callable[[int], float]
+    peso: float = 1.0
+    # nunca baja al añadir clases, así que sirve como cota para podar
+    monotono: bool = False
+
+def por_dia(ocupado: int):
+    return [(ocupado >> (d * ANCHO)) & LLENO for d in range(DIAS)]
+
+# Medias horas libres entre la primera y la última clase de cada día
+def huecos(ocupado: int):
+    total = 0
+    for m in por_dia(ocupado):
+        if m:
+            total += m.bit_length() - (m & -m).bit_length() + 1 - m.bit_count()
+    return total
+
+# Medias horas de clase que terminan después de las 15:00
+def fin_tarde(ocupado: int):
+    return sum(max(0, m.bit_length() - TARDE) for m in por_dia(ocupado))
+
+# Días con alguna clase, menos es mejor
+def dias_con_clase(ocupado: int):
+    return sum(1 for m in por_dia(ocupado) if m)
+
+COSTES = {
+    'huecos': Coste('huecos', huecos),
+    'tarde': Coste('tarde', fin_tarde, monotono = True),
+    'dias': Coste('dias', dias_con_clase, monotono = True),
+}
+
+def coste_total(costes: list[Coste], ocupado: int):
+    return sum(c.peso * c.funcion(ocupado) for c in costes)
+
+# Problema
+# ---
+
+@dataclass
+class Variable:
+    nombre: str
+    tipo: str
+    opciones: list[tuple[int, int, int]] # (grupo, máscara de la semana, conflictos entre sus propias clases)
+
+@dataclass(order = True)
+class Solucion:
+    conflictos: int # medias horas con clases solapadas
+    coste: float
+    grupos: dict[str, dict[str, int]] = field(compare = False)
+
+def variables(horario: api.Horario):
+    vs = []
+    for m in horario.materias.values():
+        clases: dict[tuple[str, int], list[api.HoraClase]] = {}
+        for h in m.horario:
+            clases.setdefault((h.tipo.value, h.grupo), []).append(h)
+
+        for t, n in m.num_grupos.items():
+            # una optativa en el grupo 0 la ha quitado el usuario, no se le busca grupo
+            if m.tipo == api.TipoMateria.OPTATIVO and m.grupo_seleccionado.get(t) == 0:
+                continue
+            opciones = []
+            for g in range(1, n + 1):
+                ocupado, propios = 0, 0
+                for h in clases.get((t, g), []):
+                    mh = mascara(h.franja_inicio, h.franja_fin) << (h.dia * ANCHO)
+                    propios += (ocupado & mh).bit_count()
+                    ocupado |= mh
+                if ocupado:
+                    opciones.append((g, ocupado, propios))
+            if opciones:
+                vs.append(Variable(m.nombre, t, opciones))
+
+    # primero las más restringidas, así las podas llegan antes
+    return sorted(vs, key = lambda v: len(v.opciones))
+
+def combinaciones(vs: list[Variable]):
+    total = 1
+    for v in vs:
+        total *= len(v.opciones)
+    return total
+
+def solucion(vs: list[Variable], elegidos: tuple[int, ...], conflictos: int, coste: float):
+    grupos: dict[str, dict[str, int]] = {}
+    for v, g in zip(vs, elegidos):
+        grupos.setdefault(v.nombre, {})[v.tipo] = g
+    return Solucion(conflictos, coste, grupos)
+
+# Búsqueda
+# ---
+
+# Devuelve las n mejores soluciones (menos conflictos y luego menos coste) que empiezan por los grupos de prefijo
+# cota es la peor solución aceptable conocida de antemano, o una función que la devuelve
+# publicar se llama con la peor de las n mejores cada vez que mejora, para compartirla como cota
+def buscar(vs: list[Variable], n: int, costes: list[Coste], prefijo: tuple[int, ...] = (), cota = None, publicar = None, estadisticas: dict | None = None):
+    monotonos = [c for c in costes if c.monotono]
+    # con algún peso negativo el coste puede bajar al añadir clases y solo se poda por conflictos
+    negativos = any(c.peso < 0 for c in costes)
+    mejores: list[tuple[int, float, int, tuple[int, ...]]] = [] # montículo con la peor arriba: (-conflictos, -coste, orden, grupos)
+    orden = itertools.count()
+    nodos = 0
+
+    def peor():
+        p = (-mejores[0][0], -mejores[0][1]) if len(mejores) == n else (float('inf'), float('inf'))
+        c = cota() if callable(cota) else cota
+        return min(p, c) if c else p
+
+    def minimo_restante(i: int, ocupado: int):
+        return sum(min((ocupado & m).bit_count() + propios for _, m, propios in v.opciones) for v in vs[i:])
+
+    elegidos: list[int] = []
+    def explorar(i: int, ocupado: int, conflictos: int):
+        nonlocal nodos
+        nodos += 1
+        if i == len(vs):
+            coste = coste_total(costes, ocupado)
+            if (conflictos, coste) < peor():
+                heapq.heappush(mejores, (-conflictos, -coste, next(orden), tuple(elegidos)))
+                if len(mejores) > n:
+                    heapq.heappop(mejores)
+                if publicar and len(mejores) == n:
+                    publicar((-mejores[0][0], -mejores[0][1]))
+            return
+
+        opciones = sorted(vs[i].opciones, key = lambda o: (ocupado & o[1]).bit_count() + o[2])
+        for g, m, propios in opciones:
+            c = conflictos + propios + (ocupado & m).bit_count()
+            o = ocupado | m
+            if (c, float('-inf') if negativos else coste_total(monotonos, o)) >= peor():
+                continue
+            # cada variable que falta va a añadir como mínimo los conflictos de su mejor grupo con lo ya ocupado
+            if c + minimo_restante(i + 1, o) > peor()[0]:
+                continue
+            elegidos.append(g)
+            explorar(i + 1, o, c)
+            elegidos.pop()
+
+    ocupado, conflictos = 0, 0
+    for v, g in zip(vs, prefijo):
+        _, m, propios = next(o for o in v.opciones if o[0] == g)
+        conflictos += propios + (ocupado & m).bit_count()
+        ocupado |= m
+        elegidos.append(g)
+    explorar(len(prefijo), ocupado, conflictos)
+
+    if estadisticas is not None:
+        estadisticas['nodos'] = estadisticas.get('nodos', 0) + nodos
+    return sorted(solucion(vs, e, -c, -k) for c, k, _, e in mejores)
+
+# Las n mejores combinaciones de grupos para las materias del horario
+def resolver(horario: api.Horario, n: int = 5, costes: list[Coste] | None = None, estadisticas: dict | None = None):
+    costes = list(COSTES.values()) if costes is None else costes
+    return buscar(variables(horario), n, costes, estadisticas = estadisticas)
+
+# Selecciona en el horario los grupos de una solución
+def aplicar(horario: api.Horario, solucion: Solucion):
+    for nombre, grupos in solucion.grupos.items():
+        for tipo, grupo in grupos.items():
+            api.cambiar_grupo(horario, nombre, tipo, grupo)
+
+# Búsqueda en paralelo
+# ---
+
+# El espacio se reparte por los grupos de las primeras variables. Cada proceso guarda sus n mejores, y la peor
+# de ellas es una cota válida para todos (las n mejores globales son al menos igual de buenas), así que se
+# comparte en memoria y cada proceso poda con la menor publicada
+
+_cota = None
+
+def _iniciar(cota):
+    global _cota
+    _cota = cota
+
+def _leer_cota():
+    return (_cota[0], _cota[1])
+
+def _publicar(p: tuple[int, float]):
+    with _cota.get_lock():
+        if p < (_cota[0], _cota[1]):
+            _cota[0], _cota[1] = p
+
+def _tarea(vs: list[Variable], n: int, costes: list[Coste], prefijo: tuple[int, ...]):
+    est = {}
+    r = buscar(vs, n, costes, prefijo, cota = _leer_cota, publicar = _publicar, estadisticas = est)
+    return r, est['nodos']
+
+# Prefijos de grupos de las primeras variables, al menos tareas_por_proceso por proceso
+def prefijos(vs: list[Variable], procesos: int, tareas_por_proceso: int = 4):
+    k, total = 0, 1
+    while k < len(vs) and total < procesos * tareas_por_proceso:
+        total *= len(vs[k].opciones)
+        k += 1
+    return list(itertools.product(*[[g for g, _, _ in v.opciones] for v in vs[:k]]))
+
+def buscar_paralelo(vs: list[Variable], n: int, costes: list[Coste], procesos: int | None = None, estadisticas: dict | None = None):
+    procesos = procesos or os.cpu_count() or 1
+    if procesos == 1:
+        return buscar(vs, n, costes, estadisticas = estadisticas)
+
+    cota = mp.Array('d', [float('inf'), float('inf')])
+    soluciones = []
+    with ProcessPoolExecutor(max_workers = procesos, initializer = _iniciar, initargs = (cota,)) as ex:
+        futuros = [ex.submit(_tarea, vs, n, costes, p) for p in prefijos(vs, procesos)]
+        for f in futuros:
+            r, nodos = f.result()
+            soluciones += r
+            if estadisticas is not None:
+                estadisticas['nodos'] = estadisticas.get('nodos', 0) + nodos
+    return sorted(soluciones)[:n]
+
+def resolver_paralelo(horario: api.Horario, n: int = 5, costes: list[Coste] | None = None, procesos: int | None = None, estadisticas: dict | None = None):
+    costes = list(COSTES.values()) if costes is None else costes
+    return buscar_paralelo(variables(horario), n, costes, procesos, estadisticas)
@@ -0,0 +1,126 @@
+# Calendario de exámenes del catálogo
+# La web solo da la hora de inicio, así que todos los exámenes se tratan como intervalos de la misma
+# duración. Con eso dos exámenes se solapan si empiezan a menos de DURACION_EXAMEN el uno del otro, y los
+# que se solapan con uno dado se encuentran con una búsqueda binaria en la lista ordenada por inicio
+#
+# Las materias se identifican por enlace, el nombre solo se usa para mostrarlas (materias distintas de varios
+# grados pueden llamarse igual). Una materia compartida por varios grados aparece varias veces en el catálogo
+# con el mismo enlace y examen, se cuenta una sola vez
+
+import datetime as dt
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+
+DURACION_EXAMEN = dt.timedelta(hours = 3)
+MARGEN_SEGUIDOS = dt.timedelta(hours = 24) # entre el final de un examen y el siguiente para considerarlos seguidos
+
+@dataclass(frozen = True, slots = True)
+class ExamenMateria:
+    inicio: dt.datetime
+    enlace: str
+    nombre: str
+    aulas: frozenset[str]
+
+    @property
+    def fin(self):
+        return self.inicio + DURACION_EXAMEN
+
+@dataclass(frozen = True, slots = True)
+class Pico:
+    fecha: dt.date
+    hora: dt.datetime
+    examenes: int # exámenes a la vez
+    aulas: frozenset[str] # aulas ocupadas en ese momento
+
+def examenes_de(materia):
+    return [ExamenMateria(e.fecha, materia.enlace, materia.nombre, frozenset(e.aula)) for e in materia.examenes]
+
+def orden(e: ExamenMateria):
+    return (e.inicio, e.nombre, e.enlace)
+
+class IndiceExamenes:
+    def __init__(self, materias: list):
+        self.materias = materias
+        unicos = { (e.inicio, e.enlace): e for m in materias for e in examenes_de(m) }
+        self.examenes = sorted(unicos.values(), key = orden)
+        self.inicios = [e.inicio for e in self.examenes]
+        self.por_materia: dict[str, list[ExamenMateria]] = {} # enlace -> exámenes
+        for e in self.examenes:
+            self.por_materia.setdefault(e.enlace, []).append(e)
+        self._picos: list[Pico] | None = None
+
+    # Exámenes del catálogo que se solapan con el intervalo [inicio, fin)
+    def en_intervalo(self, inicio: dt.datetime, fin: dt.datetime):
+        return self.examenes[bisect_right(self.inicios, inicio - DURACION_EXAMEN):bisect_left(self.inicios, fin)]
+
+    # Exámenes de un conjunto de materias ordenados por inicio, los de materias que no están en el índice se
+    # leen de la propia materia
+    def de_materias(self, materias: list):
+        l = []
+        for m in materias:
+            l += self.por_materia[m.enlace] if m.enlace in self.por_materia else examenes_de(m)
+        return sorted(l, key = orden)
+
+    # Parejas de exámenes de materias distintas que coinciden en el tiempo
+    def choques(self, materias: list):
+        l = self.de_materias(materias)
+        r = []
+        for i, a in enumerate(l):
+            for b in l[i + 1:]:
+                if b.inicio >= a.fin:
+                    break
+                if b.enlace != a.enlace:
+                    r.append((a, b))
+        return r
+
+    # Secuencias de dos o más exámenes en las que cada uno empieza menos de margen después de que acabe el
+    # anterior (por ejemplo en días seguidos)
+    def seguidos(self, materias: list, margen: dt.timedelta = MARGEN_SEGUIDOS):
+        r = []
+        actual = []
+        for e in self.de_materias(materias):
+            if actual and e.inicio - actual[-1].fin >= margen:
+                if len({ x.enlace for x in actual }) > 1:
+                    r.append(actual)
+                actual = []
+            actual.append(e)
+        if len({ x.enlace for x in actual }) > 1:
+            r.append(actual)
+        return r
+
+    # Nombres de las materias del catálogo con algún examen a la vez que los de las materias dadas
+    def choques_con(self, materias: list):
+        enlaces = { m.enlace for m in materias }
+        r = set()
+        for e in self.de_materias(materias):
+            r.update(x.nombre for x in self.en_intervalo(e.inicio, e.fin) if not x.enlace in enlaces)
+        return r
+
+    # Momento de cada día con más exámenes a la vez en todo el catálogo y las aulas ocupadas entonces
+    def picos_aulas(self):
+        if self._picos is None:
+            self._picos = []
+            i = 0
+            while i < len(self.examenes):
+                fecha = self.examenes[i].inicio.date()
+                j = i
+                while j < len(self.examenes) and self.examenes[j].inicio.date() == fecha:
+                    j += 1
+                self._picos.append(self.pico(self.examenes[i:j]))
+                i = j
+        return self._picos
+
+    # Los exámenes están ordenados, en cada inicio están en curso los que empezaron hace menos de la duración
+    @staticmethod
+    def pico(examenes: list[ExamenMateria]):
+        mejor, desde = None, 0
+        for k, e in enumerate(examenes):
+            while examenes[desde].fin <= e.inicio:
+                desde += 1
+            # los que empiezan a la misma hora se cuentan juntos en el último de ellos
+            if k + 1 < len(examenes) and examenes[k + 1].inicio == e.inicio:
+                continue
+            if mejor is None or k + 1 - desde > mejor[0]:
+                mejor = (k + 1 - desde, e.inicio, desde, k + 1)
+        n, hora, a, b = mejor
+        return Pico(hora.date(), hora, n, frozenset().union(*(x.aulas for x in examenes[a:b])))
@@ -0,0 +1,217 @@
+# Exporta de una vez los horarios de todos los cursos y cuatrimestres del grado, con los grupos por defecto
+# El catálogo se lee una sola vez y se pasa a los procesos, que construyen y generan cada horario en
+# paralelo. Los archivos se escriben al final desde el proceso principal
+#
+#   python exportar.py                                  html y csv de todos los cursos en horarios/
+#   python exportar.py --formato html csv ics --procesos 4 --salida publicar
+#   python exportar.py --formato ics --inicio 1=2023-09-11 --inicio 2=2024-01-29 --semanas 14
+#
+# El calendario (ics) repite cada clase todas las semanas del cuatrimestre e incluye las fechas de los
+# exámenes de sus materias. El inicio y el número de semanas se sacan de los nombres de las semanas de la
+# web (por ejemplo 'Semana del 11/09 al 15/09') si se conocen, si no hay que indicarlos
+
+import argparse
+import datetime as dt
+import hashlib
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import fields
+
+import api
+import examenes
+
+FORMATOS = ('html', 'csv', 'ics')
+SALIDA = 'horarios'
+SEMANAS_CUATRIMESTRE = 14 # si no se conocen las semanas de la web
+PRODID = '-//horarios-usc//ES'
+
+# Calendario
+# ---
+
+def texto_ics(texto: str):
+    return texto.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+def fecha_ics(fecha: dt.datetime):
+    return fecha.strftime('%Y%m%dT%H%M%S')
+
+# Las líneas de más de 75 bytes se parten y las siguientes empiezan por un espacio
+def plegar(linea: str):
+    partes = []
+    b = linea.encode('utf-8')
+    while len(b) > 75:
+        corte = 75 if not partes else 74
+        while corte > 0 and (b[corte] & 0xC0) == 0x80: # no partir un carácter utf-8
+            corte -= 1
+        partes.append(b[:corte].decode('utf-8'))
+        b = b[corte:]
+    partes.append(b.decode('utf-8'))
+    return '\r\n '.join(partes)
+
+def evento(uid: str, resumen: str, lugar: str, inicio: dt.datetime, fin: dt.datetime, sello: str, regla: str | None = None):
+    l = ['BEGIN:VEVENT', f'UID:{uid}', f'DTSTAMP:{sello}', f'DTSTART:{fecha_ics(inicio)}', f'DTEND:{fecha_ics(fin)}']
+    if regla:
+        l.append(f'RRULE:{regla}')
+    l += [f'SUMMARY:{texto_ics(resumen)}', f'LOCATION:{texto_ics(lugar)}', 'END:VEVENT']
+    return l
+
+def uid(*partes):
+    return hashlib.sha1('|'.join(map(str, partes)).encode('utf-8')).hexdigest() + '@horarios-usc'
+
+# Calendario de un horario: las clases de los grupos seleccionados cada semana desde inicio (un lunes) y los
+# exámenes de sus materias. Las horas son locales, sin zona horaria
+def ical_horario(horario: api.Horario, inicio: dt.date, semanas: int, sello: str):
+    l = ['BEGIN:VCALENDAR', 'VERSION:2.0', f'PRODID:{PRODID}', 'CALSCALE:GREGORIAN']
+    for m in horario.materias.values():
+        for h in m.horario:
+            if h.grupo != m.grupo_seleccionado[h.tipo.value]:
+                continue
+            dia = inicio + dt.timedelta(days = h.dia)
+            resumen = f'{m.nombre} ({api.tipo_clase_ch[h.tipo]}{h.grupo})'
+            l += evento(uid(m.enlace, h.tipo.value, h.grupo, h.dia, h.hora_inicio, inicio), resumen, h.aula,
+                        dt.datetime.combine(dia, h.hora_inicio), dt.datetime.combine(dia, h.hora_fin), sello, f'FREQ=WEEKLY;COUNT={semanas}')
+        for e in m.examenes:
+            l += evento(uid(m.enlace, 'examen', e.fecha), f'Examen: {m.nombre}', ', '.join(sorted(e.aula)),
+                        e.fecha, e.fecha + examenes.DURACION_EXAMEN, sello)
+    l.append('END:VCALENDAR')
+    return '\r\n'.join(map(plegar, l)) + '\r\n'
+
+patron_semana = re.compile(r'(\d{1,2})/(\d{1,2})')
+
+# Año en el que empieza el curso académico, por las fechas de los exámenes (o la fecha actual si no hay)
+def inicio_curso_academico(materias: list[api.Materia]):
+    fechas = [e.fecha for m in materias for e in m.examenes]
+    d = min(fechas) if fechas else dt.datetime.now()
+    return d.year if d.month >= 8 else d.year - 1
+
+# (lunes de la primera semana, número de semanas) de un cuatrimestre a partir de los nombres de las semanas
+# guardados en las materias o en el índice de semanas, None si no se conocen
+def semanas_cuatrimestre(materias: list[api.Materia], cuatrimestre: int):
+    nombres = next((list(m.semanas) for m in materias if m.cuatrimestre == cuatrimestre and m.semanas), None)
+    if nombres is None:
+        nombres = api.indice_semanas()['cuatrimestres'].get(str(cuatrimestre), {}).get('semanas')
+    f = patron_semana.search(nombres[0]) if nombres else None
+    if f is None:
+        return None
+    dia, mes = int(f.group(1)), int(f.group(2))
+    año = inicio_curso_academico(materias)
+    fecha = dt.date(año if mes >= 8 else año + 1, mes, dia)
+    return (fecha - dt.timedelta(days = fecha.weekday()), len(nombres))
+
+# Exportación
+# ---
+
+# Las materias diferidas de un almacén .db no se pueden pasar a otro proceso, se cargan antes
+def materializar(m: api.Materia):
+    if isinstance(m, api.MateriaDiferida):
+        return api.Materia(**{ f.name: getattr(m, f.name) for f in fields(api.Materia) })
+    return m
+
+_materias: list[api.Materia] = []
+
+def _iniciar(materias: list[api.Materia]):
+    global _materias
+    _materias = materias
+    api.AVISAR_CONFLICTOS = False
+
+# Genera los archivos de un curso y cuatrimestre: (curso, cuatrimestre, {formato: contenido}, tiempos)
+def _exportar(curso: int, cuatrimestre: int, formatos: list[str], calendario: tuple[dt.date, int] | None, sello: str):
+    tiempos = {}
+    t = time.perf_counter()
+    horario = api.horario_curso(curso, cuatrimestre, _materias)
+    tiempos['horario'] = time.perf_counter() - t
+
+    archivos = {}
+    for formato in formatos:
+        t = time.perf_counter()
+        if formato == 'html':
+            archivos[formato] = '<meta charset="UTF-8">' + api.html_horario(horario)
+        elif formato == 'csv':
+            archivos[formato] = horario.df.to_csv()
+        else:
+            archivos[formato] = ical_horario(horario, *calendario, sello)
+        tiempos[formato] = time.perf_counter() - t
+    return curso, cuatrimestre, len(horario.materias), archivos, tiempos
+
+def exportar(materias: list[api.Materia], variantes: list[tuple[int, int]], formatos: list[str], calendarios: dict,
+             procesos: int | None = None):
+    sello = dt.datetime.now(dt.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    tareas = [(c, q, formatos, calendarios.get(q), sello) for c, q in variantes]
+    procesos = min(procesos or os.cpu_count() or 1, len(tareas))
+    if procesos <= 1:
+        _iniciar(materias)
+        return [_exportar(*t) for t in tareas]
+    with ProcessPoolExecutor(max_workers = procesos, initializer = _iniciar, initargs = (materias,)) as ex:
+        return list(ex.map(_exportar, *zip(*tareas)))
+
+def escribir(resultados: list, salida: str):
+    os.makedirs(salida, exist_ok = True)
+    total = 0
+    for curso, cuatrimestre, _, archivos, _ in resultados:
+        for formato, contenido in archivos.items():
+            datos = contenido.encode('utf-8')
+            with open(os.path.join(salida, f'curso{curso}_cuatrimestre{cuatrimestre}.{formato}'), 'wb') as f:
+                f.write(datos)
+            total += len(datos)
+    return total
+
+def fecha_inicio(texto: str):
+    try:
+        cuatrimestre, fecha = texto.split('=')
+        return int(cuatrimestre), dt.date.fromisoformat(fecha)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{texto}' no es válido, se espera cuatrimestre=AAAA-MM-DD")
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Exporta los horarios de todos los cursos')
+    parser.add_argument('--catalogo', default = api.catalogo.archivo, help = 'materias.json, catálogo .bin o almacén .db')
+    parser.add_argument('--salida', default = SALIDA, help = 'carpeta donde se escriben los archivos')
+    parser.add_argument('--formato', nargs = '+', choices = FORMATOS, default = ['html', 'csv'])
+    parser.add_argument('--curso', type = int, nargs = '*', help = 'por defecto todos')
+    parser.add_argument('--cuatrimestre', type = int, nargs = '*', default = [1, 2])
+    parser.add_argument('--procesos', type = int, default = None, help = 'por defecto uno por núcleo')
+    parser.add_argument('--inicio', type = fecha_inicio, action = 'append', default = [], help = 'primer día de un cuatrimestre para el calendario, por ejemplo 1=2023-09-11')
+    parser.add_argument('--semanas', type = int, help = 'semanas de clase de cada cuatrimestre en el calendario')
+    args = parser.parse_args()
+
+    t_total = time.perf_counter()
+    t = time.perf_counter()
+    api.catalogo = api.Catalogo(args.catalogo)
+    materias = [materializar(m) for m in api.catalogo.leer()]
+    t_lectura = time.perf_counter() - t
+
+    cursos = args.curso or sorted({ m.curso for m in materias })
+    variantes = [(c, q) for c in cursos for q in args.cuatrimestre if any(m.curso == c and m.cuatrimestre in (0, q) for m in materias)]
+
+    calendarios = {}
+    if 'ics' in args.formato:
+        inicios = dict(args.inicio)
+        for q in args.cuatrimestre:
+            web = semanas_cuatrimestre(materias, q)
+            if q in inicios:
+                inicio = inicios[q] - dt.timedelta(days = inicios[q].weekday())
+                calendarios[q] = (inicio, args.semanas or (web[1] if web else SEMANAS_CUATRIMESTRE))
+            elif web:
+                calendarios[q] = (web[0], args.semanas or web[1])
+            else:
+                raise SystemExit(f'No se sabe cuándo empieza el cuatrimestre {q}, indícalo con --inicio {q}=AAAA-MM-DD')
+
+    t = time.perf_counter()
+    resultados = exportar(materias, variantes, args.formato, calendarios, args.procesos)
+    t_generar = time.perf_counter() - t
+
+    t = time.perf_counter()
+    bytes_escritos = escribir(resultados, args.salida)
+    t_escribir = time.perf_counter() - t
+
+    ms = lambda s: f'{s * 1000:.1f}ms'
+    print(f"{'curso':>5} {'cuatri':>6} {'materias':>8} {'horario':>9}" + ''.join(f' {f:>9}' for f in args.formato))
+    for curso, cuatrimestre, n, _, tiempos in resultados:
+        print(f"{curso:>5} {cuatrimestre:>6} {n:>8} {ms(tiempos['horario']):>9}" + ''.join(f' {ms(tiempos[f]):>9}' for f in args.formato))
+    n_archivos = len(resultados) * len(args.formato)
+    print(f'{n_archivos} archivos ({bytes_escritos / 1024:.0f} KiB) en {args.salida}/ en {time.perf_counter() - t_total:.2f}s: '
+          f'catálogo {ms(t_lectura)}, generar {ms(t_generar)}, escribir {ms(t_escribir)}')
+
+if __name__ == '__main__':
+    main()
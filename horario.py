@@ -1,297 +1,379 @@
 # todo: múltiples fechas
 # todo: carga en diferido
 
+import almacen
 import api
+import combinaciones
 
+from pywebio import start_server
 from pywebio.input import *
 from pywebio.pin import *
 from pywebio.output import *
-from pywebio.session import run_js, set_env
+from pywebio.session import eval_js, run_js, set_env
 
+import argparse
+import json
 import os
+import threading
 from unidecode import unidecode
-import webbrowser
+
+# Todos los grados descargados se guardan en el almacén, cada sesión usa el catálogo del grado que ha elegido
+# (api.catalogo_grado) o el de la lista de materias incluida
+api.catalogo = api.Catalogo(almacen.ARCHIVO)
+incluido = api.Catalogo(api.ARCHIVO_MATERIAS)
+PUERTO = 8080
+GRADO_NAVEGADOR = 'horarios-usc.grado' # el grado elegido se recuerda en el navegador de cada usuario
+
+CURSOS = { 'Primero': 1, 'Segundo': 2, 'Tercero': 3, 'Cuarto': 4, 'Quinto': 5, 'Sexto': 6 }
+CUATRIMESTRES = { 'Primero': 1, 'Segundo': 2 }
+
+# Los catálogos, las semanas descargadas y su precarga se comparten entre las sesiones del mismo grado
+_precargas: dict[str, threading.Thread] = {}
+_lock_precarga = threading.Lock()
+
+def precargar(grado: str, lista: list[api.Materia], primero: set[str]):
+    with _lock_precarga:
+        hilo = _precargas.get(grado)
+        if hilo is None or not hilo.is_alive():
+            # las materias del curso visible primero, luego el resto
+            _precargas[grado] = api.precargar_semanas(sorted(lista, key = lambda m: m.nombre not in primero), grado = grado)
 
 # Funciones ayuda
 # ---
 
-def materia(nombre: str):
-    l = api.lista_materias() # datos precargados
-    m = api.encontrar_materia(l, nombre)[0][0]
-    return m
-
-def comprobar_semana():
-    global horario, semanas, primera_semana
-    with use_scope('aviso_cambio_semana', clear = True):
-        put_warning('Descargar los datos de una semana diferente lleva un tiempo, lo siento :c Cargando...')
-    for m in horario.materias.values():
-        if m.cuatrimestre != cuatrimestres[pin.cuatri]:
-            continue
-        if m.semana == '':
-            m.semana = primera_semana[pin.cuatri]
-        if m.semana != pin.semana:
-            m.semana = pin.semana
-            api.cambiar_semana(m)
-    with use_scope('aviso_cambio_semana', clear = True):
-        pass
-    api.actualizar_horario(horario)
-
-def refrescar_curso(e):
-    global horario, cursos, cuatrimestres
-    horario = api.horario_curso(cursos[e], cuatrimestres[pin.cuatri])
-    comprobar_semana()
-    widget_grupos(pin.semana)
-    render()
-def refrescar_cuatri(e):
-    global horario, cursos, cuatrimestres
-    horario = api.horario_curso(cursos[pin.curso], cuatrimestres[e])
-    widget_grupos()
-    widget_buscar()
-    render()
-
-def refrescar_grupo(tipo):
-    global horario, cursos
-    def wrapper(e):
-        for m in horario.materias.values():
-            if m.curso == cursos[pin.curso] and m.tipo != api.TipoMateria.OPTATIVO:
-                m.grupo_seleccionado[tipo.value] = min(m.num_grupos[tipo.value], e)
-        api.actualizar_horario(horario)
-        render()
-    return wrapper
-
-def refrescar_semana(e):
-    global horario, semanas
-    comprobar_semana()
-    render()
-
-def incluir_materia():
-    global horario, semanas
-    m = materia(pin.buscar)
-    api.incluir_en_horario(horario, m)
-    comprobar_semana()
-    widget_grupos()
-    render()
-
-def cambiar_grupo_materia(nombre, tipo):
-    global horario
-    def wrapper(e):
-        horario.materias[nombre].grupo_seleccionado[tipo] = e
-        api.actualizar_horario(horario)
-        render()
-    return wrapper
-
-def eliminar_materia(nombre):
-    global horario
-    def wrapper():
-        api.eliminar_de_horario(horario, nombre)
-        widget_grupos()
-        render()
-    return wrapper
-
-def resetear():
-    confirmar = actions('Confirmas descartar todos los cambios?', ['Si', 'No'], help_text = 'La aplicación volverá a descargar la lista de grados y materias')
-    if confirmar != 'Si':
-        return
+# None si la búsqueda no encuentra nada (por ejemplo vacía)
+def materia(catalogo: api.Catalogo, nombre: str):
+    r = catalogo.indice().buscar(nombre, 1) # índice del catálogo precargado
+    return api.copiar_materia(r[0][0]) if r else None
+
+# Estado de cada navegador conectado, pywebio ejecuta cada sesión (y sus callbacks) en su propio hilo
+class Sesion:
+    def __init__(self, catalogo: api.Catalogo):
+        self.catalogo = catalogo
+        self.grado = catalogo.clave() # para el índice de semanas
+        self.horario: api.Horario | None = None
+        self.semanas: dict[str, dict[str, str]] = {}
+        self.primera_semana: dict[str, str] = {}
+        self.cursos = dict(CURSOS)
+
+    def comprobar_semana(self):
+        cambios = []
+        for m in self.horario.materias.values():
+            if m.cuatrimestre != CUATRIMESTRES[pin.cuatri]:
+                continue
+            if m.semana == '':
+                m.semana = self.primera_semana[pin.cuatri]
+            if m.semana != pin.semana:
+                m.semana = pin.semana
+                cambios.append(m)
+        if any(not api.semana_en_cache(m, m.semana) for m in cambios):
+            with use_scope('aviso_cambio_semana', clear = True):
+                put_warning('Esta semana todavía no se ha terminado de descargar, lo siento :c Cargando...')
+        for m in cambios:
+            api.cambiar_semana(m, self.grado)
+            api.recolocar_materia(self.horario, m)
+        with use_scope('aviso_cambio_semana', clear = True):
+            pass
+
+    def refrescar_curso(self, e):
+        self.horario = api.horario_curso(self.cursos[e], CUATRIMESTRES[pin.cuatri], self.catalogo.leer())
+        self.comprobar_semana()
+        self.widget_grupos(pin.semana)
+        self.render()
+    def refrescar_cuatri(self, e):
+        self.horario = api.horario_curso(self.cursos[pin.curso], CUATRIMESTRES[e], self.catalogo.leer())
+        self.widget_grupos()
+        self.widget_buscar()
+        self.render()
+
+    def refrescar_grupo(self, tipo):
+        def wrapper(e):
+            for m in self.horario.materias.values():
+                if m.curso == self.cursos[pin.curso] and m.tipo != api.TipoMateria.OPTATIVO:
+                    api.cambiar_grupo(self.horario, m.nombre, tipo.value, min(m.num_grupos[tipo.value], e))
+            self.render()
+        return wrapper
+
+    def refrescar_semana(self, e):
+        self.comprobar_semana()
+        self.render()
+
+    def incluir_materia(self):
+        m = materia(self.catalogo, pin.buscar)
+        if m is None:
+            toast('No se ha encontrado ninguna materia')
+            return
+        api.incluir_en_horario(self.horario, m)
+        self.comprobar_semana()
+        self.widget_grupos()
+        self.render()
+
+    def cambiar_grupo_materia(self, nombre, tipo):
+        def wrapper(e):
+            api.cambiar_grupo(self.horario, nombre, tipo, e)
+            self.render()
+        return wrapper
+
+    def eliminar_materia(self, nombre):
+        def wrapper():
+            api.eliminar_de_horario(self.horario, nombre)
+            self.widget_grupos()
+            self.render()
+        return wrapper
+
+    def resetear(self):
+        confirmar = actions('Actualizar las materias o cambiar de grado?', ['Actualizar', 'Cambiar de grado', 'Cancelar'], help_text = 'Al actualizar solo se descargan las materias que han cambiado. Al cambiar de grado se puede elegir otro de los ya descargados o descargar uno nuevo. En los dos casos se descartan los cambios del horario')
+        if confirmar == 'Actualizar':
+            mostrar_progreso(api.actualizar_lista_materias(de = self.catalogo))
+            run_js('location.reload()')
+            return
+        if confirmar != 'Cambiar de grado':
+            return
+
+        # solo se olvida el grado de este navegador, el resto de sesiones siguen con el suyo
+        run_js('localStorage.removeItem(clave); location.reload()', clave = GRADO_NAVEGADOR)
+
+    # El horario se descarga desde el navegador, así cada usuario recibe el suyo
+    def guardar(self):
+        html = '<meta charset="UTF-8">' + api.html_horario(self.horario)
+        popup('Guardar horario', [
+            put_text('Si quieres imprimirlo puedes abrir el html y guardarlo como pdf'),
+            put_row([
+                put_file('horario.html', html.encode('utf-8'), 'Descargar html'),
+                put_file('horario.csv', self.horario.df.to_csv().encode('utf-8'), 'Descargar csv'),
+            ]),
+        ])
 
-    global url, grados, grado
-    url, grados, grado = None, None, None
-
-    os.remove('materias.json')
-    run_js('location.reload()')
-
-def guardar():
-    global horario
-    # save
-    with open('horario.html', 'w', encoding='utf-8') as f:
-        f.write('<meta charset="UTF-8">')
-        f.write(api.formato_horario(horario).to_html())
-    with open('horario.csv', 'w') as f:
-        f.write(horario.df.to_csv())
-
-    confirmar = actions('Horario guardado! Quieres abrirlo?', ['Si', 'No'], help_text = 'El horario se ha guardado en html y csv en la carpeta del programa. Si quieres imprimirlo puedes abrir el html y guardarlo como pdf')
-    if confirmar == 'Si':
-        webbrowser.open('file://' + os.path.realpath('horario.html'), new=2)
-
-def generar_semanas(lista):
-    global semanas, primera_semana
-    semanas = {}
-    primera_semana = {}
-    for m in lista:
-        if not 'Primero' in semanas and m.cuatrimestre == 1:
-            (semanas['Primero'], primera_semana['Primero']) = api.lista_semanas(m)
-        if not 'Segundo' in semanas and m.cuatrimestre == 2:
-            (semanas['Segundo'], primera_semana['Segundo']) = api.lista_semanas(m)
-
-# Widgets
+    def sugerir_grupos(self):
+        horario = self.horario
+        soluciones = combinaciones.resolver(horario, 5)
+        if not soluciones:
+            toast('No hay grupos que combinar')
+            return
+
+        def aplicar(s):
+            def wrapper():
+                combinaciones.aplicar(horario, s)
+                close_popup()
+                self.widget_grupos(pin.semana)
+                self.render()
+            return wrapper
+
+        def grupos(s):
+            return ', '.join(
+                horario.materias[n].abreviatura + ' ' + ''.join(f"{api.tipo_clase_ch[api.TipoClase(t)]}{g}" for t, g in sorted(gs.items(), key = lambda x: api.tipo_clase_ch[api.TipoClase(x[0])]))
+                for n, gs in s.grupos.items()
+            )
+
+        filas = [[s.conflictos, f'{s.coste:g}', grupos(s), put_button('Aplicar', onclick = aplicar(s))] for s in soluciones]
+        popup('Mejores combinaciones de grupos', [
+            put_text('Ordenadas por medias horas con conflicto y después por huecos, clases por la tarde y días con clase'),
+            put_table(filas, header = ['Conflictos', 'Coste', 'Grupos', '']),
+        ], size = PopupSize.LARGE)
+
+    def generar_semanas(self, lista):
+        self.semanas = {}
+        self.primera_semana = {}
+        for m in lista:
+            if not 'Primero' in self.semanas and m.cuatrimestre == 1:
+                (self.semanas['Primero'], self.primera_semana['Primero']) = api.semanas_materia(m, self.grado)
+            if not 'Segundo' in self.semanas and m.cuatrimestre == 2:
+                (self.semanas['Segundo'], self.primera_semana['Segundo']) = api.semanas_materia(m, self.grado)
+
+    # Widgets
+    # ---
+
+    def widget_grupos(self, semana = None):
+        with use_scope('seleccion_grupos', clear = True):
+            num_grupos = { t: -1 for t in api.TipoClase }
+            for m in self.horario.materias.values():
+                for t in m.grupo_seleccionado:
+                    num_grupos[t] = max(num_grupos[t], m.num_grupos[t])
+
+            select_grupo = []
+            for t in sorted(num_grupos.keys(), key = lambda x: api.tipo_clase_ch[x]):
+                if num_grupos[t] < 1:
+                    continue
+                select_grupo.append(put_select(f"grupo_{t.value}", options = list(range(0, num_grupos[t]+1)), value = 1, label = f"Grupo {t.value}"))
+                select_grupo.append(None)
+                pin_on_change(f"grupo_{t.value}", self.refrescar_grupo(t), clear = True)
+
+            select_grupo.append(put_select('semana', options = self.semanas.get(pin.cuatri, {}), label = 'Semana', value = semana))
+            pin_on_change('semana', self.refrescar_semana, clear = True)
+
+            put_row(select_grupo)
+
+        with use_scope('aviso_cambio_semana', clear = True):
+            pass
+
+    def widget_curso(self):
+        ultimo = max((m.curso for m in self.catalogo.leer()), default = 1)
+        self.cursos = dict(filter(lambda x: x[1] <= ultimo, CURSOS.items()))
+
+        with use_scope('seleccion', clear = True):
+            put_row([
+                put_select('curso', options = self.cursos.keys(), label = 'Curso'),
+                None,
+                put_select('cuatri', options = CUATRIMESTRES.keys(), label = 'Cuatrimestre'),
+            ])
+
+            pin_on_change('curso', self.refrescar_curso)
+            pin_on_change('cuatri', self.refrescar_cuatri)
+
+    def widget_buscar(self):
+        with use_scope('buscar', clear = True):
+            materias = [ m.nombre for m in self.catalogo.leer() if m.cuatrimestre == CUATRIMESTRES[pin.cuatri] and not m.nombre in self.horario.materias ]
+
+            put_row([
+                put_input('buscar', placeholder = 'Busca una materia', datalist = materias),
+                None,
+                put_button('Añadir', onclick = self.incluir_materia)
+            ], 'auto 10px 76px')
+
+    def widget_bottom(self):
+        with use_scope('bottom'):
+            put_button('Guardar horario', onclick = self.guardar)
+            put_button('Buscar mejores grupos', onclick = self.sugerir_grupos)
+            put_button('Resetear o cambiar de grado', onclick = self.resetear)
+
+    # Display
+    # ---
+
+    def render(self):
+        with use_scope('horario', clear = True):
+            def cambio_grupo(nombre, tipo, grupos, num_grupos):
+                l = []
+                for t in sorted(grupos.keys(), key = lambda x: api.tipo_clase_ch[x]):
+                    n = 'cambio' + t + unidecode(nombre.replace(' ', '_'))
+                    g = grupos[t]
+                    if g == -1:
+                        l.append(put_select(n, options = [ '-' ]))
+                        continue
+                    select = put_select(n, options = list(range(0 if tipo != api.TipoMateria.OPTATIVO else 0, num_grupos[t]+1)), value = g)
+                    pin_on_change(n, self.cambiar_grupo_materia(nombre, t), clear = True)
+                    l.append(select)
+                l.append(put_button('X', onclick = self.eliminar_materia(nombre)))
+                return put_row(l)
+
+            grupos = '|'.join([api.tipo_clase_ch[t] for t in api.TipoClase])
+            materias = [ [ put_html('<p style="margin:8px 0px;"><strong>Materia</strong></p>'), put_markdown(f"<p style='margin:8px 0px;'><strong>Grupos {grupos}</strong></p>") ] ]
+            materias += [ [ f"{m.nombre} ({m.abreviatura})", cambio_grupo(m.nombre, m.tipo, m.grupo_seleccionado, m.num_grupos) ] for m in self.horario.materias.values() ]
+
+            put_row([
+                put_html(api.html_horario(self.horario)),
+                None,
+                put_grid(materias, cell_height='48px')
+            ])
+
+            self.avisos_examenes()
+
+    # Exámenes a la vez o seguidos de las materias del horario, se comprueba en cada cambio con el índice del catálogo
+    def avisos_examenes(self):
+        indice = self.catalogo.examenes()
+        materias = list(self.horario.materias.values())
+        fecha = lambda e: e.inicio.strftime('%d/%m %H:%M')
+        choques = indice.choques(materias)
+        if choques:
+            put_warning('Exámenes a la vez: ' + '; '.join(f'{a.nombre} y {b.nombre} ({fecha(a)})' for a, b in choques))
+        seguidos = indice.seguidos(materias)
+        if seguidos:
+            put_info('Exámenes seguidos: ' + '; '.join(', '.join(f'{e.nombre} ({fecha(e)})' for e in s) for s in seguidos))
+
+# Elegir grado
 # ---
 
+URLS = [
+    'https://www.usc.gal/es/centro/escuela-tecnica-superior-ingenieria',
+    'https://www.usc.gal/es/centro/facultad-fisica',
+    'https://www.usc.gal/es/centro/facultad-filosofia'
+]
+
+# Catálogo de un grado elegido, (None, None) es la lista de materias incluida
+def catalogo_elegido(centro: str | None, grado: str | None):
+    return incluido if centro is None else api.catalogo_grado(centro, grado)
+
+# Las entradas de pywebio esperan a que el usuario responda sin ocupar la CPU
+# El grado no se selecciona en el almacén, que es de todos, sino que se guarda en el navegador
 def elegir_grado():
-    if os.path.exists('materias.json'):
-        return
-    
-    global url, grados, grado
-    url, grados, grado = None, None, None
-    
-    urls = [
-        'https://www.usc.gal/es/centro/escuela-tecnica-superior-ingenieria',
-        'https://www.usc.gal/es/centro/facultad-fisica',
-        'https://www.usc.gal/es/centro/facultad-filosofia'
-    ]
-
-    def elegir_url():
-        global url, grados
-        url = pin.url if 'http' in pin.url else f'https://{pin.url}'
-        with use_scope('buscando_grados'):
+    guardados = [(centro, g, n) for centro, g, n, _, _ in almacen.abrir(api.catalogo.archivo).grados()]
+    hay_incluido = os.path.exists(api.ARCHIVO_MATERIAS)
+
+    recordado = eval_js('localStorage.getItem(clave)', clave = GRADO_NAVEGADOR)
+    if recordado:
+        centro, grado = json.loads(recordado)
+        if (centro is None and hay_incluido) or (centro, grado) in [(c, g) for c, g, _ in guardados]:
+            return catalogo_elegido(centro, grado)
+
+    eleccion = None
+    # la primera vez se parte de la lista de materias incluida
+    if not guardados and hay_incluido:
+        eleccion = (None, None)
+    elif guardados or hay_incluido:
+        botones = [{ 'label': f'{g} ({n} materias)', 'value': (centro, g) } for centro, g, n in guardados]
+        if hay_incluido:
+            botones.append({ 'label': f'Lista de materias incluida ({len(incluido.leer())} materias)', 'value': (None, None) })
+        eleccion = actions('Grados ya descargados', botones + [{ 'label': 'Descargar otro grado', 'value': None, 'color': 'secondary' }])
+
+    if eleccion is None:
+        eleccion = descargar_grado([(c, g) for c, g, _ in guardados])
+    run_js('localStorage.setItem(clave, valor)', clave = GRADO_NAVEGADOR, valor = json.dumps(eleccion))
+    return catalogo_elegido(*eleccion)
+
+# Pide la facultad y el grado, y lo descarga si no estaba ya guardado
+def descargar_grado(guardados: list[tuple[str, str]]):
+    while True:
+        url = input('Url de la facultad', placeholder = URLS[0], datalist = URLS, required = True)
+        url = url if 'http' in url else f'https://{url}'
+        with use_scope('buscando_grados', clear = True):
             put_info('Buscando grados')
-        grados = sorted(api.obtener_grados(url))
-        remove('buscando_grados')
-        if not grados:
+        grados = sorted(api.obtener_grados(url) or [])
+        if grados:
+            break
+        with use_scope('buscando_grados', clear = True):
             put_error(f"La url {url} parece ser incorrecta, prueba de nuevo")
-            url = None
-
-    with use_scope('url'):
-        put_text('Url de la facultad')
-        put_row([
-            put_input('url', placeholder = urls[0], datalist = urls),
-            None,
-            put_button('Elegir', onclick = elegir_url),
-        ], 'auto 10px 76px')
-
-    while not url or not grados:
-        pass
-
-    def elegir_grado():
-        global grado
-        grado = pin.grado
-        if grado in grados:
-            grado = '^' + grado.replace('(', '[(]').replace(')', '[)]') + '$'
-        grado = 'Grao en Ingeniería Informática (2ªed)'
-
-    with use_scope('grado'):
-        put_text('Grado')
-        put_row([
-            put_input('grado', datalist = grados),
-            None,
-            put_button('Confirmar', onclick = elegir_grado),
-        ], 'auto 10px 76px')
-        put_text('Cuando presiones confirmar se cargará la lista de materias del grado correspondiente. Es posible que tarde un par de minutos, pero solo se hará una vez.')
-
-    while not grado:
-        pass
-    
-    for n in api.generar_lista_materias(url, grado):
+    remove('buscando_grados')
+
+    grado = input('Grado', datalist = grados, required = True, validate = lambda g: None if g in grados else 'Elige un grado de la lista',
+                  help_text = 'Cuando presiones confirmar se cargará la lista de materias del grado correspondiente. Es posible que tarde un par de minutos, pero solo se hará una vez.')
+
+    if not (url, grado) in guardados:
+        mostrar_progreso(api.generar_lista_materias(url, grado))
+    return (url, grado)
+
+# Muestra las materias según se van descargando
+def mostrar_progreso(materias):
+    for n in materias:
         if 'ERROR' in n:
             with use_scope('error'):
                 put_error(f"Error obteniendo datos de '{n.split(' ')[1]}', inténtalo de nuevo más tarde")
         else:
             with use_scope('cargando', clear = True):
                 put_info(f"Obteniendo datos de '{n}'")
-    
+
     remove('cargando')
     remove('error')
-    remove('grado')
-    remove('url')
-
-def widget_grupos(semana = None):
-    with use_scope('seleccion_grupos', clear = True):
-        global horario, semanas
-        num_grupos = { t: -1 for t in api.TipoClase }
-        for m in horario.materias.values():
-            for t in m.grupo_seleccionado:
-                num_grupos[t] = max(num_grupos[t], m.num_grupos[t])
-
-        select_grupo = []
-        for t in sorted(num_grupos.keys(), key = lambda x: api.tipo_clase_ch[x]):
-            if num_grupos[t] < 1:
-                continue
-            select_grupo.append(put_select(f"grupo_{t.value}", options = list(range(0, num_grupos[t]+1)), value = 1, label = f"Grupo {t.value}"))
-            select_grupo.append(None)
-            pin_on_change(f"grupo_{t.value}", refrescar_grupo(t), clear = True)
-
-        select_grupo.append(put_select('semana', options = semanas[pin.cuatri], label = 'Semana', value = semana))
-        pin_on_change('semana', refrescar_semana, clear = True)
-
-        put_row(select_grupo)
-    
-    with use_scope('aviso_cambio_semana', clear = True):
-        pass
-
-def widget_curso():
-    global horario, cursos, cuatrimestres
-    cursos = { 'Primero': 1, 'Segundo': 2, 'Tercero': 3, 'Cuarto': 4, 'Quinto': 5, 'Sexto': 6 }
-    cursos = dict(filter(lambda x: x[1] <= max(m.curso for m in api.lista_materias()), cursos.items()))
-    cuatrimestres = { 'Primero': 1, 'Segundo': 2 }
-
-    with use_scope('seleccion', clear = True):
-        put_row([
-            put_select('curso', options = cursos.keys(), label = 'Curso'),
-            None,
-            put_select('cuatri', options = cuatrimestres.keys(), label = 'Cuatrimestre'),
-        ])
-
-        pin_on_change('curso', refrescar_curso)
-        pin_on_change('cuatri', refrescar_cuatri)
-
-def widget_buscar():
-    global horario
-    with use_scope('buscar', clear = True):
-        materias = [ m.nombre for m in api.lista_materias() if m.cuatrimestre == cuatrimestres[pin.cuatri] and not m.nombre in horario.materias ]
-
-        put_row([
-            put_input('buscar', placeholder = 'Busca una materia', datalist = materias),
-            None,
-            put_button('Añadir', onclick = incluir_materia)
-        ], 'auto 10px 76px')
-
-def widget_bottom():
-    with use_scope('bottom'):
-        put_button('Guardar horario', onclick = guardar)
-        put_button('Resetear o cambiar de grado', onclick = resetear)
-
-# Display
-# ---
-
-def render():
-    global horario
-    with use_scope('horario', clear = True):
-        def cambio_grupo(nombre, tipo, grupos, num_grupos):
-            l = []
-            for t in sorted(grupos.keys(), key = lambda x: api.tipo_clase_ch[x]):
-                n = 'cambio' + t + unidecode(nombre.replace(' ', '_'))
-                g = grupos[t]
-                if g == -1:
-                    l.append(put_select(n, options = [ '-' ]))
-                    continue
-                select = put_select(n, options = list(range(0 if tipo != api.TipoMateria.OPTATIVO else 0, num_grupos[t]+1)), value = g)
-                pin_on_change(n, cambiar_grupo_materia(nombre, t), clear = True)
-                l.append(select)
-            l.append(put_button('X', onclick = eliminar_materia(nombre)))
-            return put_row(l)
-
-        grupos = '|'.join([api.tipo_clase_ch[t] for t in api.TipoClase])
-        materias = [ [ put_html('<p style="margin:8px 0px;"><strong>Materia</strong></p>'), put_markdown(f"<p style='margin:8px 0px;'><strong>Grupos {grupos}</strong></p>") ] ]
-        materias += [ [ f"{m.nombre} ({m.abreviatura})", cambio_grupo(m.nombre, m.tipo, m.grupo_seleccionado, m.num_grupos) ] for m in horario.materias.values() ]
-
-        put_row([
-            put_html(api.formato_horario(horario).to_html(border = 0)),
-            None,
-            put_grid(materias, cell_height='48px')
-        ])
 
 def main():
     set_env(output_max_width = '1000px')
 
-    elegir_grado()
-    generar_semanas(api.lista_materias())
-
-    global horario
-    horario = api.horario_curso(1, 1)
+    sesion = Sesion(elegir_grado())
+    lista = sesion.catalogo.copia()
+    if not lista:
+        put_warning('El grado elegido no tiene materias')
+        put_button('Resetear o cambiar de grado', onclick = sesion.resetear)
+        return
+    sesion.generar_semanas(lista)
+    sesion.horario = api.horario_curso(1, 1, sesion.catalogo.leer())
+    precargar(sesion.grado, lista, set(sesion.horario.materias))
 
-    widget_curso()
-    widget_grupos()
-    widget_buscar()
-    render()
-    widget_bottom()
+    sesion.widget_curso()
+    sesion.widget_grupos()
+    sesion.widget_buscar()
+    sesion.render()
+    sesion.widget_bottom()
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description = 'Interfaz web para crear horarios')
+    parser.add_argument('--puerto', type = int, default = PUERTO)
+    args = parser.parse_args()
+    start_server(main, port = args.puerto, auto_open_webbrowser = True)
@@ -0,0 +1,201 @@
+# Medidas de tiempo de las partes lentas: descargas, análisis de páginas, lectura del catálogo, cambios en
+# el horario y generación del html. Cada tramo acumula cuántas veces se ha ejecutado, el tiempo total y el
+# máximo, y los contadores cuentan sucesos sueltos (aciertos de caché, semanas descargadas...)
+#
+# Con variables de entorno se escribe un informe JSON al terminar y se puede perfilar todo el proceso:
+#
+#   HORARIOS_INFORME=informe.json python horario.py     tramos, contadores y red al salir ('-' para stderr)
+#   HORARIOS_PERFIL=cprofile python recomendar.py       cProfile del hilo principal, se guarda en perfil.prof
+#   HORARIOS_PERFIL=muestreo python horario.py          muestras de la pila de todos los hilos cada MUESTREO s
+#
+# Con cprofile solo se ve el hilo principal, para las descargas y las sesiones de la interfaz (que van en
+# otros hilos) es mejor el muestreo. Los dos resultados se añaden al informe
+
+import atexit
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+VARIABLE_INFORME = 'HORARIOS_INFORME'
+VARIABLE_PERFIL = 'HORARIOS_PERFIL'
+ARCHIVO_PERFIL = 'perfil.prof'
+MUESTREO = 0.005 # segundos entre muestras
+FUNCIONES_INFORME = 30 # funciones que se incluyen en el informe del perfil
+
+_lock = threading.Lock()
+_tramos: dict[str, list] = {} # nombre -> [veces, total, máximo]
+_contadores: Counter = Counter()
+_inicio = time.perf_counter()
+
+# Tramos y contadores
+# ---
+
+@contextmanager
+def tramo(nombre: str):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        t = time.perf_counter() - t
+        with _lock:
+            a = _tramos.get(nombre)
+            if a is None:
+                _tramos[nombre] = [1, t, t]
+            else:
+                a[0] += 1
+                a[1] += t
+                if t > a[2]:
+                    a[2] = t
+
+# Mide cada llamada a la función (no sirve para generadores, que se miden con tramo dentro)
+def medido(nombre: str):
+    def decorador(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            with tramo(nombre):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorador
+
+def contar(nombre: str, n: int = 1):
+    with _lock:
+        _contadores[nombre] += n
+
+def reiniciar():
+    global _inicio
+    with _lock:
+        _tramos.clear()
+        _contadores.clear()
+        _inicio = time.perf_counter()
+
+# Informe
+# ---
+
+def informe():
+    import red
+    with _lock:
+        tramos = { k: { 'veces': n, 'total': total, 'media': total / n, 'maximo': maximo } for k, (n, total, maximo) in sorted(_tramos.items()) }
+        contadores = dict(sorted(_contadores.items()))
+        duracion = time.perf_counter() - _inicio
+    r = { 'duracion': duracion, 'tramos': tramos, 'contadores': contadores, 'red': red.resumen() }
+    if _perfil is not None:
+        r['cprofile'] = resumen_cprofile()
+    if _muestreo is not None:
+        r['muestreo'] = _muestreo.resumen()
+    return r
+
+# Tabla de los tramos ordenados por tiempo total, para la consola
+def texto():
+    l = [f"{'tramo':<28} {'veces':>7} {'total':>9} {'media':>9} {'máximo':>9}"]
+    for k, t in sorted(informe()['tramos'].items(), key = lambda x: -x[1]['total']):
+        l.append(f"{k:<28} {t['veces']:>7} {t['total']:>8.3f}s {t['media'] * 1000:>7.2f}ms {t['maximo'] * 1000:>7.1f}ms")
+    return '\n'.join(l)
+
+def escribir_informe(destino: str):
+    datos = json.dumps(informe(), ensure_ascii = False, indent = 4)
+    if destino == '-':
+        print(datos, file = sys.stderr)
+        return
+    with open(destino + '.tmp', 'w', encoding = 'utf-8') as f:
+        f.write(datos)
+    os.replace(destino + '.tmp', destino)
+
+# Perfiles
+# ---
+
+_perfil: cProfile.Profile | None = None
+_terminado = False
+
+# Leer las estadísticas detiene el perfil, si no se ha terminado se vuelve a activar
+def resumen_cprofile():
+    s = pstats.Stats(_perfil, stream = io.StringIO())
+    if not _terminado:
+        _perfil.enable()
+    filas = sorted(s.stats.items(), key = lambda x: -x[1][3])[:FUNCIONES_INFORME]
+    return [{ 'funcion': f'{archivo}:{linea}({funcion})', 'llamadas': nc, 'propio': tt, 'acumulado': ct }
+            for (archivo, linea, funcion), (_, nc, tt, ct, _) in filas]
+
+# Perfil por muestreo: un hilo mira cada poco la pila de los demás y cuenta en qué función está cada uno
+# (propio) y qué funciones tiene en la pila (acumulado)
+class Muestreo:
+    def __init__(self, intervalo: float = MUESTREO):
+        self.intervalo = intervalo
+        self.muestras = 0
+        self.propio: Counter = Counter()
+        self.acumulado: Counter = Counter()
+        self.lock = threading.Lock()
+        self.parar = threading.Event()
+        self.hilo = threading.Thread(target = self.bucle, daemon = True)
+
+    def iniciar(self):
+        self.hilo.start()
+        return self
+
+    def bucle(self):
+        yo = threading.get_ident()
+        while not self.parar.wait(self.intervalo):
+            for ident, frame in sys._current_frames().items():
+                if ident == yo:
+                    continue
+                pila = []
+                while frame is not None:
+                    pila.append(self.nombre(frame))
+                    frame = frame.f_back
+                with self.lock:
+                    self.muestras += 1
+                    self.propio[pila[0]] += 1
+                    self.acumulado.update(set(pila))
+
+    @staticmethod
+    def nombre(frame):
+        c = frame.f_code
+        return f'{c.co_filename}:{c.co_firstlineno}({c.co_name})'
+
+    def resumen(self):
+        with self.lock:
+            total = max(self.muestras, 1)
+            return {
+                'muestras': self.muestras,
+                'intervalo': self.intervalo,
+                'propio': [{ 'funcion': f, 'fraccion': n / total } for f, n in self.propio.most_common(FUNCIONES_INFORME)],
+                'acumulado': [{ 'funcion': f, 'fraccion': n / total } for f, n in self.acumulado.most_common(FUNCIONES_INFORME)],
+            }
+
+_muestreo: Muestreo | None = None
+
+def _al_salir():
+    global _terminado
+    _terminado = True
+    if _perfil is not None:
+        _perfil.disable()
+        _perfil.dump_stats(ARCHIVO_PERFIL)
+        print(f'Perfil guardado en {ARCHIVO_PERFIL}', file = sys.stderr)
+    if _muestreo is not None:
+        _muestreo.parar.set()
+    destino = os.environ.get(VARIABLE_INFORME)
+    if destino:
+        escribir_informe(destino)
+
+# Se configura al importar el módulo, así cualquier programa que use api queda medido desde el principio
+def configurar():
+    global _perfil, _muestreo
+    perfil = os.environ.get(VARIABLE_PERFIL, '')
+    if perfil == 'cprofile':
+        _perfil = cProfile.Profile()
+        _perfil.enable()
+    elif perfil == 'muestreo':
+        _muestreo = Muestreo().iniciar()
+    elif perfil:
+        print(f"{VARIABLE_PERFIL}='{perfil}' no es válido, se espera cprofile o muestreo", file = sys.stderr)
+    if _perfil is not None or _muestreo is not None or os.environ.get(VARIABLE_INFORME):
+        atexit.register(_al_salir)
+
+configurar()
@@ -0,0 +1,85 @@
+# Calcula los horarios recomendados (mejores combinaciones de grupos) sin abrir la interfaz
+#
+#   python recomendar.py                        todos los cursos y cuatrimestres
+#   python recomendar.py --curso 2 --cuatrimestre 1 -n 3 --procesos 4
+#   python recomendar.py --peso huecos=2 --peso tarde=0.5 --json recomendados.json
+
+import argparse
+import contextlib
+import io
+import json
+import time
+
+import api
+import combinaciones
+
+def horario(curso: int, cuatrimestre: int, optativas: bool):
+    with contextlib.redirect_stdout(io.StringIO()):
+        h = api.horario_curso(curso, cuatrimestre)
+        for m in list(h.materias.values()):
+            if m.tipo != api.TipoMateria.OPTATIVO:
+                continue
+            if not optativas:
+                api.eliminar_de_horario(h, m)
+                continue
+            # las optativas empiezan sin grupo (0) y la búsqueda las dejaría fuera
+            for t, n in m.num_grupos.items():
+                if n > 0:
+                    api.cambiar_grupo(h, m.nombre, t, 1)
+    return h
+
+def costes(pesos: list[str]):
+    l = { k: combinaciones.Coste(c.nombre, c.funcion, c.peso, c.monotono) for k, c in combinaciones.COSTES.items() }
+    for p in pesos:
+        nombre, valor = p.split('=')
+        if not nombre in l:
+            raise SystemExit(f"Coste '{nombre}' desconocido, opciones: {', '.join(l)}")
+        l[nombre].peso = float(valor)
+        if l[nombre].peso < 0:
+            raise SystemExit(f"El peso de '{nombre}' no puede ser negativo")
+    return [c for c in l.values() if c.peso != 0]
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Mejores combinaciones de grupos por curso')
+    parser.add_argument('--catalogo', default = api.catalogo.archivo, help = 'materias.json o catálogo .bin')
+    parser.add_argument('--curso', type = int, nargs = '*', help = 'por defecto todos')
+    parser.add_argument('--cuatrimestre', type = int, nargs = '*', default = [1, 2])
+    parser.add_argument('-n', type = int, default = 5, help = 'soluciones por curso')
+    parser.add_argument('--procesos', type = int, default = None, help = 'por defecto uno por núcleo')
+    parser.add_argument('--sin-optativas', action = 'store_true')
+    parser.add_argument('--peso', action = 'append', default = [], help = 'peso no negativo de un coste, por ejemplo huecos=2 (0 lo desactiva)')
+    parser.add_argument('--json', help = 'guarda los resultados en un archivo')
+    args = parser.parse_args()
+
+    api.catalogo = api.Catalogo(args.catalogo)
+    cursos = args.curso or sorted({ m.curso for m in api.lista_materias() })
+    cs = costes(args.peso)
+
+    resultados = []
+    for curso in cursos:
+        for cuatrimestre in args.cuatrimestre:
+            h = horario(curso, cuatrimestre, not args.sin_optativas)
+            est = {}
+            t = time.perf_counter()
+            soluciones = combinaciones.resolver_paralelo(h, args.n, cs, args.procesos, est)
+            t = time.perf_counter() - t
+
+            print(f"Curso {curso}, cuatrimestre {cuatrimestre}: {len(h.materias)} materias, {est.get('nodos', 0)} nodos, {t:.2f}s")
+            for i, s in enumerate(soluciones):
+                grupos = ', '.join(
+                    h.materias[n].abreviatura + ' ' + ''.join(f"{api.tipo_clase_ch[api.TipoClase(t)]}{g}" for t, g in sorted(gs.items()))
+                    for n, gs in s.grupos.items()
+                )
+                print(f"  {i + 1}. {s.conflictos} conflictos, coste {s.coste:g}: {grupos}")
+            resultados.append({
+                'curso': curso,
+                'cuatrimestre': cuatrimestre,
+                'soluciones': [{ 'conflictos': s.conflictos, 'coste': s.coste, 'grupos': s.grupos } for s in soluciones],
+            })
+
+    if args.json:
+        with open(args.json, 'w', encoding = 'utf-8') as f:
+            json.dump(resultados, f, ensure_ascii = False, indent = 4)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+# Capa HTTP compartida por todas las descargas
+# Usa una única sesión con conexiones persistentes, reintentos y un tiempo máximo de espera, y guarda las
+# respuestas en una caché en disco direccionada por contenido que se revalida con ETag / Last-Modified
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, asdict
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+import medidas
+
+DIRECTORIO = '.cache_http'
+CONEXIONES = 16 # conexiones por servidor en el pool
+VIGENCIA = 300 # segundos en los que una respuesta ya validada se usa sin volver a preguntar
+REINTENTOS = Retry(total = 3, backoff_factor = 0.5, status_forcelist = [429, 500, 502, 503, 504])
+TIEMPO_MAXIMO = 30 # segundos esperando a conectar o a recibir datos si quien llama no indica otro
+CONDICIONALES = ('if-none-match', 'if-modified-since')
+
+@dataclass
+class Estadisticas:
+    aciertos: int = 0 # servidas desde la caché sin tocar la red
+    revalidadas: int = 0 # el servidor respondió 304 y se usó la copia local
+    fallos: int = 0 # descargas completas
+    sin_cache: int = 0 # peticiones que no se guardan (POST, errores)
+    tiempo_red: float = 0.0
+    tiempo_ahorrado: float = 0.0 # estimado con la duración de la última descarga completa
+    bytes_descargados: int = 0
+    bytes_ahorrados: int = 0
+
+    def __str__(self):
+        return (f"[HTTP] {self.aciertos} aciertos, {self.revalidadas} revalidadas, {self.fallos} fallos, "
+                f"{self.sin_cache} sin caché | red {self.tiempo_red:.1f}s, ahorrado ~{self.tiempo_ahorrado:.1f}s, "
+                f"{self.bytes_descargados / 1e6:.1f}MB descargados, {self.bytes_ahorrados / 1e6:.1f}MB ahorrados")
+
+estadisticas = Estadisticas()
+
+# Caché en disco
+# ---
+
+# Índice url -> metadatos, los cuerpos se guardan en objetos/<sha256>
+# Cada respuesta nueva se añade como una línea a indice.jsonl (escribir todo el índice en cada una sería
+# cuadrático en una descarga completa), y al abrir la caché se juntan en indice.json
+class Cache:
+    def __init__(self, directorio: str | None):
+        self.directorio = directorio
+        self.lock = threading.Lock()
+        self.indice: dict[str, dict] = {}
+        self.validadas: dict[str, float] = {} # momento de la última validación en este proceso
+        if directorio:
+            os.makedirs(os.path.join(directorio, 'objetos'), exist_ok = True)
+            try:
+                with open(os.path.join(directorio, 'indice.json'), encoding = 'utf-8') as f:
+                    self.indice = json.load(f)
+            except (OSError, ValueError):
+                self.indice = {}
+            if self.leer_diario():
+                self.escribir_indice()
+                os.remove(self.diario)
+
+    @property
+    def diario(self):
+        return os.path.join(self.directorio, 'indice.jsonl')
+
+    # Añade al índice las entradas del diario, una línea cortada (por una interrupción) se ignora
+    def leer_diario(self):
+        try:
+            with open(self.diario, encoding = 'utf-8') as f:
+                lineas = f.readlines()
+        except OSError:
+            return False
+        for linea in lineas:
+            try:
+                url, entrada = json.loads(linea)
+            except ValueError:
+                continue
+            self.indice[url] = entrada
+        return True
+
+    def entrada(self, url: str):
+        with self.lock:
+            return self.indice.get(url)
+
+    def vigente(self, url: str):
+        with self.lock:
+            return time.monotonic() - self.validadas.get(url, -VIGENCIA) < VIGENCIA
+
+    def leer(self, entrada: dict):
+        try:
+            with open(os.path.join(self.directorio, 'objetos', entrada['hash']), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def guardar(self, url: str, r: requests.Response, duracion: float):
+        if not self.directorio:
+            return
+        etag, modificado = r.headers.get('ETag'), r.headers.get('Last-Modified')
+        if not etag and not modificado:
+            return
+
+        h = hashlib.sha256(r.content).hexdigest()
+        objeto = os.path.join(self.directorio, 'objetos', h)
+        if not os.path.exists(objeto):
+            # temporal con nombre propio, dos hilos pueden estar guardando el mismo cuerpo
+            with tempfile.NamedTemporaryFile(dir = os.path.dirname(objeto), prefix = h, suffix = '.tmp', delete = False) as f:
+                f.write(r.content)
+            os.replace(f.name, objeto)
+
+        entrada = {
+            'hash': h,
+            'etag': etag,
+            'modificado': modificado,
+            'codificacion': r.encoding,
+            'tipo': r.headers.get('Content-Type'),
+            'duracion': duracion,
+        }
+        with self.lock:
+            self.indice[url] = entrada
+            self.validadas[url] = time.monotonic()
+            with open(self.diario, 'a', encoding = 'utf-8') as f:
+                f.write(json.dumps([url, entrada]) + '\n')
+
+    def validada(self, url: str):
+        with self.lock:
+            self.validadas[url] = time.monotonic()
+
+    def escribir_indice(self):
+        ruta = os.path.join(self.directorio, 'indice.json')
+        with open(ruta + '.tmp', 'w', encoding = 'utf-8') as f:
+            json.dump(self.indice, f)
+        os.replace(ruta + '.tmp', ruta)
+
+# Sesión
+# ---
+
+# Las peticiones sin timeout esperan TIEMPO_MAXIMO, así una conexión parada no bloquea para siempre
+class Adaptador(HTTPAdapter):
+    def send(self, request, timeout = None, **kwargs):
+        return super().send(request, timeout = TIEMPO_MAXIMO if timeout is None else timeout, **kwargs)
+
+def nueva_sesion():
+    s = requests.Session()
+    adaptador = Adaptador(pool_connections = CONEXIONES, pool_maxsize = CONEXIONES, max_retries = REINTENTOS)
+    s.mount('http://', adaptador)
+    s.mount('https://', adaptador)
+    return s
+
+sesion = nueva_sesion()
+cache = Cache(DIRECTORIO)
+_lock = threading.Lock()
+
+# Cambia el directorio de la caché (None la desactiva) y reinicia los contadores
+def configurar(directorio: str | None = DIRECTORIO):
+    global cache, estadisticas
+    cache = Cache(directorio)
+    estadisticas = Estadisticas()
+
+def _contar(**kwargs):
+    with _lock:
+        for k, v in kwargs.items():
+            setattr(estadisticas, k, getattr(estadisticas, k) + v)
+
+# Respuesta construida a partir de la copia local
+def _respuesta(url: str, entrada: dict, cuerpo: bytes):
+    r = requests.Response()
+    r.status_code = 200
+    r.url = url
+    r._content = cuerpo
+    r.encoding = entrada['codificacion']
+    r.headers = CaseInsensitiveDict({ k: v for k, v in (
+        ('ETag', entrada['etag']), ('Last-Modified', entrada['modificado']), ('Content-Type', entrada['tipo'])
+    ) if v })
+    return r
+
+@medidas.medido('red.get')
+def get(url: str, **kwargs):
+    entrada = cache.entrada(url)
+    cuerpo = cache.leer(entrada) if entrada else None
+    if cuerpo is None:
+        entrada = None
+
+    if entrada and cache.vigente(url):
+        _contar(aciertos = 1, tiempo_ahorrado = entrada['duracion'], bytes_ahorrados = len(cuerpo))
+        return _respuesta(url, entrada, cuerpo)
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    if any(k.lower() in CONDICIONALES for k in headers):
+        # la validación la pide quien llama: sus cabeceras no se cambian y un 304 se le devuelve tal cual
+        entrada = None
+    elif entrada:
+        if entrada['etag']:
+            headers['If-None-Match'] = entrada['etag']
+        if entrada['modificado']:
+            headers['If-Modified-Since'] = entrada['modificado']
+
+    t = time.perf_counter()
+    r = sesion.get(url, headers = headers, **kwargs)
+    duracion = time.perf_counter() - t
+
+    if entrada and r.status_code == 304:
+        cache.validada(url)
+        _contar(revalidadas = 1, tiempo_red = duracion, tiempo_ahorrado = max(entrada['duracion'] - duracion, 0), bytes_ahorrados = len(cuerpo))
+        return _respuesta(url, entrada, cuerpo)
+
+    if r.status_code == 304:
+        # la validación la ha pedido quien llama (no hay copia local), la respuesta va sin cuerpo
+        _contar(revalidadas = 1, tiempo_red = duracion)
+        return r
+
+    if r.ok:
+        cache.guardar(url, r, duracion)
+        _contar(fallos = 1, tiempo_red = duracion, bytes_descargados = len(r.content))
+    else:
+        _contar(sin_cache = 1, tiempo_red = duracion)
+    return r
+
+@medidas.medido('red.post')
+def post(url: str, **kwargs):
+    t = time.perf_counter()
+    r = sesion.post(url, **kwargs)
+    _contar(sin_cache = 1, tiempo_red = time.perf_counter() - t, bytes_descargados = len(r.content))
+    return r
+
+def resumen():
+    with _lock:
+        return asdict(estadisticas)
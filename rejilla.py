@@ -0,0 +1,101 @@
+# Rejilla del horario: días x franjas de media hora
+# Cada celda guarda las etiquetas de las clases que caen en ella y cada día una máscara de bits con las
+# franjas ocupadas, así los conflictos se detectan con un AND. El DataFrame solo se construye al
+# mostrar o exportar el horario
+#
+# Las clases se añaden con una clave (materia, tipo de clase) para poder quitarlas después sin rehacer
+# todo el horario. Las celdas que cambian se marcan como sucias y solo esas se actualizan en el DataFrame
+
+import pandas as pd
+
+MINUTOS_FRANJA = 30
+FRANJAS = 24 * 60 // MINUTOS_FRANJA
+INICIO, FIN = 18, 20 # 09:00 y 10:00, rango mínimo que se muestra
+
+etiqueta_franja = [f'{f * MINUTOS_FRANJA // 60:02d}:{f * MINUTOS_FRANJA % 60:02d}' for f in range(FRANJAS)]
+
+def mascara(inicio: int, fin: int):
+    return ((1 << (fin - inicio)) - 1) << inicio
+
+class Rejilla:
+    def __init__(self, columnas: list[str]):
+        self.columnas = columnas
+        # etiqueta -> número de clases con esa etiqueta en la celda
+        self.celdas: list[list[dict[str, int]]] = [[{} for _ in range(FRANJAS)] for _ in columnas]
+        self.ocupado = [0] * len(columnas)
+        self.piezas: dict[object, list[tuple[int, int, int, str]]] = {}
+        self.conflictos: set[tuple[int, int]] = set() # celdas con más de una etiqueta
+        self.sucias: set[tuple[int, int]] = set()
+        # el rango de horas solo crece, igual que el índice del DataFrame al que sustituye
+        self.desde, self.hasta = INICIO, FIN
+        self._df = None
+
+    def limpiar(self):
+        for dia in self.celdas:
+            for celda in dia:
+                celda.clear()
+        self.ocupado = [0] * len(self.columnas)
+        self.piezas.clear()
+        self.conflictos.clear()
+        self.sucias.clear()
+        self._df = None
+
+    def texto(self, dia: int, franja: int):
+        return ' / '.join(sorted(self.celdas[dia][franja]))
+
+    def _marcar(self, dia: int, franja: int):
+        self.sucias.add((dia, franja))
+        celda = self.celdas[dia][franja]
+        if len(celda) > 1:
+            self.conflictos.add((dia, franja))
+        else:
+            self.conflictos.discard((dia, franja))
+        if not celda:
+            self.ocupado[dia] &= ~(1 << franja)
+
+    # Añade una clase y devuelve (franja, texto de la celda) del primer conflicto si lo hay
+    def anadir(self, dia: int, inicio: int, fin: int, etiqueta: str, clave = None):
+        conflicto = None
+        m = mascara(inicio, fin)
+        if self.ocupado[dia] & m:
+            for f in range(inicio, fin):
+                if self.celdas[dia][f] and self.texto(dia, f) != etiqueta:
+                    conflicto = (f, self.texto(dia, f))
+                    break
+
+        for f in range(inicio, fin):
+            celda = self.celdas[dia][f]
+            celda[etiqueta] = celda.get(etiqueta, 0) + 1
+            self._marcar(dia, f)
+        self.ocupado[dia] |= m
+        if fin > inicio and (inicio < self.desde or fin - 1 > self.hasta):
+            self.desde = min(self.desde, inicio)
+            self.hasta = max(self.hasta, fin - 1)
+            self._df = None
+        if clave is not None:
+            self.piezas.setdefault(clave, []).append((dia, inicio, fin, etiqueta))
+        return conflicto
+
+    # Quita todas las clases añadidas con una clave
+    def quitar(self, clave):
+        for dia, inicio, fin, etiqueta in self.piezas.pop(clave, []):
+            for f in range(inicio, fin):
+                celda = self.celdas[dia][f]
+                celda[etiqueta] -= 1
+                if celda[etiqueta] == 0:
+                    del celda[etiqueta]
+                self._marcar(dia, f)
+
+    # El DataFrame interno se actualiza con las celdas que cambian y se devuelve una copia, así el que ya tiene
+    # quien llama (un Styler, una exportación) no cambia con el horario
+    def df(self):
+        if self._df is None:
+            filas = range(self.desde, self.hasta + 1)
+            datos = [[self.texto(d, f) or float('nan') for d in range(len(self.columnas))] for f in filas]
+            self._df = pd.DataFrame(datos, index = [etiqueta_franja[f] for f in filas], columns = self.columnas, dtype = object)
+        else:
+            for d, f in self.sucias:
+                if self.desde <= f <= self.hasta:
+                    self._df.iat[f - self.desde, d] = self.texto(d, f) or float('nan')
+        self.sucias.clear()
+        return self._df.copy()
@@ -0,0 +1,299 @@
+# Servidor HTTP/JSON con los horarios del catálogo, para muchos usuarios a la vez
+# El catálogo se lee una vez y se comparte (solo se lee, cada petición trabaja con copias de las materias).
+# El trabajo de cada petición se hace en un grupo de hilos para no bloquear el bucle de asyncio y las
+# respuestas se guardan en una caché que se invalida cuando cambia el catálogo
+#
+#   python servidor.py [--puerto 8080] [--catalogo materias.json] [--hilos 4]
+#
+#   GET /materias?curso=1&cuatrimestre=1                  materias del catálogo
+#   GET /buscar?q=redes&n=5                               búsqueda por nombre
+#   GET /sugerir?q=sis%20op&n=10                          mientras se escribe
+#   GET /horario?curso=1&cuatrimestre=1&formato=json      también formato=html o csv
+#   GET /conflictos?curso=1&cuatrimestre=1
+#   GET /examenes?curso=1&cuatrimestre=1                  exámenes a la vez y seguidos
+#   GET /aulas                                            momento con más exámenes a la vez de cada día
+#   GET /libres?dia=martes&desde=12:00&hasta=14:00        aulas sin clase en ese intervalo
+#   GET /ocupacion?aula=IA.03                             clases de un aula en la semana
+#
+# /libres y /ocupacion usan la semana guardada en el catálogo o la indicada con semana=<nombre de la semana>
+#
+# /horario, /conflictos y /examenes aceptan además materia=<nombre> (se añade al horario) y grupo=<nombre>:<tipo>:<grupo>
+# (por ejemplo grupo=Redes:CLIL:2), las dos se pueden repetir
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import tornado.web
+
+import api
+from buscador import normalizar
+from rejilla import etiqueta_franja
+
+PUERTO = 8080
+HILOS = 4
+TAM_CACHE = 512 # respuestas guardadas
+
+# Respuestas
+# ---
+
+def resumen(m: api.Materia):
+    return {
+        'nombre': m.nombre,
+        'abreviatura': m.abreviatura,
+        'curso': m.curso,
+        'cuatrimestre': m.cuatrimestre,
+        'tipo': m.tipo.value,
+        'num_grupos': m.num_grupos,
+    }
+
+def materias(curso: int | None, cuatrimestre: int | None):
+    return [resumen(m) for m in api.catalogo.leer()
+            if (curso is None or m.curso == curso) and (cuatrimestre is None or m.cuatrimestre == cuatrimestre)]
+
+def buscar(q: str, n: int):
+    return [dict(resumen(m), puntuacion = p) for m, p in api.buscar_materia(q, n)]
+
+def sugerir(q: str, n: int):
+    return [resumen(m) for m in api.sugerir_materias(q, n)]
+
+# Horario de una petición: las materias de un curso (si se indica), las añadidas por nombre y los grupos elegidos
+def horario_peticion(curso: int | None, cuatrimestre: int, nombres: list[str], grupos: list[str]):
+    horario = api.horario_curso(curso, cuatrimestre) if curso else api.iniciar_horario()
+    if nombres:
+        por_nombre = { m.nombre: m for m in api.catalogo.leer() }
+        for nombre in nombres:
+            if not nombre in por_nombre:
+                raise tornado.web.HTTPError(404, reason = f"No existe la materia '{nombre}'")
+            api.incluir_en_horario(horario, api.copiar_materia(por_nombre[nombre]))
+
+    for g in grupos:
+        try:
+            nombre, tipo, grupo = g.rsplit(':', 2)
+            grupo = int(grupo)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason = f"Grupo '{g}' no válido, se espera nombre:tipo:grupo")
+        m = horario.materias.get(nombre)
+        if m is None or not tipo in m.num_grupos or not 0 <= grupo <= m.num_grupos[tipo]:
+            raise tornado.web.HTTPError(400, reason = f"La materia '{nombre}' no tiene el grupo {tipo}{grupo} en este horario")
+        api.cambiar_grupo(horario, nombre, tipo, grupo)
+    return horario
+
+def conflictos(horario: api.Horario):
+    return [[d.value, hora] for d, hora in api.conflictos_horario(horario)]
+
+def examen_json(e):
+    return { 'materia': e.nombre, 'enlace': e.enlace, 'fecha': e.inicio.isoformat(), 'aulas': sorted(e.aulas) }
+
+def examenes(horario: api.Horario):
+    indice = api.catalogo.examenes()
+    materias = list(horario.materias.values())
+    return {
+        'choques': [[examen_json(a), examen_json(b)] for a, b in indice.choques(materias)],
+        'seguidos': [[examen_json(e) for e in s] for s in indice.seguidos(materias)],
+    }
+
+def picos_aulas():
+    return [{ 'fecha': p.fecha.isoformat(), 'hora': p.hora.strftime('%H:%M'), 'examenes': p.examenes, 'aulas': sorted(p.aulas) }
+            for p in api.catalogo.examenes().picos_aulas()]
+
+def aulas_semana(semana: str | None):
+    try:
+        return api.catalogo.aulas(semana)
+    except KeyError:
+        raise tornado.web.HTTPError(404, reason = f"Ninguna materia tiene la semana '{semana}'")
+
+def libres(dia: int, desde: dt.time, hasta: dt.time, semana: str | None):
+    return { 'aulas': aulas_semana(semana).libres(dia, desde, hasta) }
+
+def ocupacion(aula: str, semana: str | None):
+    return [{ 'dia': api.DIAS[c.dia].value, 'inicio': etiqueta_franja[c.inicio], 'fin': etiqueta_franja[c.fin],
+              'materia': c.materia, 'tipo': c.tipo, 'grupo': c.grupo } for c in aulas_semana(semana).ocupacion(aula)]
+
+def horario_json(horario: api.Horario):
+    df = horario.df
+    return {
+        'dias': list(df.columns),
+        'horas': list(df.index),
+        'celdas': [[c if isinstance(c, str) else None for c in fila] for fila in df.itertuples(index = False)],
+        'materias': [dict(resumen(m), grupo_seleccionado = m.grupo_seleccionado) for m in horario.materias.values()],
+        'conflictos': conflictos(horario),
+    }
+
+# (tipo de contenido, cuerpo) de /horario en el formato pedido
+def horario_formato(horario: api.Horario, formato: str):
+    if formato == 'html':
+        return ('text/html; charset=utf-8', '<meta charset="UTF-8">' + api.html_horario(horario))
+    if formato == 'csv':
+        return ('text/csv; charset=utf-8', horario.df.to_csv())
+    return ('application/json; charset=utf-8', json.dumps(horario_json(horario), ensure_ascii = False))
+
+# Servidor
+# ---
+
+class Servidor:
+    def __init__(self, hilos: int = HILOS, tam_cache: int = TAM_CACHE):
+        self.ejecutor = ThreadPoolExecutor(max_workers = hilos)
+        self.cache: OrderedDict[tuple, tuple[str, str]] = OrderedDict()
+        self.tam_cache = tam_cache
+        self.version = None
+        self.peticiones, self.aciertos = 0, 0
+
+    # La caché solo se usa desde el bucle de eventos, así que no necesita lock
+    def en_cache(self, clave: tuple):
+        if self.version != api.catalogo.version:
+            self.cache.clear()
+            self.version = api.catalogo.version
+        r = self.cache.get(clave)
+        if r is not None:
+            self.cache.move_to_end(clave)
+            self.aciertos += 1
+        return r
+
+    def guardar(self, clave: tuple, respuesta: tuple[str, str]):
+        self.cache[clave] = respuesta
+        if len(self.cache) > self.tam_cache:
+            self.cache.popitem(last = False)
+
+    # Calcula una respuesta en un hilo, o la devuelve de la caché si la misma petición ya se hizo
+    async def responder(self, clave: tuple, f, *args):
+        self.peticiones += 1
+        # vuelve a leer el catálogo si ha cambiado en disco antes de mirar la caché (normalmente solo es un stat,
+        # pero si ha cambiado puede ser leer todo un .db, así que también va en un hilo)
+        await self.en_hilo(api.catalogo.leer)
+        r = self.en_cache(clave)
+        if r is None:
+            r = await self.en_hilo(f, *args)
+            self.guardar(clave, r)
+        return r
+
+    async def en_hilo(self, f, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.ejecutor, f, *args)
+
+def como_json(f):
+    def wrapper(*args):
+        return ('application/json; charset=utf-8', json.dumps(f(*args), ensure_ascii = False))
+    return wrapper
+
+class Base(tornado.web.RequestHandler):
+    def initialize(self, servidor: Servidor):
+        self.servidor = servidor
+
+    def entero(self, nombre: str, defecto: int | None = None):
+        valor = self.get_argument(nombre, None)
+        if valor is None:
+            return defecto
+        try:
+            return int(valor)
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason = f"'{nombre}' tiene que ser un número")
+
+    def clave(self):
+        return (self.request.path, tuple(sorted((k, tuple(v)) for k, v in self.request.query_arguments.items())))
+
+    async def enviar(self, f, *args):
+        tipo, cuerpo = await self.servidor.responder(self.clave(), f, *args)
+        self.set_header('Content-Type', tipo)
+        self.finish(cuerpo)
+
+    def write_error(self, status_code: int, **kwargs):
+        self.set_header('Content-Type', 'application/json; charset=utf-8')
+        self.finish(json.dumps({ 'error': self._reason }, ensure_ascii = False))
+
+class Materias(Base):
+    async def get(self):
+        await self.enviar(como_json(materias), self.entero('curso'), self.entero('cuatrimestre'))
+
+class Buscar(Base):
+    async def get(self):
+        await self.enviar(como_json(buscar), self.get_argument('q'), self.entero('n', 5))
+
+class Sugerir(Base):
+    async def get(self):
+        await self.enviar(como_json(sugerir), self.get_argument('q'), self.entero('n', 10))
+
+class Horario(Base):
+    async def get(self):
+        formato = self.get_argument('formato', 'json')
+        if not formato in ('json', 'html', 'csv'):
+            raise tornado.web.HTTPError(400, reason = 'formato tiene que ser json, html o csv')
+        await self.enviar(lambda *a: horario_formato(horario_peticion(*a), formato), *self.argumentos_horario())
+
+    def argumentos_horario(self):
+        return (self.entero('curso'), self.entero('cuatrimestre', 1), self.get_arguments('materia'), self.get_arguments('grupo'))
+
+class Conflictos(Horario):
+    async def get(self):
+        await self.enviar(como_json(lambda *a: { 'conflictos': conflictos(horario_peticion(*a)) }), *self.argumentos_horario())
+
+class Examenes(Horario):
+    async def get(self):
+        await self.enviar(como_json(lambda *a: examenes(horario_peticion(*a))), *self.argumentos_horario())
+
+class Aulas(Base):
+    async def get(self):
+        await self.enviar(como_json(picos_aulas))
+
+class Libres(Base):
+    async def get(self):
+        dias = { normalizar(d.value): i for i, d in enumerate(api.DIAS) }
+        dia = normalizar(self.get_argument('dia'))
+        if not dia in dias:
+            raise tornado.web.HTTPError(400, reason = f"'{dia}' no es un día, se espera {', '.join(d.value for d in api.DIAS)}")
+        desde, hasta = self.hora('desde'), self.hora('hasta')
+        if desde >= hasta:
+            raise tornado.web.HTTPError(400, reason = "'desde' tiene que ser anterior a 'hasta'")
+        await self.enviar(como_json(libres), dias[dia], desde, hasta, self.get_argument('semana', None))
+
+    def hora(self, nombre: str):
+        try:
+            return dt.time.fromisoformat(self.get_argument(nombre))
+        except ValueError:
+            raise tornado.web.HTTPError(400, reason = f"'{nombre}' tiene que ser una hora, por ejemplo 12:00")
+
+class Ocupacion(Base):
+    async def get(self):
+        await self.enviar(como_json(ocupacion), self.get_argument('aula'), self.get_argument('semana', None))
+
+class Estado(Base):
+    async def get(self):
+        s = self.servidor
+        materias = await s.en_hilo(api.catalogo.leer)
+        self.finish({
+            'materias': len(materias),
+            'peticiones': s.peticiones,
+            'aciertos_cache': s.aciertos,
+            'respuestas_en_cache': len(s.cache),
+        })
+
+def aplicacion(servidor: Servidor):
+    rutas = [('/materias', Materias), ('/buscar', Buscar), ('/sugerir', Sugerir), ('/horario', Horario), ('/conflictos', Conflictos),
+             ('/examenes', Examenes), ('/aulas', Aulas),
+             ('/libres', Libres), ('/ocupacion', Ocupacion), ('/estado', Estado)]
+    return tornado.web.Application([(r, h, { 'servidor': servidor }) for r, h in rutas])
+
+async def servir(puerto: int, hilos: int):
+    api.AVISAR_CONFLICTOS = False
+    # el catálogo y sus índices se preparan antes de aceptar peticiones
+    api.catalogo.indice()
+    api.catalogo.aulas()
+    servidor = Servidor(hilos)
+    aplicacion(servidor).listen(puerto)
+    print(f"Sirviendo {len(api.catalogo.leer())} materias en http://localhost:{puerto}", flush = True)
+    await asyncio.Event().wait()
+
+def main():
+    parser = argparse.ArgumentParser(description = 'Servidor HTTP/JSON de horarios')
+    parser.add_argument('--puerto', type = int, default = PUERTO)
+    parser.add_argument('--catalogo', default = api.catalogo.archivo, help = 'materias.json, catálogo .bin o almacén .db')
+    parser.add_argument('--hilos', type = int, default = HILOS)
+    args = parser.parse_args()
+
+    api.catalogo = api.Catalogo(args.catalogo)
+    asyncio.run(servir(args.puerto, args.hilos))
+
+if __name__ == '__main__':
+    main()